@@ -0,0 +1,107 @@
+"""Benchmark the per-repo overhead of each git backend, in time and subprocesses
+
+Runs the git operations mass-driver does on each repo (read branch and HEAD,
+check status, commit all changes onto a branch, read the remote for the Forge)
+over many clones of a small repo, for each git backend installed. Cloning isn't
+measured: it's done via git either way. Subprocesses counted include attempts at
+running commit hooks (dulwich tries them even when there's none).
+
+Each backend is run twice: staging the whole repo's changes, then just the files
+the driver reported changing (see
+{py:meth}`mass_driver.models.patchdriver.PatchDriver.changed_paths`), after
+checking no other file changed. Grow the repos via --files to see the cost.
+
+Usage:
+  poetry run python benchmarks/git_backends.py --repos 200 --files 5000
+"""
+
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from subprocess import run
+from tempfile import TemporaryDirectory
+
+from mass_driver.git_backend import GIT_BACKENDS, GitBackend
+
+SPAWNS = 0
+"""How many subprocesses were started so far"""
+
+
+def count_spawns(event: str, _args):
+    """Count subprocesses started, as audit hook"""
+    global SPAWNS
+    if event == "subprocess.Popen":
+        SPAWNS += 1
+
+
+CHANGED_PATHS = ["file0.txt", "new.txt"]
+"""The files changed on each repo, as a driver would report them"""
+
+
+def make_clones(folder: Path, count: int, files: int) -> list[Path]:
+    """Create an 'upstream' repo with files, then count clones of it"""
+    upstream = folder / "upstream"
+    run(["git", "init", "--quiet", "--initial-branch=main", upstream], check=True)
+    for index in range(files):
+        (upstream / f"file{index}.txt").write_text(f"Hello {index}\n")
+    run(["git", "-C", upstream, "add", "-A"], check=True)
+    run(["git", "-C", upstream, "commit", "--quiet", "-m", "Initial"], check=True)
+    clones = [folder / f"clone{index}" for index in range(count)]
+    for clone in clones:
+        run(["git", "clone", "--quiet", upstream, clone], check=True)
+    return clones
+
+
+def process_repo(backend: GitBackend, clone: Path, paths: list[str] | None):
+    """Do the git operations of a mass-driver migration and forge on a repo"""
+    backend.active_branch(clone)
+    backend.head_sha(clone)
+    (clone / "file0.txt").write_text("Patched\n")
+    (clone / "new.txt").write_text("New file\n")
+    if paths is not None and set(backend.changed_files(clone)) - set(paths):
+        paths = None  # Unrecorded changes: commit them all
+    if backend.is_dirty(clone, paths):
+        author = "Bench <bench@example>"
+        backend.commit_all(clone, "patch", "Patch things", author, paths=paths)
+    backend.remote_urls(clone)
+    backend.default_branch(clone)
+
+
+def benchmark(backend_name: str, repo_count: int, files: int, paths: list[str] | None):
+    """Time a backend over fresh clones, printing per-repo overhead"""
+    mode = "whole repo" if paths is None else "changed paths"
+    label = f"{backend_name:>10} ({mode:>13})"
+    try:
+        backend = GIT_BACKENDS[backend_name]()
+    except ImportError as e:
+        print(f"{label}: skipped ({e})")
+        return
+    with TemporaryDirectory() as folder:
+        clones = make_clones(Path(folder), repo_count, files)
+        spawns_before = SPAWNS
+        start = time.perf_counter()
+        for clone in clones:
+            process_repo(backend, clone, paths)
+        elapsed = time.perf_counter() - start
+        spawns = SPAWNS - spawns_before
+    print(
+        f"{label}: {elapsed / repo_count * 1000:7.2f} ms/repo, "
+        f"{spawns / repo_count:5.1f} subprocesses/repo"
+    )
+
+
+def main():
+    """Benchmark all git backends"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repos", type=int, default=100, help="Repos to process")
+    parser.add_argument("--files", type=int, default=20, help="Files per repo")
+    args = parser.parse_args()
+    sys.addaudithook(count_spawns)
+    for backend_name in GIT_BACKENDS:
+        for paths in [None, CHANGED_PATHS]:
+            benchmark(backend_name, args.repos, args.files, paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,140 @@
 """Main activities of Mass-Driver: For each repo, clone it, then scan/migrate it
 
-Variants for sequential or parallel
+Variants for sequential or parallel (threads or processes)
 """
 
 import logging
+import os
+import time
 from concurrent import futures
-from copy import deepcopy
+from functools import partial
+from typing import Callable
 
+from mass_driver.concurrency import AUTO_WORKERS, AdaptiveConcurrency, Workers
 from mass_driver.git import (
+    GitRepo,
     get_cache_folder,
 )
 from mass_driver.models.activity import (
     ActivityLoaded,
     ActivityOutcome,
+    ConcurrencySample,
     IndexedPatchResult,
+    IndexedPhaseTimings,
     IndexedScanResult,
+    PhaseTiming,
+    RepoCallback,
+    RepoOutcome,
     ScanResult,
 )
 from mass_driver.models.patchdriver import PatchOutcome, PatchResult
 from mass_driver.models.repository import (
+    ClonedRepo,
     IndexedClonedRepos,
     IndexedRepos,
+    RepoID,
 )
 from mass_driver.process_repo import clone_repo, migrate_repo, scan_repo
+from mass_driver.timeouts import PhaseTimeoutError
+from mass_driver.timing import recording_timings
 
 LOGGER_PREFIX = "run"
 
 
+DEFAULT_THREAD_WORKERS = 8
+"""How many threads the threaded run uses, by default"""
+
+MAX_ADAPTIVE_THREAD_WORKERS = 64
+"""The most threads the threaded run can grow to, under adaptive concurrency"""
+
+
+class RunCollector:
+    """Gather the outcome of each repo as it completes, into an ActivityOutcome
+
+    Each repo's outcome is also passed on to the given callbacks, as it arrives.
+    Without keeping repo results, the ActivityOutcome only has repos sourced, and
+    those timed out cloning: the rest is only passed on to callbacks.
+    """
+
+    def __init__(
+        self,
+        activity: ActivityLoaded,
+        repos: IndexedRepos,
+        repo_callbacks: list[RepoCallback] | None = None,
+        keep_repo_results: bool = True,
+    ):
+        """Initialize empty results, for the activities that will produce them
+
+        Without keep_repo_results, repos' clone, scan, patch, and timing records
+        are only passed on to callbacks (say, streamed to disk), keeping memory use
+        flat over huge runs.
+        """
+        self.repos = repos
+        self.repo_callbacks = repo_callbacks if repo_callbacks is not None else []
+        self.keep_repo_results = keep_repo_results
+        self.cloned_repos: IndexedClonedRepos = {}
+        self.clone_timed_out: list[RepoID] = []
+        self.phase_timings: IndexedPhaseTimings = {}
+        self.scanner_results: IndexedScanResult | None = (
+            {} if activity.scan is not None and keep_repo_results else None
+        )
+        self.patch_results: IndexedPatchResult | None = (
+            {} if activity.migration is not None and keep_repo_results else None
+        )
+
+    def add(self, repo_outcome: RepoOutcome):
+        """Record a single repo's outcome, passing it on to callbacks"""
+        repo_id = repo_outcome.repo_id
+        if repo_outcome.clone_timed_out:
+            self.clone_timed_out.append(repo_id)
+        if self.keep_repo_results and repo_outcome.cloned_repo is not None:
+            self.cloned_repos[repo_id] = repo_outcome.cloned_repo
+        if self.keep_repo_results and repo_outcome.timings:
+            self.phase_timings[repo_id] = repo_outcome.timings
+        if self.scanner_results is not None and repo_outcome.scan_result is not None:
+            self.scanner_results[repo_id] = repo_outcome.scan_result
+        if self.patch_results is not None and repo_outcome.migration_result is not None:
+            self.patch_results[repo_id] = repo_outcome.migration_result
+        for callback in self.repo_callbacks:
+            callback(repo_outcome)
+
+    def outcome(
+        self, concurrency_log: list[ConcurrencySample] | None = None
+    ) -> ActivityOutcome:
+        """Build the overall outcome of all repos recorded so far"""
+        return ActivityOutcome(
+            repos_sourced=self.repos,
+            repos_cloned=self.cloned_repos,
+            repos_clone_timed_out=self.clone_timed_out,
+            scan_result=self.scanner_results,
+            migration_result=self.patch_results,
+            concurrency_log=concurrency_log,
+            phase_timings=self.phase_timings,
+        )
+
+
+def clone_failed(
+    repo_id: RepoID,
+    error: BaseException,
+    elapsed_seconds: float | None = None,
+    timings: list[PhaseTiming] | None = None,
+) -> RepoOutcome:
+    """Get the outcome of a repo that failed to clone, telling timeouts apart"""
+    return RepoOutcome(
+        repo_id=repo_id,
+        error=str(error),
+        clone_timed_out=isinstance(error, PhaseTimeoutError),
+        elapsed_seconds=elapsed_seconds,
+        timings=timings,
+    )
+
+
 def sequential_run(
     activity: ActivityLoaded,
     repos: IndexedRepos,
     cache: bool,
+    repo_callbacks: list[RepoCallback] | None = None,
+    keep_repo_results: bool = True,
 ) -> ActivityOutcome:
     """Run the main activity SEQUENTIALLY: over N repos, clone, then scan/patch"""
     logger = logging.getLogger(LOGGER_PREFIX)
@@ -38,129 +142,290 @@ def sequential_run(
     migration = activity.migration
     scan = activity.scan
     cache_folder = get_cache_folder(cache, logger=logger)
-    cloned_repos: IndexedClonedRepos = {}
-    scanner_results: IndexedScanResult | None = None
-    patch_results: IndexedPatchResult | None = None
+    collector = RunCollector(activity, repos, repo_callbacks, keep_repo_results)
     what_array = ["clone"]
     if scan is not None:
         what_array.append(f"{len(scan.scanners)} scanners")
-        scanner_results = {}
     if migration is not None:
         what_array.append(f"{migration.driver=}")
-        patch_results = {}
     logger.info(f"Processing {repo_count} with {' and '.join(what_array)}")
     for repo_index, (repo_id, repo) in enumerate(repos.items(), start=1):
         repo_logger_name = f"{logger.name}.repo.{repo_id.replace('.','_')}"
         repo_logger = logging.getLogger(repo_logger_name)
+        started_at = time.monotonic()
+        timings: list[PhaseTiming] = []
         try:
             logger.info(f"[{repo_index:03d}/{repo_count:03d}] Processing {repo_id}...")
-            cloned_repo, repo_gitobj = clone_repo(
-                repo, cache_folder, logger=repo_logger
-            )
-            cloned_repos[repo_id] = cloned_repo
+            with recording_timings(timings):
+                cloned_repo, repo_gitobj = clone_repo(
+                    repo,
+                    cache_folder,
+                    logger=repo_logger,
+                    timeout=activity.timeouts.clone,
+                    workspace=activity.workspace,
+                    sparse_paths=activity.sparse_paths,
+                    checkout=activity.needs_checkout,
+                    clone_local=activity.clone_local,
+                )
         except Exception as e:
             repo_logger.info(f"Error cloning repo '{repo_id}'\nError was: {e}")
-            # FIXME: Clone failure lacks cloned_repo entry, dropping visibility of fail
+            collector.add(
+                clone_failed(repo_id, e, time.monotonic() - started_at, timings)
+            )
             continue
-        if scan and scanner_results is not None:
-            try:
-                scan_result = scan_repo(scan, cloned_repo)
-                scanner_results[repo_id] = scan_result
-            except Exception as e:
-                repo_logger.error(f"Error scanning repo '{repo_id}'")
-                repo_logger.error(f"Error was: {e}")
-                # Reaching here should be impossible (catch-all in scan)
-        if migration and patch_results is not None:
-            try:
-                # Ensure no driver persistence between repos
-                migration_copy = deepcopy(migration)
-                result, excep = migrate_repo(
-                    cloned_repo, repo_gitobj, migration_copy, logger=repo_logger
-                )
-                patch_results[repo_id] = result
-            except Exception as e:
-                repo_logger.error(f"Error migrating repo '{repo_id}'")
-                repo_logger.error(f"Error was: {e}")
-                patch_results[repo_id] = PatchResult(
-                    outcome=PatchOutcome.PATCH_ERROR,
-                    details=f"Unhandled exception caught during patching. Error was: {e}",
-                )
+        with recording_timings(timings):
+            scan_result, patch_result = process_cloned_repo(
+                repo_id, cloned_repo, repo_gitobj, activity, repo_logger
+            )
+        collector.add(
+            RepoOutcome(
+                repo_id=repo_id,
+                cloned_repo=cloned_repo,
+                scan_result=scan_result,
+                migration_result=patch_result,
+                elapsed_seconds=time.monotonic() - started_at,
+                timings=timings,
+            )
+        )
     logger.info("Action completed: exiting")
-    return ActivityOutcome(
-        repos_sourced=repos,
-        repos_cloned=cloned_repos,
-        scan_result=scanner_results,
-        migration_result=patch_results,
-    )
+    return collector.outcome()
 
 
 def thread_run(
     activity: ActivityLoaded,
     repos: IndexedRepos,
     cache: bool,
+    workers: Workers = DEFAULT_THREAD_WORKERS,
+    repo_callbacks: list[RepoCallback] | None = None,
+    keep_repo_results: bool = True,
+) -> ActivityOutcome:
+    """Run the main activity THREADED: over N repos, clone, then scan/patch
+
+    With workers set to "auto", the number of threads adapts to the run's health,
+    see {py:class}`mass_driver.concurrency.AdaptiveConcurrency`.
+    """
+    controller = (
+        AdaptiveConcurrency(maximum=MAX_ADAPTIVE_THREAD_WORKERS)
+        if workers == AUTO_WORKERS
+        else None
+    )
+    max_workers = controller.maximum if controller is not None else int(workers)
+    worker_func = partial(per_repo_process, activity=activity)
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return pool_run(
+            activity,
+            repos,
+            cache,
+            executor,
+            worker_func,
+            "Threads",
+            max_workers,
+            controller,
+            repo_callbacks,
+            keep_repo_results,
+        )
+
+
+def process_run(
+    activity: ActivityLoaded,
+    repos: IndexedRepos,
+    cache: bool,
+    workers: Workers | None = None,
+    repo_callbacks: list[RepoCallback] | None = None,
+    keep_repo_results: bool = True,
+) -> ActivityOutcome:
+    """Run the main activity in PROCESSES: over N repos, clone, then scan/patch
+
+    Unlike {py:func}`thread_run`, CPU-heavy PatchDrivers and scanners aren't
+    serialized by the GIL, so they scale across all cores. The loaded activity is
+    shipped to each worker process once (at worker startup), not once per repo.
+
+    Defaults to one worker per CPU (see {py:class}`concurrent.futures.ProcessPoolExecutor`).
+    With workers set to "auto", the number of busy processes adapts to the run's
+    health, up to one per CPU.
+    """
+    controller = (
+        AdaptiveConcurrency(maximum=os.cpu_count() or 1)
+        if workers == AUTO_WORKERS
+        else None
+    )
+    max_workers = (
+        controller.maximum
+        if controller is not None
+        else int(workers or os.cpu_count() or 1)
+    )
+    with futures.ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=init_process_worker,
+        initargs=(worker_activity(activity),),
+    ) as executor:
+        return pool_run(
+            activity,
+            repos,
+            cache,
+            executor,
+            per_repo_process_worker,
+            "Processes",
+            max_workers,
+            controller,
+            repo_callbacks,
+            keep_repo_results,
+        )
+
+
+def pool_run(
+    activity: ActivityLoaded,
+    repos: IndexedRepos,
+    cache: bool,
+    executor: futures.Executor,
+    worker_func: Callable,
+    via: str,
+    max_in_flight: int,
+    controller: AdaptiveConcurrency | None = None,
+    repo_callbacks: list[RepoCallback] | None = None,
+    keep_repo_results: bool = True,
 ) -> ActivityOutcome:
-    """Run the main activity THREADED: over N repos, clone, then scan/patch"""
+    """Run the main activity over the given executor's pool, one job per repo
+
+    The worker_func is submitted with keyword arguments `repo_id`, `repo`,
+    `logger` and `cache_folder`, returning the tuple of per-repo results and timings.
+
+    Repos are submitted as workers free up, keeping max_in_flight repos in the
+    executor at once (its pool size). Given an adaptive concurrency controller, only
+    as many repos as it allows are in flight instead. Repos failing to clone are
+    skipped.
+    """
     logger = logging.getLogger(LOGGER_PREFIX)
     repo_count = len(repos.keys())
     migration = activity.migration
     scan = activity.scan
     cache_folder = get_cache_folder(cache, logger=logger)
-    cloned_repos: IndexedClonedRepos = {}
-    scanner_results: IndexedScanResult | None = None
-    patch_results: IndexedPatchResult | None = None
+    collector = RunCollector(activity, repos, repo_callbacks, keep_repo_results)
     what_array = ["clone"]
     if scan is not None:
         what_array.append(f"{len(scan.scanners)} scanners")
-        scanner_results = {}
     if migration is not None:
         what_array.append(f"{migration.driver=}")
-        patch_results = {}
 
-    logger.info(f"Processing {repo_count} with {' and '.join(what_array)}, via Threads")
+    logger.info(f"Processing {repo_count} with {' and '.join(what_array)}, via {via}")
 
-    futures_map = {}
-    with futures.ThreadPoolExecutor(max_workers=8) as executor:
-        for repo_id, repo in repos.items():
+    repos_to_submit = iter(repos.items())
+    futures_map: dict[futures.Future, tuple[RepoID, float]] = {}
+    repo_index = 0
+    while True:
+        limit = controller.limit if controller is not None else max_in_flight
+        while len(futures_map) < limit and (next_repo := next(repos_to_submit, None)):
+            repo_id, repo = next_repo
             future_obj = executor.submit(
-                per_repo_process,
-                repo_id,
-                repo,
-                activity,
-                logging.getLogger(f"{logger.name}.repo.{repo_id.replace('.','_')}"),
-                cache_folder,
+                worker_func,
+                repo_id=repo_id,
+                repo=repo,
+                logger=logging.getLogger(
+                    f"{logger.name}.repo.{repo_id.replace('.','_')}"
+                ),
+                cache_folder=cache_folder,
             )
-            futures_map[future_obj] = repo_id
-        # Submitted the jobs: iterate on completion
-        for repo_index, future in enumerate(futures.as_completed(futures_map), start=1):
-            repo_id = futures_map[future]
-            cloned_repo, scan_result, patch_result = future.result()
+            futures_map[future_obj] = (repo_id, time.monotonic())
+        if not futures_map:
+            break  # Nothing in flight, nothing left to submit: all done
+        done, _pending = futures.wait(futures_map, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+            repo_id, submitted_at = futures_map.pop(future)
+            repo_index += 1
+            error = future.exception()
+            elapsed = time.monotonic() - submitted_at
+            if error is not None:
+                if controller is not None:
+                    controller.record(error=True)
+                logger.error(
+                    f"[{repo_index:04d}/{repo_count:04d}] Failed {repo_id}: {error}"
+                )
+                collector.add(clone_failed(repo_id, error, elapsed))
+                continue  # Clone failed: no results to report
+            cloned_repo, scan_result, patch_result, timings = future.result()
+            if controller is not None:
+                controller.record(error=False, timings=timings)
             logger.info(f"[{repo_index:04d}/{repo_count:04d}] Processed {repo_id}")
-            cloned_repos[repo_id] = cloned_repo
-            if scanner_results is not None:
-                scanner_results[repo_id] = scan_result
-            if patch_results is not None:
-                patch_results[repo_id] = patch_result
+            collector.add(
+                RepoOutcome(
+                    repo_id=repo_id,
+                    cloned_repo=cloned_repo,
+                    scan_result=scan_result,
+                    migration_result=patch_result,
+                    elapsed_seconds=elapsed,
+                    timings=timings,
+                )
+            )
     logger.info("Action completed: exiting")
-    return ActivityOutcome(
-        repos_sourced=repos,
-        repos_cloned=cloned_repos,
-        scan_result=scanner_results,
-        migration_result=patch_results,
+    return collector.outcome(
+        concurrency_log=controller.history if controller is not None else None,
     )
 
 
+_WORKER_ACTIVITY: ActivityLoaded | None = None
+"""The activity of this worker process, set once by init_process_worker"""
+
+
+def worker_activity(activity: ActivityLoaded) -> ActivityLoaded:
+    """Strip an activity down to what per-repo workers need, for shipping to workers
+
+    Source and Forge aren't used per-repo, and may hold unpicklable API clients.
+    """
+    return activity.copy(update={"source": None, "forge": None})
+
+
+def init_process_worker(activity: ActivityLoaded):
+    """Receive the activity, once per worker process"""
+    global _WORKER_ACTIVITY
+    _WORKER_ACTIVITY = activity
+
+
+def per_repo_process_worker(repo_id, repo, logger, cache_folder):
+    """Process a single repo, in a worker process set up by init_process_worker"""
+    if _WORKER_ACTIVITY is None:
+        raise RuntimeError("Worker process wasn't given an activity on startup")
+    return per_repo_process(repo_id, repo, _WORKER_ACTIVITY, logger, cache_folder)
+
+
 def per_repo_process(repo_id, repo, activity, logger, cache_folder):
-    """Process a single repo, in-thread"""
-    try:
-        logger.info(f"Processing {repo_id}...")
-        cloned_repo, repo_gitobj = clone_repo(repo, cache_folder, logger=logger)
-    except Exception as e:
-        logger.info(f"Error cloning repo '{repo_id}'\nError was: {e}")
-        raise e  # FIXME: Use custom exeption for capturing error here
+    """Process a single repo, in-thread, timing each phase"""
+    timings: list[PhaseTiming] = []
+    with recording_timings(timings):
+        try:
+            logger.info(f"Processing {repo_id}...")
+            cloned_repo, repo_gitobj = clone_repo(
+                repo,
+                cache_folder,
+                logger=logger,
+                timeout=activity.timeouts.clone,
+                workspace=activity.workspace,
+                sparse_paths=activity.sparse_paths,
+                checkout=activity.needs_checkout,
+                clone_local=activity.clone_local,
+            )
+        except Exception as e:
+            logger.info(f"Error cloning repo '{repo_id}'\nError was: {e}")
+            raise e  # FIXME: Use custom exeption for capturing error here
+        scan_result, patch_result = process_cloned_repo(
+            repo_id, cloned_repo, repo_gitobj, activity, logger
+        )
+    return (cloned_repo, scan_result, patch_result, timings)
+
+
+def process_cloned_repo(
+    repo_id: RepoID,
+    cloned_repo: ClonedRepo,
+    repo_gitobj: GitRepo,
+    activity: ActivityLoaded,
+    logger: logging.Logger,
+) -> tuple[ScanResult | None, PatchResult | None]:
+    """Scan then migrate a single repo, once cloned"""
     scan_result: ScanResult | None = None
     if activity.scan is not None:
         try:
-            scan_result = scan_repo(activity.scan, cloned_repo)
+            scan_result = scan_repo(
+                activity.scan, cloned_repo, timeout=activity.timeouts.scan
+            )
         except Exception as e:
             logger.error(f"Error scanning repo '{repo_id}'")
             logger.error(f"Error was: {e}")
@@ -169,9 +434,13 @@ def per_repo_process(repo_id, repo, activity, logger, cache_folder):
     if activity.migration:
         try:
             # Ensure no driver persistence between repos
-            migration_copy = deepcopy(activity.migration)
+            migration_copy = activity.migration.fresh()
             patch_result, excep = migrate_repo(
-                cloned_repo, repo_gitobj, migration_copy, logger=logger
+                cloned_repo,
+                repo_gitobj,
+                migration_copy,
+                logger=logger,
+                timeouts=activity.timeouts,
             )
         except Exception as e:
             logger.error(f"Error migrating repo '{repo_id}'")
@@ -180,4 +449,4 @@ def per_repo_process(repo_id, repo, activity, logger, cache_folder):
                 outcome=PatchOutcome.PATCH_ERROR,
                 details=f"Unhandled exception caught during patching. Error was: {e}",
             )  # FIXME: Catch custom-exception into the PatchResult object
-    return (cloned_repo, scan_result, patch_result)
+    return (scan_result, patch_result)
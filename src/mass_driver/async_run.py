@@ -0,0 +1,173 @@
+"""Asyncio variant of the main activity: git runs as asyncio subprocesses
+
+GitPython blocks a whole thread per clone/pull, capping concurrent network
+operations to the thread count. Here, git clone/checkout/pull are asyncio
+subprocesses, so hundreds can be in flight at once, capped by a semaphore.
+
+PatchDrivers and scanners are synchronous code: they (and the commit) run in a
+thread pool executor, so existing plugins keep working unchanged.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from concurrent import futures
+from pathlib import Path
+
+from mass_driver.activity_run import (
+    LOGGER_PREFIX,
+    RunCollector,
+    clone_failed,
+    process_cloned_repo,
+)
+from mass_driver.concurrency import AUTO_WORKERS, Workers
+from mass_driver.git import get_cache_folder
+from mass_driver.models.activity import (
+    ActivityLoaded,
+    ActivityOutcome,
+    PhaseTiming,
+    RepoCallback,
+    RepoOutcome,
+)
+from mass_driver.models.repository import IndexedRepos, RepoID, SourcedRepo
+from mass_driver.process_repo import clone_repo_async
+from mass_driver.timing import recording_timings
+
+DEFAULT_GIT_CONCURRENCY = 64
+"""How many git network operations (clone/pull) can be in flight at once"""
+
+DEFAULT_PROCESS_WORKERS = 8
+"""How many threads to run the (sync) scanners, PatchDrivers and commits in"""
+
+
+def async_run(
+    activity: ActivityLoaded,
+    repos: IndexedRepos,
+    cache: bool,
+    workers: Workers = DEFAULT_GIT_CONCURRENCY,
+    process_workers: int = DEFAULT_PROCESS_WORKERS,
+    repo_callbacks: list[RepoCallback] | None = None,
+    keep_repo_results: bool = True,
+) -> ActivityOutcome:
+    """Run the main activity via ASYNCIO: over N repos, clone, then scan/patch
+
+    Here, workers caps how many git network operations are in flight at once.
+    """
+    if workers == AUTO_WORKERS:
+        raise ValueError("Asyncio run doesn't support adaptive workers")
+    git_concurrency = int(workers)
+    return asyncio.run(
+        async_run_main(
+            activity,
+            repos,
+            cache,
+            git_concurrency,
+            process_workers,
+            repo_callbacks,
+            keep_repo_results,
+        )
+    )
+
+
+async def async_run_main(
+    activity: ActivityLoaded,
+    repos: IndexedRepos,
+    cache: bool,
+    git_concurrency: int,
+    process_workers: int,
+    repo_callbacks: list[RepoCallback] | None = None,
+    keep_repo_results: bool = True,
+) -> ActivityOutcome:
+    """Run the main activity, within a running asyncio event loop"""
+    logger = logging.getLogger(LOGGER_PREFIX)
+    repo_count = len(repos.keys())
+    cache_folder = get_cache_folder(cache, logger=logger)
+    collector = RunCollector(activity, repos, repo_callbacks, keep_repo_results)
+    what_array = ["clone"]
+    if activity.scan is not None:
+        what_array.append(f"{len(activity.scan.scanners)} scanners")
+    if activity.migration is not None:
+        what_array.append(f"{activity.migration.driver=}")
+    logger.info(
+        f"Processing {repo_count} with {' and '.join(what_array)}, via asyncio "
+        f"(up to {git_concurrency} git operations, {process_workers} threads)"
+    )
+    git_semaphore = asyncio.Semaphore(git_concurrency)
+    with futures.ThreadPoolExecutor(max_workers=process_workers) as executor:
+        tasks = [
+            per_repo_process_async(
+                repo_id,
+                repo,
+                activity,
+                logging.getLogger(f"{logger.name}.repo.{repo_id.replace('.','_')}"),
+                cache_folder,
+                git_semaphore,
+                executor,
+            )
+            for repo_id, repo in repos.items()
+        ]
+        for repo_index, task in enumerate(asyncio.as_completed(tasks), start=1):
+            repo_outcome = await task
+            logger.info(
+                f"[{repo_index:04d}/{repo_count:04d}] Processed {repo_outcome.repo_id}"
+            )
+            collector.add(repo_outcome)
+    logger.info("Action completed: exiting")
+    return collector.outcome()
+
+
+async def per_repo_process_async(
+    repo_id: RepoID,
+    repo: SourcedRepo,
+    activity: ActivityLoaded,
+    logger: logging.Logger,
+    cache_folder: Path,
+    git_semaphore: asyncio.Semaphore,
+    executor: futures.Executor,
+) -> RepoOutcome:
+    """Process a single repo: clone it asynchronously, then scan/patch in executor
+
+    Repos failing to clone are skipped, reported with their error.
+    """
+    started_at = time.monotonic()
+    timings: list[PhaseTiming] = []
+    try:
+        async with git_semaphore:
+            started_at = time.monotonic()
+            logger.info(f"Processing {repo_id}...")
+            with recording_timings(timings):
+                cloned_repo, repo_gitobj = await clone_repo_async(
+                    repo,
+                    cache_folder,
+                    logger=logger,
+                    timeout=activity.timeouts.clone,
+                    workspace=activity.workspace,
+                    sparse_paths=activity.sparse_paths,
+                    checkout=activity.needs_checkout,
+                    clone_local=activity.clone_local,
+                )
+    except Exception as e:
+        logger.info(f"Error cloning repo '{repo_id}'\nError was: {e}")
+        return clone_failed(repo_id, e, time.monotonic() - started_at, timings)
+    loop = asyncio.get_running_loop()
+    with recording_timings(timings):
+        context = contextvars.copy_context()  # Executor threads don't inherit it
+    scan_result, patch_result = await loop.run_in_executor(
+        executor,
+        context.run,
+        process_cloned_repo,
+        repo_id,
+        cloned_repo,
+        repo_gitobj,
+        activity,
+        logger,
+    )
+    return RepoOutcome(
+        repo_id=repo_id,
+        cloned_repo=cloned_repo,
+        scan_result=scan_result,
+        migration_result=patch_result,
+        elapsed_seconds=time.monotonic() - started_at,
+        timings=timings,
+    )
@@ -0,0 +1,276 @@
+"""An index of the repo cache, in a SQLite file: what's cached, how big, how fresh
+
+Cloning records each repo's mirror (HEAD, default branch, size, when fetched or
+used) and its workspace clones. Scheduling, eviction, and freshness checks then
+query the index, instead of opening thousands of git directories.
+
+Only the sizes of git packs are tracked as mirrors get fetched: workspace clones
+are measured once, when created.
+"""
+
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from pydantic import BaseModel
+
+INDEX_FILE = "index.sqlite"
+"""The index file, at the root of the cache folder"""
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirrors (
+    cache_name TEXT PRIMARY KEY,
+    clone_url TEXT NOT NULL,
+    path TEXT NOT NULL,
+    head_sha TEXT,
+    default_branch TEXT,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    last_fetched REAL,
+    last_used REAL,
+    head_changed_at REAL,
+    checked_at REAL,
+    remote_branches TEXT
+);
+CREATE TABLE IF NOT EXISTS workspace_clones (
+    cache_name TEXT NOT NULL REFERENCES mirrors (cache_name) ON DELETE CASCADE,
+    workspace TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    last_used REAL,
+    PRIMARY KEY (cache_name, workspace)
+);
+"""
+
+RECORD_FETCH_SQL = """
+INSERT INTO mirrors (
+    cache_name, clone_url, path, head_sha, default_branch, size_bytes,
+    last_fetched, last_used, head_changed_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (cache_name) DO UPDATE SET
+    clone_url = excluded.clone_url,
+    path = excluded.path,
+    head_changed_at = CASE WHEN mirrors.head_sha IS excluded.head_sha
+        THEN mirrors.head_changed_at ELSE excluded.head_changed_at END,
+    head_sha = excluded.head_sha,
+    default_branch = excluded.default_branch,
+    size_bytes = excluded.size_bytes,
+    last_fetched = excluded.last_fetched,
+    last_used = excluded.last_used
+"""
+"""Record a mirror fetched: HEAD changed only if the fetch moved it"""
+
+
+class Freshness(BaseModel):
+    """When a mirror was last checked against its remote, and what it had then"""
+
+    checked_at: float
+    """When the mirror was last checked, as UNIX timestamp"""
+    remote_branches: dict[str, str] = {}
+    """The remote's branches (commit SHA by branch ref) as of last check"""
+
+
+class IndexedWorkspaceClone(BaseModel):
+    """A workspace's clone of a cached repo, as indexed"""
+
+    workspace: str
+    """The workspace the clone belongs to"""
+    path: Path
+    """Where the clone is"""
+    size_bytes: int
+    """Disk used by the clone (checkout, own objects), as of its creation"""
+    last_used: float | None = None
+    """When the clone was last used, as UNIX timestamp"""
+
+
+class IndexedMirror(BaseModel):
+    """A cached repo's mirror, as indexed, along with its workspace clones"""
+
+    cache_name: str
+    """The repo's name in cache, as org/name"""
+    clone_url: str
+    """The URL the repo was cloned from"""
+    path: Path
+    """Where the (bare) mirror is"""
+    head_sha: str | None = None
+    """The commit of the mirror's default branch, as of last fetch"""
+    default_branch: str | None = None
+    """The remote's default branch, if known"""
+    size_bytes: int = 0
+    """Disk used by the mirror's git packs, as of last fetch"""
+    last_fetched: float | None = None
+    """When the mirror was last cloned or fetched, as UNIX timestamp"""
+    last_used: float | None = None
+    """When the mirror was last cloned from, as UNIX timestamp"""
+    head_changed_at: float | None = None
+    """When a fetch last moved the mirror's HEAD, as UNIX timestamp"""
+    workspace_clones: list[IndexedWorkspaceClone] = []
+    """The repo's clones, one per workspace that cloned it"""
+
+    @property
+    def local(self) -> bool:
+        """Whether the repo is a local one, standing in for a mirror of our own
+
+        Like {py:func}`mass_driver.git.repo_cache_name`, URLs are told apart from
+        local paths by their ':'.
+        """
+        return ":" not in self.clone_url
+
+    @property
+    def total_bytes(self) -> int:
+        """Disk used by the mirror and its workspace clones"""
+        return self.size_bytes + sum(
+            clone.size_bytes for clone in self.workspace_clones
+        )
+
+
+class CacheIndex:
+    """The index of a repo cache, in a SQLite file inside the cache folder
+
+    Not thread-safe: use one CacheIndex per thread.
+    """
+
+    def __init__(self, cache_folder: Path):
+        """Open the cache's index, creating it (and its tables) if needed"""
+        cache_folder.mkdir(parents=True, exist_ok=True)
+        self.index_path = cache_folder / INDEX_FILE
+        self._db = sqlite3.connect(self.index_path, timeout=60, isolation_level=None)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(INDEX_SCHEMA)
+
+    def record_fetch(
+        self,
+        cache_name: str,
+        clone_url: str,
+        mirror: Path,
+        head_sha: str | None,
+        default_branch: str | None,
+        size_bytes: int,
+        fetched_at: float | None = None,
+    ):
+        """Record a mirror cloned or fetched (and used) at given time, default now"""
+        now = fetched_at if fetched_at is not None else time.time()
+        with self._transaction():
+            self._db.execute(
+                RECORD_FETCH_SQL,
+                (
+                    cache_name,
+                    clone_url,
+                    str(mirror),
+                    head_sha,
+                    default_branch,
+                    size_bytes,
+                    now,
+                    now,
+                    now,
+                ),
+            )
+
+    def record_workspace_clone(
+        self, cache_name: str, workspace: str, clone_path: Path, size_bytes: int
+    ):
+        """Record a workspace clone of an (indexed) mirror just created"""
+        with self._transaction():
+            self._db.execute(
+                "INSERT OR REPLACE INTO workspace_clones (cache_name, workspace, "
+                "path, size_bytes, last_used) VALUES (?, ?, ?, ?, ?)",
+                (cache_name, workspace, str(clone_path), size_bytes, time.time()),
+            )
+
+    def mark_used(self, cache_name: str, workspace: str):
+        """Record that a workspace clone (and its mirror) were just used"""
+        now = time.time()
+        with self._transaction():
+            self._db.execute(
+                "UPDATE mirrors SET last_used = ? WHERE cache_name = ?",
+                (now, cache_name),
+            )
+            self._db.execute(
+                "UPDATE workspace_clones SET last_used = ? "
+                "WHERE cache_name = ? AND workspace = ?",
+                (now, cache_name, workspace),
+            )
+
+    def freshness(self, cache_name: str) -> Freshness | None:
+        """Get when a mirror was last checked against its remote, if ever"""
+        row = self._db.execute(
+            "SELECT checked_at, remote_branches FROM mirrors WHERE cache_name = ?",
+            (cache_name,),
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return Freshness(checked_at=row[0], remote_branches=json.loads(row[1] or "{}"))
+
+    def record_freshness(self, cache_name: str, freshness: Freshness):
+        """Record when an (indexed) mirror was checked against its remote"""
+        with self._transaction():
+            self._db.execute(
+                "UPDATE mirrors SET checked_at = ?, remote_branches = ? "
+                "WHERE cache_name = ?",
+                (
+                    freshness.checked_at,
+                    json.dumps(freshness.remote_branches),
+                    cache_name,
+                ),
+            )
+
+    def mirrors(self) -> list[IndexedMirror]:
+        """Get all indexed mirrors, with their workspace clones"""
+        return self._mirrors_where("1", ())
+
+    def mirror(self, cache_name: str) -> IndexedMirror | None:
+        """Get an indexed mirror, with its workspace clones, if indexed"""
+        found = self._mirrors_where("cache_name = ?", (cache_name,))
+        return found[0] if found else None
+
+    def changed_since(self, timestamp: float) -> list[IndexedMirror]:
+        """Get the mirrors whose HEAD moved (or got cloned) since given timestamp"""
+        return self._mirrors_where("head_changed_at > ?", (timestamp,))
+
+    def remove(self, cache_name: str):
+        """Forget a mirror, and its workspace clones"""
+        with self._transaction():
+            self._db.execute("DELETE FROM mirrors WHERE cache_name = ?", (cache_name,))
+
+    def close(self):
+        """Close the index file"""
+        self._db.close()
+
+    def _mirrors_where(self, condition: str, params: tuple) -> list[IndexedMirror]:
+        """Get the indexed mirrors matching an SQL condition, with their clones"""
+        cursor = self._db.execute(
+            "SELECT cache_name, clone_url, path, head_sha, default_branch, "
+            "size_bytes, last_fetched, last_used, head_changed_at "
+            f"FROM mirrors WHERE {condition} ORDER BY cache_name",
+            params,
+        )
+        columns = [column[0] for column in cursor.description]
+        mirrors = [IndexedMirror(**dict(zip(columns, row))) for row in cursor]
+        for mirror in mirrors:
+            clone_rows = self._db.execute(
+                "SELECT workspace, path, size_bytes, last_used FROM workspace_clones "
+                "WHERE cache_name = ? ORDER BY workspace",
+                (mirror.cache_name,),
+            )
+            mirror.workspace_clones = [
+                IndexedWorkspaceClone(
+                    workspace=workspace,
+                    path=path,
+                    size_bytes=size_bytes,
+                    last_used=last_used,
+                )
+                for workspace, path, size_bytes, last_used in clone_rows
+            ]
+        return mirrors
+
+    @contextmanager
+    def _transaction(self):
+        """Run a write transaction, locking the index from other writers upfront"""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
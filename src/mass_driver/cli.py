@@ -2,9 +2,19 @@
 import logging
 import sys
 from argparse import ArgumentParser, FileType
+from pathlib import Path
 from typing import Callable
 
 from mass_driver import commands
+from mass_driver.concurrency import parse_workers
+from mass_driver.freshness import REFRESH_POLICIES
+from mass_driver.git_backend import GIT_BACKENDS
+from mass_driver.metrics import DEFAULT_METRICS_INTERVAL
+from mass_driver.pipeline_run import parse_stage_workers
+from mass_driver.profiling import DEFAULT_TOP_FUNCTIONS
+from mass_driver.queue_run import DEFAULT_LEASE_SECONDS
+from mass_driver.repo_cache import parse_size
+from mass_driver.sharding import parse_shard
 
 
 def gen_parser() -> ArgumentParser:
@@ -16,6 +26,17 @@ def gen_parser() -> ArgumentParser:
     return parser
 
 
+def git_backend_arg(subparser: ArgumentParser):
+    """Inject the git-backend arg"""
+    subparser.add_argument(
+        "--git-backend",
+        help="How to do git status, commit, and refs reading: via git subprocesses "
+        "(gitpython, default), or in-process via dulwich (needs the 'dulwich' extra)",
+        choices=GIT_BACKENDS.keys(),
+        default="gitpython",
+    )
+
+
 def repo_list_group(subparser: ArgumentParser):
     """Inject the repo-path/repo-filelist group of args"""
     repolist_group = subparser.add_mutually_exclusive_group(required=False)
@@ -35,7 +56,7 @@ def cache_arg(subparser: ArgumentParser):
     """Add the cache/no-cache arguments"""
     subparser.add_argument(
         "--no-cache",
-        help="Disable any repo caching",
+        help="Disable any repo caching (cloning into a temp folder, wiped on exit)",
         action="store_true",
     )
 
@@ -56,6 +77,28 @@ def jsonout_args(subparser: ArgumentParser):
         help="If set, store the output to JSON file with this name",
         type=FileType("w"),
     )
+    subparser.add_argument(
+        "--jsonl-outfile",
+        help="If set, stream the output to JSON lines file with this name, one "
+        "line per repo as soon as it's processed, keeping memory use flat",
+        type=Path,
+    )
+
+
+def journal_args(subparser: ArgumentParser):
+    """Add the run journal/resume arguments"""
+    subparser.add_argument(
+        "--journal",
+        help="If set, append each repo's outcome to this journal file (JSON lines) "
+        "as soon as it's processed, for resuming after a crash via --resume",
+        type=Path,
+    )
+    subparser.add_argument(
+        "--resume",
+        help="Resume a crashed run from its journal file, skipping repos already "
+        "processed. Keeps appending to the same journal unless --journal is set",
+        type=Path,
+    )
 
 
 def plugin_subparser(subparser, plugin: str, func: Callable):
@@ -85,12 +128,124 @@ def run_subparser(subparser):
         help="Disable the interactive pause between Migration and Forge",
         action="store_true",
     )
+    run.add_argument(
+        "--executor",
+        help="How to run the processing of repos: one at a time (default), in "
+        "parallel via up to 8 threads, via a pool of processes (one per CPU), "
+        "via a pipeline of per-phase thread pools (clone, scan, migrate, commit), "
+        "or via asyncio git subprocesses (up to 64 concurrent clones)",
+        choices=commands.RUN_VARIANTS.keys(),
+        default="sequential",
+    )
+    run.add_argument(
+        "--workers",
+        help="How many repos to process at once, for non-sequential executors: a "
+        "number, or 'auto' to adapt to latency, errors and host load (thread and "
+        "process executors only). For 'pipeline', sizes the clone phase. For "
+        "'async', caps the concurrent git operations",
+        type=parse_workers,
+    )
+    run.add_argument(
+        "--stage-workers",
+        help="For the pipeline executor, how many threads each phase gets, as "
+        "comma-separated 'phase=N' pairs, like 'clone=16,migrate=8'. Phases not "
+        "given keep their default: clone=8 (or --workers), scan=2, migrate=2, "
+        "commit=2",
+        type=parse_stage_workers,
+    )
     run.add_argument(
         "--parallel",
-        help="Run the processing of repos in parallel, via up to 8 threads",
+        help="Run the processing of repos in parallel, via up to 8 threads. "
+        "Shorthand for '--executor=thread'",
+        action="store_const",
+        dest="executor",
+        const="thread",
+    )
+    run.add_argument(
+        "--order",
+        help="Order to process repos in: longest-first (default) starts the repos "
+        "that took longest in previous runs (or with biggest cached clone) first, "
+        "to avoid a long tail of huge repos. Needs the cache",
+        choices=["longest-first", "source"],
+        default="longest-first",
+    )
+    run.add_argument(
+        "--refresh",
+        help="How to refresh cached repos before the run: never (default, use "
+        "them as cached), always (fetch them all), or remote (fetch only those "
+        "whose remote branches moved, checked via git ls-remote)",
+        choices=REFRESH_POLICIES,
+        default="never",
+    )
+    run.add_argument(
+        "--refresh-max-age",
+        help="Skip refreshing cached repos checked less than this many seconds ago",
+        type=float,
+        default=0,
+    )
+    run.add_argument(
+        "--shard",
+        help="Only process one shard of the repos, as 'i/N' for shard i (from 1) "
+        "out of N, to split a run across machines. Repos are assigned to shards "
+        "by hash of their ID. Combine shards' outcomes via 'merge-outcomes'",
+        type=parse_shard,
+    )
+    run.add_argument(
+        "--progress",
+        help="Show live progress (on stderr): throughput, ETA, phases in flight, "
+        "outcomes so far. Rewrites a single line on terminals, else prints a "
+        "summary line every 30s",
         action="store_true",
     )
+    run.add_argument(
+        "--metrics-file",
+        help="If set, keep live metrics of the run (repos by outcome, clone cache "
+        "hits, phase durations...) in this Prometheus textfile, for node_exporter's "
+        "textfile collector to scrape",
+        type=Path,
+    )
+    run.add_argument(
+        "--metrics-interval",
+        help="How often to write the metrics file, in seconds",
+        type=float,
+        default=DEFAULT_METRICS_INTERVAL,
+    )
+    run.add_argument(
+        "--trace-file",
+        help="If set, save a trace of the run to this file, with a span per repo "
+        "and per phase on the worker that ran it, as Chrome trace JSON (load it in "
+        "ui.perfetto.dev or chrome://tracing)",
+        type=Path,
+    )
+    run.add_argument(
+        "--profile",
+        help="Profile each PatchDriver and Scanner call (via cProfile), saving the "
+        "stats combined across repos to this file (for pstats, snakeviz...), and "
+        "listing each plugin's hottest functions. Not for the process executor, "
+        "and only for the sequential executor from Python 3.12",
+        type=Path,
+    )
+    run.add_argument(
+        "--profile-top",
+        help="How many of the hottest functions to list per plugin, when profiling",
+        type=int,
+        default=DEFAULT_TOP_FUNCTIONS,
+    )
+    run.add_argument(
+        "--queue",
+        help="Run via a work queue in this (SQLite) file: enqueue repos, then drain "
+        "the queue along with any 'mass-driver worker' of the same queue file",
+        type=Path,
+    )
+    run.add_argument(
+        "--cache-max-size",
+        help="After the run, evict least-recently-used repos from cache until it "
+        "fits this size, in bytes or with binary suffix (like 500M, 10G)",
+        type=parse_size,
+    )
+    journal_args(run)
     cache_arg(run)
+    git_backend_arg(run)
     repo_list_group(run)
     run.set_defaults(dry_run=True, func=commands.run_command)
 
@@ -126,9 +281,94 @@ def reviewpr_subparser(subparser):
     run.add_argument(
         "forge", help="The name of the Forge plugin to use to look up status"
     )
+    run.add_argument(
+        "--progress",
+        help="Show live progress: throughput, ETA, PR statuses so far",
+        action="store_true",
+    )
     run.set_defaults(dry_run=True, func=commands.review_pr_command)
 
 
+def worker_subparser(subparser):
+    """Inject the worker subparser"""
+    worker = subparser.add_parser(
+        "worker",
+        help="Process repos from the work queue of a 'mass-driver run --queue'",
+    )
+    worker.add_argument(
+        "queue", help="The work queue file, as given to 'run --queue'", type=Path
+    )
+    worker.add_argument(
+        "--workers",
+        help="How many repos to process at once (threads)",
+        type=int,
+        default=1,
+    )
+    worker.add_argument(
+        "--lease",
+        help="Seconds a repo stays claimed by this worker, before other workers "
+        "can claim it back (say, if this worker died)",
+        type=float,
+        default=DEFAULT_LEASE_SECONDS,
+    )
+    cache_arg(worker)
+    git_backend_arg(worker)
+    worker.set_defaults(func=commands.worker_command)
+
+
+def cache_subparser(subparser):
+    """Inject the cache subparser, with its own subcommands"""
+    cache = subparser.add_parser(
+        "cache",
+        help="Manage the repo cache: show its size, or evict repos to fit a budget",
+    )
+    cache_commands = cache.add_subparsers(dest="cache_cmd", title="Cache commands")
+    cache_commands.required = True
+    stats = cache_commands.add_parser(
+        "stats", help="Show the size of the repo cache, and its biggest repos"
+    )
+    stats.set_defaults(func=commands.cache_stats_command)
+    gc = cache_commands.add_parser(
+        "gc",
+        help="Evict least-recently-used repos from cache until it fits a size budget",
+    )
+    gc.add_argument(
+        "--max-size",
+        help="The size budget of the cache, in bytes or with binary suffix (like "
+        "500M, 10G)",
+        type=parse_size,
+        required=True,
+    )
+    gc.add_argument(
+        "--force",
+        help="Evict repos even if their workspace clones hold unpushed commits "
+        "(like a migration not forged yet), losing those commits",
+        action="store_true",
+    )
+    gc.set_defaults(func=commands.cache_gc_command)
+
+
+def merge_outcomes_subparser(subparser):
+    """Inject the merge-outcomes subparser"""
+    merge = subparser.add_parser(
+        "merge-outcomes",
+        help="Combine the outcomes of sharded runs (see 'run --shard') into one",
+    )
+    merge.add_argument(
+        "outcome_files",
+        nargs="+",
+        help="The outcome files of each shard, as JSON (via --json-outfile) or "
+        "JSON lines (via --jsonl-outfile, with .jsonl extension)",
+        type=Path,
+    )
+    merge.add_argument(
+        "--json-outfile",
+        help="If set, store the merged output to JSON file with this name",
+        type=FileType("w"),
+    )
+    merge.set_defaults(func=commands.merge_outcomes_command)
+
+
 def subparsers(parser: ArgumentParser) -> ArgumentParser:
     """Add the subparsers for all commands"""
     subparser = parser.add_subparsers(dest="cmd", title="Commands")
@@ -139,6 +379,9 @@ def subparsers(parser: ArgumentParser) -> ArgumentParser:
     run_subparser(subparser)
     scanners_subparser(subparser)
     reviewpr_subparser(subparser)
+    merge_outcomes_subparser(subparser)
+    worker_subparser(subparser)
+    cache_subparser(subparser)
     return parser
 
 
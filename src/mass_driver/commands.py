@@ -3,11 +3,15 @@
 import logging
 import sys
 from argparse import Namespace
-from typing import Callable, Optional
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterator, Optional
 
 from pydantic import ValidationError
 
-from mass_driver.activity_run import sequential_run, thread_run
+from mass_driver.activity_run import process_run, sequential_run, thread_run
+from mass_driver.async_run import async_run
 from mass_driver.discovery import (
     discover_drivers,
     discover_forges,
@@ -20,10 +24,57 @@ from mass_driver.discovery import (
 )
 from mass_driver.forge_run import main as forge_main
 from mass_driver.forge_run import pause_until_ok
-from mass_driver.models.activity import ActivityLoaded, ActivityOutcome
-from mass_driver.models.repository import IndexedRepos, SourcedRepo
+from mass_driver.freshness import refresh_cache
+from mass_driver.git import DEFAULT_CACHE
+from mass_driver.git_backend import using_git_backend
+from mass_driver.journal import (
+    RunJournal,
+    finished_repos,
+    load_journal,
+    merge_resumed,
+    outcome_from_journal,
+)
+from mass_driver.metrics import RunMetrics, writing_metrics
+from mass_driver.models.activity import (
+    ActivityLoaded,
+    ActivityOutcome,
+    RepoCallback,
+    RepoOutcome,
+)
+from mass_driver.models.repository import IndexedRepos, RepoID, SourcedRepo
+from mass_driver.pipeline_run import pipeline_run
+from mass_driver.profiling import PluginProfiler, profiling, unprofilable_reason
+from mass_driver.progress import ProgressReporter, showing_progress
+from mass_driver.queue_run import (
+    WorkQueue,
+    drain_queue_threads,
+    queue_run,
+    worker_activity_from_queue,
+)
+from mass_driver.repo_cache import cached_repos, collect_garbage
 from mass_driver.review_run import review
-from mass_driver.summarize import summarize_forge, summarize_migration, summarize_source
+from mass_driver.scheduling import DURATIONS_FILE, DurationHistory, longest_first
+from mass_driver.sharding import merge_outcomes, select_shard
+from mass_driver.summarize import (
+    summarize_cache,
+    summarize_clone,
+    summarize_concurrency,
+    summarize_forge,
+    summarize_migration,
+    summarize_profile,
+    summarize_source,
+    summarize_timings,
+)
+from mass_driver.tracing import write_trace
+
+RUN_VARIANTS: dict[str, Callable[..., ActivityOutcome]] = {
+    "sequential": sequential_run,
+    "thread": thread_run,
+    "process": process_run,
+    "pipeline": pipeline_run,
+    "async": async_run,
+}
+"""The available run variants, by name, as selected by `mass-driver run --executor`"""
 
 
 def drivers_command(args: Namespace):
@@ -87,13 +138,70 @@ def run_command(args: Namespace) -> ActivityOutcome:
     if repos_sourced is None:  # No repo-list from CLI flags: call Source
         repos_sourced = source_config.source.discover()
         summarize_source(repos_sourced, sum_logger)
-    if needs_run(activity):
-        run_variant = thread_run if args.parallel else sequential_run
-        run_result = run_variant(
-            activity,
-            repos_sourced,
-            not args.no_cache,
+    if args.shard is not None:
+        shard_index, shard_count = args.shard
+        repos_sourced = select_shard(repos_sourced, shard_index, shard_count)
+        logger.info(
+            f"Shard {shard_index}/{shard_count}: processing {len(repos_sourced)} repos"
+        )
+    outcome_stream = (
+        RunJournal(
+            args.jsonl_outfile, fsync=False, append=False, repos_sourced=repos_sourced
         )
+        if args.jsonl_outfile is not None
+        else None
+    )
+    stream_callbacks: list[RepoCallback] = (
+        [outcome_stream.record] if outcome_stream is not None else []
+    )
+    metrics = RunMetrics()
+    if args.metrics_file is not None:
+        stream_callbacks.append(metrics.record)
+    try:
+        with (
+            writing_metrics(metrics, args.metrics_file, args.metrics_interval)
+            if args.metrics_file is not None
+            else nullcontext(),
+            using_git_backend(args.git_backend),
+        ):
+            result = run_and_forge(
+                args,
+                activity,
+                activity_str,
+                repos_sourced,
+                stream_callbacks,
+                logger,
+                sum_logger,
+            )
+    finally:
+        if outcome_stream is not None:
+            outcome_stream.close()
+            logger.info("Streamed outcome to given JSONL file")
+    if args.cache_max_size is not None and not args.no_cache:
+        collect_garbage(DEFAULT_CACHE, args.cache_max_size, logger)
+    return result
+
+
+def run_and_forge(
+    args: Namespace,
+    activity: ActivityLoaded,
+    activity_config: str,
+    repos_sourced: IndexedRepos,
+    repo_callbacks: list[RepoCallback],
+    logger: logging.Logger,
+    sum_logger: logging.Logger,
+) -> ActivityOutcome:
+    """Run the clone/scan/migrate activity, then the Forge, if any"""
+    if needs_run(activity):
+        with progress_of(args, "run", len(repos_sourced), repo_callbacks) as callbacks:
+            run_result = run_activity(
+                args, activity, repos_sourced, logger, callbacks, activity_config
+            )
+        if streams_repo_results(args):
+            run_result = streamed_outcome(args.jsonl_outfile, run_result, logger)
+        summarize_clone(run_result, sum_logger)
+        if run_result.concurrency_log is not None:
+            summarize_concurrency(run_result.concurrency_log, sum_logger)
         if activity.migration is not None and run_result.migration_result is not None:
             summarize_migration(run_result.migration_result, sum_logger)
     else:
@@ -104,18 +212,97 @@ def run_command(args: Namespace) -> ActivityOutcome:
         # Nothing else to do, just print completion and exit
         logger.info("No Forge: end")
         maybe_save_outcome(args, run_result)
+        maybe_save_trace(args, run_result)
+        summarize_timings(run_result.phase_timings, sum_logger)
         return run_result
     # Now guaranteed to have a Forge: pause + forge
     if not args.no_pause:
         logger.info("Review the commits now.")
         pause_until_ok("Type y/yes/continue to run the Forge\n")
-    result = forge_main(activity.forge, run_result)
+    repos_to_forge = len(run_result.repos_cloned)
+    with progress_of(args, "forge", repos_to_forge, repo_callbacks) as callbacks:
+        result = forge_main(
+            activity.forge, run_result, callbacks, activity.timeouts.push
+        )
     maybe_save_outcome(args, result)
+    maybe_save_trace(args, result)
+    if result.forge_result is not None:
+        summarize_forge(result.forge_result, sum_logger)
+    summarize_timings(result.phase_timings, sum_logger)
+    return result
+
+
+@contextmanager
+def progress_of(
+    args: Namespace, label: str, total: int, repo_callbacks: list[RepoCallback]
+) -> Iterator[list[RepoCallback]]:
+    """Show the progress of a stage if asked, giving the repo callbacks to pass it"""
+    if not args.progress:
+        yield repo_callbacks
+        return
+    progress = ProgressReporter(label, total)
+    with showing_progress(progress):
+        yield repo_callbacks + [progress.record]
+
+
+def merge_outcomes_command(args: Namespace) -> ActivityOutcome:
+    """Process the CLI for 'merge-outcomes'"""
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    logger = logging.getLogger("merge")
+    outcomes = []
+    for outcome_file in args.outcome_files:
+        logger.info(f"Reading outcome file {outcome_file}")
+        if outcome_file.suffix == ".jsonl":
+            outcomes.append(outcome_from_journal(outcome_file, logger))
+        else:
+            outcomes.append(ActivityOutcome.parse_file(outcome_file))
+    result = merge_outcomes(outcomes)
+    sum_logger = logging.getLogger("summarize")
+    summarize_source(result.repos_sourced, sum_logger)
+    summarize_clone(result, sum_logger)
+    if result.migration_result is not None:
+        summarize_migration(result.migration_result, sum_logger)
     if result.forge_result is not None:
         summarize_forge(result.forge_result, sum_logger)
+    summarize_timings(result.phase_timings, sum_logger)
+    maybe_save_outcome(args, result)
     return result
 
 
+def worker_command(args: Namespace):
+    """Process the CLI for 'worker'"""
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    logger = logging.getLogger("worker")
+    work_queue = WorkQueue(args.queue)
+    try:
+        activity = worker_activity_from_queue(work_queue)
+    finally:
+        work_queue.close()
+    logger.info(f"Draining work queue {args.queue} via {args.workers} workers")
+    with using_git_backend(args.git_backend):
+        drain_queue_threads(
+            args.queue, activity, not args.no_cache, args.workers, args.lease
+        )
+    logger.info("Work queue drained: exiting")
+    return True
+
+
+def cache_stats_command(args: Namespace):
+    """Process the CLI for 'cache stats'"""
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    summarize_cache(cached_repos(DEFAULT_CACHE), logging.getLogger("cache"))
+    return True
+
+
+def cache_gc_command(args: Namespace):
+    """Process the CLI for 'cache gc'"""
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    collect_garbage(
+        DEFAULT_CACHE, args.max_size, logging.getLogger("cache"), force=args.force
+    )
+    return True
+
+
 def scanners_command(args: Namespace):
     """Process the CLI for 'scan'"""
     logging.info("Available scanners:")
@@ -134,7 +321,7 @@ def review_pr_command(args: Namespace):
     pr_list = args.pr
     if args.pr_filelist:
         pr_list = args.pr_filelist.read().strip().split("\n")
-    review(pr_list, forge)
+    review(pr_list, forge, args.progress)
     return 0
 
 
@@ -189,12 +376,155 @@ def maybe_save_outcome(args: Namespace, outcome: ActivityOutcome):
     logging.info("Saved outcome to given JSON file")
 
 
+def maybe_save_trace(args: Namespace, outcome: ActivityOutcome):
+    """Consider saving the trace of the run's phases"""
+    if args.trace_file is None:
+        return
+    write_trace(outcome.phase_timings, args.trace_file)
+    logging.info(f"Saved trace of the run to {args.trace_file}")
+
+
 def save_outcome(outcome: ActivityOutcome, out_file):
     """Save the output to given JSON file handle"""
     out_file.write(outcome.json(indent=2))
     out_file.write("\n")
 
 
+def run_activity(
+    args: Namespace,
+    activity: ActivityLoaded,
+    repos_sourced: IndexedRepos,
+    logger: logging.Logger,
+    repo_callbacks: list[RepoCallback] | None = None,
+    activity_config: str | None = None,
+) -> ActivityOutcome:
+    """Run the clone/scan/migrate activity over repos, via selected run variant
+
+    With a work queue, the (raw) activity_config is enqueued for workers to load.
+
+    Journals each repo's outcome if asked to, skipping repos already done in the
+    journal we resume from, if any. Unless asked for Source order, repos are run
+    longest-first, from the durations of previous runs. Repos' outcomes (resumed
+    ones included) are passed on to repo_callbacks too. Cached repos are refreshed
+    upfront, as per the refresh policy.
+
+    When profiling, plugin calls are profiled throughout the run, then summarized.
+    """
+    repo_callbacks = list(repo_callbacks or [])
+    history: DurationHistory | None = None
+    resumed: dict[RepoID, RepoOutcome] = {}
+    if args.resume is not None:
+        resumed = finished_repos(load_journal(args.resume, logger))
+        logger.info(f"Resuming from journal: {len(resumed)} repos already done")
+        for repo_outcome in resumed.values():
+            for callback in repo_callbacks:
+                callback(repo_outcome)
+    repos_to_run = {
+        repo_id: repo
+        for repo_id, repo in repos_sourced.items()
+        if repo_id not in resumed
+    }
+    if args.order == "longest-first" and not args.no_cache:
+        history = DurationHistory(DURATIONS_FILE)
+        repos_to_run = longest_first(repos_to_run, history, DEFAULT_CACHE, logger)
+        repo_callbacks.append(history.record)
+    if not args.no_cache:
+        refresh_cache(
+            repos_to_run,
+            DEFAULT_CACHE,
+            activity.workspace,
+            args.refresh,
+            logger,
+            max_age=args.refresh_max_age,
+            timeout=activity.timeouts.clone,
+        )
+    journal_path = args.journal if args.journal is not None else args.resume
+    journal = RunJournal(journal_path) if journal_path is not None else None
+    if journal is not None:
+        repo_callbacks.append(journal.record)
+    if args.profile is not None:
+        reason = unprofilable_reason(args.executor, args.queue is not None)
+        if reason is not None:
+            raise ValueError(reason)
+    profiler = PluginProfiler()
+    run_variant = RUN_VARIANTS[args.executor]
+    if args.queue is not None:
+        if activity_config is None:
+            raise ValueError("Work queue run needs the raw activity config")
+        run_variant = partial(
+            queue_run, queue_path=args.queue, activity_config=activity_config
+        )
+    try:
+        with profiling(profiler) if args.profile is not None else nullcontext():
+            run_result = run_variant(
+                activity,
+                repos_to_run,
+                not args.no_cache,
+                repo_callbacks=repo_callbacks,
+                **run_variant_kwargs(args, logger),
+            )
+    finally:
+        if journal is not None:
+            journal.close()
+        if history is not None:
+            history.save()
+        if args.profile is not None:
+            profiler.save(args.profile)
+            logger.info(f"Saved plugins' profile to {args.profile}")
+            summarize_profile(profiler, args.profile_top, logger)
+    if resumed:
+        run_result = merge_resumed(run_result, repos_sourced, resumed)
+    return run_result
+
+
+def streams_repo_results(args: Namespace) -> bool:
+    """Check if repo results are only streamed to JSONL, not kept in memory
+
+    That's streaming the outcome to JSONL, with no full JSON to save: memory use
+    then stays flat during the run, see {py:func}`streamed_outcome`.
+    """
+    return args.jsonl_outfile is not None and not args.json_outfile
+
+
+def streamed_outcome(
+    jsonl_outfile: Path, run_result: ActivityOutcome, logger: logging.Logger
+) -> ActivityOutcome:
+    """Read back a run's streamed repo results, minus scan results, once it's done
+
+    So the end-of-run summary and the Forge get the (light) clone, patch, and
+    timing records, never held in memory during the run.
+    """
+    streamed = outcome_from_journal(jsonl_outfile, logger, keep_scan_results=False)
+    return streamed.copy(
+        update={
+            "repos_sourced": run_result.repos_sourced,
+            "repos_clone_timed_out": run_result.repos_clone_timed_out,
+            "concurrency_log": run_result.concurrency_log,
+        }
+    )
+
+
+def run_variant_kwargs(args: Namespace, logger: logging.Logger) -> dict:
+    """Get the extra arguments to pass to the selected run variant, from CLI args
+
+    Repo results only streamed to JSONL are dropped from memory once streamed.
+    """
+    kwargs: dict = {}
+    if streams_repo_results(args):
+        kwargs["keep_repo_results"] = False
+    if args.stage_workers is not None:
+        if args.executor == "pipeline" and args.queue is None:
+            kwargs["stage_workers"] = args.stage_workers
+        else:
+            logger.warning("Ignoring --stage-workers: only for the pipeline executor")
+    if args.workers is None:
+        return kwargs
+    if args.executor == "sequential" and args.queue is None:
+        logger.warning("Ignoring --workers: sequential executor has a single worker")
+        return kwargs
+    return kwargs | {"workers": args.workers}
+
+
 def needs_run(activity: ActivityLoaded) -> bool:
     """Check if we need to call the activity_run command = Clone/Mig/Scan step
 
@@ -0,0 +1,163 @@
+"""Adaptive concurrency for run engines, growing and shrinking the worker count
+
+Follows the AIMD (Additive Increase, Multiplicative Decrease) pattern of TCP
+congestion control: while repos complete healthily, add one worker per window of
+completions. On any sign of congestion, cut the worker count by a factor.
+
+Congestion is any of:
+
+- Errors: too many repos in the window failed (git host throttling us?)
+- Latency: mean duration of a network-bound phase (clone, pull, push) over the
+  window inflated way past its baseline
+- Host load: the machine's load average per CPU is too high
+
+Whole-repo durations mostly tell big repos from small ones: only network-bound
+phases' durations are watched, as measured by {py:mod}`mass_driver.timing`. Each
+phase's baseline is the fastest window seen, decaying towards recent windows, so
+that a lasting change in the mix of repos doesn't read as congestion forever.
+"""
+
+import logging
+import os
+import time
+from typing import Literal
+
+from mass_driver.models.activity import ConcurrencySample, PhaseTiming
+
+AUTO_WORKERS: Literal["auto"] = "auto"
+"""The special value of `--workers`, for adaptive concurrency"""
+
+Workers = int | Literal["auto"]
+"""How many workers a run engine gets: fixed number, or adaptive"""
+
+WATCHED_PHASES = ("clone", "pull", "push")
+"""The (network-bound) phases whose duration tells of congestion"""
+
+
+class AdaptiveConcurrency:
+    """An AIMD controller of how many repos can be processed at once
+
+    Feed it each repo's outcome and phase timings via {py:meth}`record`, read the
+    current worker count from {py:attr}`limit`. Each change of limit is kept in
+    {py:attr}`history`.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 64,
+        window: int = 8,
+        max_error_rate: float = 0.2,
+        max_latency_inflation: float = 2.0,
+        baseline_decay: float = 0.1,
+        max_load_per_cpu: float = 1.5,
+        decrease_factor: float = 0.5,
+        logger: logging.Logger | None = None,
+    ):
+        """Initialize the controller, starting at initial workers"""
+        self.limit = max(minimum, min(initial, maximum))
+        """The current number of repos allowed to be processed at once"""
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = window
+        """How many repo completions between two adjustments of the limit"""
+        self.max_error_rate = max_error_rate
+        self.max_latency_inflation = max_latency_inflation
+        self.baseline_decay = baseline_decay
+        """How far each slower window moves a phase's baseline towards it, 0 to 1"""
+        self.max_load_per_cpu = max_load_per_cpu
+        self.decrease_factor = decrease_factor
+        self.logger = logger if logger is not None else logging.getLogger("run")
+        self.history: list[ConcurrencySample] = []
+        """The limit over time, as changed by the controller"""
+        self._start = time.monotonic()
+        self._completed = 0
+        self._errors = 0
+        self._phase_seconds: dict[str, list[float]] = {}
+        self._baselines: dict[str, float] = {}
+        """The baseline duration of each watched phase, in seconds"""
+        self._change(self.limit, "initial")
+
+    def record(self, error: bool, timings: list[PhaseTiming] | None = None):
+        """Record a repo's outcome: whether it failed, and its phases' timings"""
+        self._completed += 1
+        self._errors += int(error)
+        for timing in timings or []:
+            if timing.phase in WATCHED_PHASES:
+                samples = self._phase_seconds.setdefault(timing.phase, [])
+                samples.append(timing.wall_seconds)
+        if self._completed < self.window:
+            return
+        error_rate = self._errors / self._completed
+        phase_means = {
+            phase: sum(samples) / len(samples)
+            for phase, samples in self._phase_seconds.items()
+        }
+        self._completed, self._errors, self._phase_seconds = 0, 0, {}
+        congestion = self.congestion(phase_means, error_rate)
+        self._update_baselines(phase_means)
+        if congestion is not None:
+            self._change(int(self.limit * self.decrease_factor), congestion)
+        else:
+            self._change(self.limit + 1, "healthy window")
+
+    def congestion(
+        self, phase_means: dict[str, float], error_rate: float
+    ) -> str | None:
+        """Describe the sign of congestion seen over last window, if any"""
+        if error_rate > self.max_error_rate:
+            return f"error rate {error_rate:.0%}"
+        for phase, mean_seconds in phase_means.items():
+            baseline = self._baselines.get(phase)
+            if (
+                baseline is not None
+                and mean_seconds > baseline * self.max_latency_inflation
+            ):
+                return f"{phase} {mean_seconds:.1f}s vs baseline {baseline:.1f}s"
+        load_per_cpu = host_load_per_cpu()
+        if load_per_cpu is not None and load_per_cpu > self.max_load_per_cpu:
+            return f"host load {load_per_cpu:.2f} per CPU"
+        return None
+
+    def _update_baselines(self, phase_means: dict[str, float]):
+        """Lower phases' baselines to faster windows, else decay towards slower"""
+        for phase, mean_seconds in phase_means.items():
+            baseline = self._baselines.get(phase)
+            if baseline is None or mean_seconds < baseline:
+                self._baselines[phase] = mean_seconds
+            else:
+                self._baselines[phase] += self.baseline_decay * (
+                    mean_seconds - baseline
+                )
+
+    def _change(self, new_limit: int, reason: str):
+        """Set the limit (within bounds), keeping track of changes"""
+        new_limit = max(self.minimum, min(new_limit, self.maximum))
+        if self.history and new_limit == self.limit:
+            return
+        self.limit = new_limit
+        elapsed = time.monotonic() - self._start
+        self.history.append(
+            ConcurrencySample(elapsed_seconds=elapsed, workers=new_limit, reason=reason)
+        )
+        self.logger.info(f"Concurrency set to {new_limit} workers ({reason})")
+
+
+def host_load_per_cpu() -> float | None:
+    """Get the 1-minute load average per CPU of this host, if available"""
+    try:
+        load_1min, _load_5min, _load_15min = os.getloadavg()
+    except OSError:
+        return None  # Not available on this platform
+    return load_1min / (os.cpu_count() or 1)
+
+
+def parse_workers(workers: str) -> Workers:
+    """Parse the value of the `--workers` flag: a positive integer, or 'auto'"""
+    if workers == AUTO_WORKERS:
+        return AUTO_WORKERS
+    worker_count = int(workers)
+    if worker_count < 1:
+        raise ValueError(f"Need at least 1 worker, got {worker_count}")
+    return worker_count
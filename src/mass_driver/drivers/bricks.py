@@ -1,6 +1,7 @@
 """Patterns of PatchDriver that are reusable"""
 
 from logging import Logger
+from typing import ClassVar
 
 from mass_driver.models.patchdriver import PatchDriver, PatchOutcome, PatchResult
 from mass_driver.models.repository import ClonedRepo
@@ -15,6 +16,12 @@ class SingleFileEditor(PatchDriver):
 
     """
 
+    sparse_checkout: ClassVar[bool] = False
+    """Whether the driver reads and writes just the target file, cloning only it
+
+    Opt-in, as subclasses may touch other files too. Set it on the driver class.
+    """
+
     target_file: str
     """The file to edit"""
 
@@ -22,6 +29,15 @@ class SingleFileEditor(PatchDriver):
         """Process the file, returning the new content or a PatchResult"""
         raise NotImplementedError("Derive this function yourself")
 
+    def needed_paths(self) -> list[str] | None:
+        """Get the target file, if it's the only file this driver needs
+
+        See {py:attr}`sparse_checkout`: defaults to None, needing all files.
+        """
+        if not self.sparse_checkout:
+            return None
+        return [f"/{self.target_file}"]
+
     def run(self, repo: ClonedRepo) -> PatchResult:
         """Edit the target file"""
         target_fullpath = repo.cloned_path / self.target_file
@@ -46,6 +62,7 @@ class SingleFileEditor(PatchDriver):
         if file_content_after == file_content_before:
             return PatchResult(outcome=PatchOutcome.ALREADY_PATCHED)
         target_fullpath.write_text(file_content_after)
+        self.record_change(self.target_file)
         return PatchResult(outcome=PatchOutcome.PATCHED_OK)
 
 
@@ -60,6 +77,13 @@ class GlobFileEditor(PatchDriver):
     {py:func}`process_outcomes`, see the {py:attr}`fail_on_any_error` parameter.
     """
 
+    sparse_checkout: ClassVar[bool] = False
+    """Whether the driver reads and writes just the target files, cloning only them
+
+    Opt-in, as subclasses may touch other files too (say, in {py:meth}`before_run`).
+    Set it on the driver class.
+    """
+
     target_glob: str
     """The glob for files to edit, relative to project root"""
     fail_on_any_error: bool = True
@@ -69,6 +93,15 @@ class GlobFileEditor(PatchDriver):
         """Process a file, returning the new content or a PatchResult"""
         raise NotImplementedError("Derive this function yourself")
 
+    def needed_paths(self) -> list[str] | None:
+        """Get the files matching the target glob, if the only files this driver needs
+
+        See {py:attr}`sparse_checkout`: defaults to None, needing all files.
+        """
+        if not self.sparse_checkout:
+            return None
+        return [f"/{self.target_glob}"]
+
     def before_run(self, targets):
         """Hook for preamble tasks before the main run function"""
         pass
@@ -99,6 +132,7 @@ class GlobFileEditor(PatchDriver):
                     outcome=PatchOutcome.ALREADY_PATCHED
                 )
             target_fullpath.write_text(file_content_after)
+            self.record_change(target_relpath)
             outcomes[target_relpath] = PatchResult(outcome=PatchOutcome.PATCHED_OK)
         return process_outcomes(
             outcomes, fail_on_any_error=self.fail_on_any_error, logger=self.logger
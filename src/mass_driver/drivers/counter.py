@@ -10,6 +10,9 @@ from mass_driver.models.patchdriver import PatchOutcome, PatchResult
 class Counter(SingleFileEditor):
     """Increments a counter in a given file of repo, creating if non-existent"""
 
+    stateless = True
+    sparse_checkout = True
+
     target_count: int
 
     def process_file(self, file_contents: str) -> str | PatchResult:
@@ -9,9 +9,17 @@ from mass_driver.models.repository import ClonedRepo
 class FileDeleter(PatchDriver):
     """Deletes files specified"""
 
+    stateless = True
+
     deletion_target: str | list[str]
     """The specific file or files to delete"""
 
+    def needed_paths(self) -> list[str] | None:
+        """Get the only files this driver deletes"""
+        if isinstance(self.deletion_target, str):
+            return [f"/{self.deletion_target}"]
+        return [f"/{target}" for target in self.deletion_target]
+
     def run(self, repo: ClonedRepo) -> PatchResult:
         """Apply file deletion"""
         target_files = self.deletion_target
@@ -24,6 +32,7 @@ class FileDeleter(PatchDriver):
                 continue
             abs_to_delete.unlink()
             files_deleted.append(file_to_delete)
+            self.record_change(file_to_delete)
         if not files_deleted:
             return PatchResult(outcome=PatchOutcome.PATCH_DOES_NOT_APPLY)
         return PatchResult(outcome=PatchOutcome.PATCHED_OK)
@@ -1,6 +1,8 @@
 """Generic shell command driver"""
 
 
+import os
+import signal
 import subprocess
 
 from mass_driver.models.patchdriver import PatchDriver, PatchOutcome, PatchResult
@@ -20,25 +22,43 @@ class ShellDriver(PatchDriver):
     exit code).
     """
 
+    stateless = True
+
     command: list[str]
     """Shell command to apply to the repository, as string list"""
     shell: bool = True
-    """Passed to subprocess.run, to enable true shell behaviour rather than exec"""
+    """Passed to subprocess.Popen, to enable true shell behaviour rather than exec"""
 
     def run(self, repo: ClonedRepo) -> PatchResult:
-        """Run the command on the repo"""
-        cmd = subprocess.run(
+        """Run the command on the repo
+
+        The command gets no stdin (can't hang waiting on input), and is killed
+        (along with any child process) past the driver's timeout, if any.
+        """
+        with subprocess.Popen(
             self.command,
             cwd=repo.cloned_path,
             shell=self.shell,
-            capture_output=True,
-        )
-        if cmd.stdout.strip():
-            self.logger.info(cmd.stdout)
-        if cmd.stderr.strip():
-            self.logger.error(cmd.stderr)
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,  # Own process group, to kill it whole
+        ) as cmd:
+            try:
+                stdout, stderr = cmd.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(cmd.pid, signal.SIGKILL)
+                cmd.communicate()
+                return PatchResult(
+                    outcome=PatchOutcome.TIMED_OUT,
+                    details=f"Command timed out after {self.timeout}s",
+                )
+        if stdout.strip():
+            self.logger.info(stdout)
+        if stderr.strip():
+            self.logger.error(stderr)
         return (
             PatchResult(outcome=PatchOutcome.PATCHED_OK)
             if cmd.returncode == 0
-            else PatchResult(outcome=PatchOutcome.PATCH_ERROR, details=cmd.stderr)
+            else PatchResult(outcome=PatchOutcome.PATCH_ERROR, details=stderr)
         )
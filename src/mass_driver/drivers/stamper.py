@@ -14,11 +14,17 @@ class Stamper(PatchDriver):
     New file's ownership will be set after succesful write.
     """
 
+    stateless = True
+
     filepath_to_create: str
     file_contents: str
     file_ownership: str = "0664"
     """Unix file permissions for the new file"""
 
+    def needed_paths(self) -> list[str] | None:
+        """Get the only file this driver creates"""
+        return [f"/{self.filepath_to_create}"]
+
     def run(self, repo: ClonedRepo) -> PatchResult:
         """Create the file on given repo, creating folder the way"""
         target_path_abs = repo.cloned_path / Path(self.filepath_to_create)
@@ -35,4 +41,5 @@ class Stamper(PatchDriver):
                 fd.write("\n")
         # Set file ownership (octal conversion)
         target_path_abs.chmod(int(self.file_ownership, 8))
+        self.record_change(self.filepath_to_create)
         return PatchResult(outcome=PatchOutcome.PATCHED_OK, details="File created")
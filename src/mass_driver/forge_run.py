@@ -1,17 +1,31 @@
 """The main run-command of Forges, creating mass-PRs from existing branhces"""
 import logging
 
-from mass_driver.models.activity import ActivityOutcome, IndexedPRResult
+from mass_driver.models.activity import (
+    ActivityOutcome,
+    IndexedPRResult,
+    PhaseTiming,
+    RepoCallback,
+    RepoOutcome,
+)
 from mass_driver.models.forge import PROutcome, PRResult
 from mass_driver.models.migration import ForgeLoaded
 from mass_driver.process_repo import forge_per_repo
+from mass_driver.timeouts import PhaseTimeoutError
+from mass_driver.timing import recording_timings
 
 
 def main(
     config: ForgeLoaded,
     progress: ActivityOutcome,
+    repo_callbacks: list[RepoCallback] | None = None,
+    push_timeout: float | None = None,
 ) -> ActivityOutcome:
-    """Process repo_paths with the given Forge"""
+    """Process repo_paths with the given Forge
+
+    Each repo's PR result is also passed on to the given callbacks, as it arrives.
+    Repos whose git push runs past push_timeout seconds are marked PR_TIMED_OUT.
+    """
     repo_count = len(progress.repos_sourced)
     logging.info(f"Processing {repo_count} with Forge...")
     pr_results: IndexedPRResult = {}
@@ -21,12 +35,19 @@ def main(
         pause_every = config.interactive_pause_every
         if pause_every is not None and repo_index % pause_every == 0:
             pause_until_ok(f"Reached {pause_every} actions. Continue?\n")
+        timings: list[PhaseTiming] = []
         try:
             logging.info(
                 f"[{repo_index:03d}/{repo_count:03d}] Processing {repo.cloned_path}..."
             )
-            result = forge_per_repo(config, repo)
+            with recording_timings(timings):
+                result = forge_per_repo(config, repo, push_timeout)
             pr_results[repo_id] = result
+        except PhaseTimeoutError as e:
+            logging.error(f"Timed out pushing repo '{repo_id}': {e}")
+            pr_results[repo_id] = PRResult(
+                outcome=PROutcome.PR_TIMED_OUT, details=str(e)
+            )
         except Exception as e:
             logging.error(f"Error processing repo '{repo_id}'")
             logging.error("Error was: {e}")
@@ -34,7 +55,13 @@ def main(
                 outcome=PROutcome.PR_FAILED,
                 details=f"Unhandled exception caught during patching. Error was: {e}",
             )
-            continue
+        progress.phase_timings.setdefault(repo_id, []).extend(timings)
+        for callback in repo_callbacks or []:
+            callback(
+                RepoOutcome(
+                    repo_id=repo_id, forge_result=pr_results[repo_id], timings=timings
+                )
+            )
     logging.info("Action completed: exiting")
     progress.forge_result = pr_results
     return progress
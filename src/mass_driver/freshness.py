@@ -0,0 +1,141 @@
+"""Keep cached mirrors fresh: fetch those whose remote moved, before a run
+
+Without refreshing (the default), cached repos are used as-is, maybe stale. With
+a refresh policy, every cached mirror not checked within the max age is either
+fetched (`always`), or fetched only if its remote branches moved (`remote`, via a
+cheap `git ls-remote`). Checks run concurrently across the fleet, the cache's index
+recording when each mirror was last checked, and what its remote looked like then.
+
+Once a mirror is fetched, the activity's workspace clone of it (if any) catches up
+from the mirror, without network.
+"""
+
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+
+from mass_driver.cache_index import CacheIndex, Freshness
+from mass_driver.git import (
+    GitRepo,
+    clone_target_path,
+    index_fetch,
+    list_remote_branches,
+    mirror_path,
+    repo_cache_name,
+    sync_from_mirror,
+)
+from mass_driver.models.repository import IndexedRepos, SourcedRepo
+
+REFRESH_POLICIES = ["never", "always", "remote"]
+"""How to refresh cached mirrors: not at all, fetching all, or those that moved"""
+
+DEFAULT_REFRESH_WORKERS = 16
+"""How many mirrors to check (and fetch) at once"""
+
+
+def refresh_repo(
+    repo: SourcedRepo,
+    cache_folder: Path,
+    workspace: str,
+    policy: str,
+    max_age: float = 0,
+    timeout: float | None = None,
+) -> str:
+    """Refresh a repo's mirror (and workspace clone) as per policy, if cached
+
+    Returns:
+      What was done: 'not cached', 'fresh' (recently checked, or remote didn't
+      move), or 'fetched'
+    """
+    mirror = mirror_path(repo.clone_url, cache_folder)
+    if Path(repo.clone_url).is_dir() or not mirror.is_dir():
+        return "not cached"
+    cache_name = str(repo_cache_name(repo.clone_url))
+    with closing(CacheIndex(cache_folder)) as index:
+        if index.mirror(cache_name) is None:  # Mirrored before the index existed
+            index_fetch(cache_folder, repo.clone_url, mirror.stat().st_mtime)
+        freshness = index.freshness(cache_name)
+    now = time.time()
+    if freshness is not None and now - freshness.checked_at < max_age:
+        return "fresh"
+    mirror_repo = GitRepo(mirror)
+    remote_branches: dict[str, str] = {}
+    if policy == "remote":
+        remote_branches = list_remote_branches(mirror_repo, timeout)
+        if remote_branches == list_mirror_branches(mirror_repo):
+            record_freshness(cache_folder, cache_name, now, remote_branches)
+            return "fresh"
+    mirror_repo.git.fetch("origin", prune=True, kill_after_timeout=timeout)
+    index_fetch(cache_folder, repo.clone_url)
+    record_freshness(
+        cache_folder,
+        cache_name,
+        now,
+        remote_branches or list_mirror_branches(mirror_repo),
+    )
+    clone_target = clone_target_path(repo.clone_url, cache_folder, workspace)
+    if clone_target.is_dir():
+        sync_from_mirror(GitRepo(clone_target), mirror, timeout)
+    return "fetched"
+
+
+def record_freshness(
+    cache_folder: Path,
+    cache_name: str,
+    checked_at: float,
+    remote_branches: dict[str, str],
+):
+    """Record in the cache index when a mirror was checked, and its remote then"""
+    with closing(CacheIndex(cache_folder)) as index:
+        index.record_freshness(
+            cache_name,
+            Freshness(checked_at=checked_at, remote_branches=remote_branches),
+        )
+
+
+def list_mirror_branches(mirror_repo: GitRepo) -> dict[str, str]:
+    """List the branches of a mirror, as commit SHA by branch ref"""
+    refs = mirror_repo.git.for_each_ref(
+        "--format=%(objectname) %(refname)", "refs/heads"
+    )
+    return {ref: sha for sha, ref in (line.split() for line in refs.splitlines())}
+
+
+def refresh_cache(
+    repos: IndexedRepos,
+    cache_folder: Path,
+    workspace: str,
+    policy: str,
+    logger: logging.Logger,
+    max_age: float = 0,
+    workers: int = DEFAULT_REFRESH_WORKERS,
+    timeout: float | None = None,
+) -> Counter[str]:
+    """Refresh the cached mirrors of repos as per policy, workers at once
+
+    Repos failing to refresh are used as cached, stale.
+
+    Returns:
+      How many repos were refreshed, by what was done
+    """
+    outcomes: Counter[str] = Counter()
+    if policy == "never":
+        return outcomes
+
+    def refresh(repo: SourcedRepo) -> str:
+        try:
+            return refresh_repo(repo, cache_folder, workspace, policy, max_age, timeout)
+        except Exception as e:
+            logger.warning(f"Error refreshing {repo.repo_id}, using it stale: {e}")
+            return "error"
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="refresh") as executor:
+        outcomes.update(executor.map(refresh, repos.values()))
+    logger.info(
+        f"Refreshed cache ({policy}): "
+        + ", ".join(f"{count} {outcome}" for outcome, count in outcomes.items())
+    )
+    return outcomes
@@ -1,91 +1,627 @@
-"""Manipulating git repos natively, without much knowledge of mass-driver models"""
+"""Manipulating git repos natively, without much knowledge of mass-driver models
 
+Remote repos are cached as bare mirrors, fetched incrementally, under
+`<cache>/mirrors/`. Each workspace (one per activity, see
+{py:attr}`mass_driver.models.activity.ActivityLoaded.workspace`) gets its own clone of
+a repo under `<cache>/workspaces/<workspace>/`, borrowing the mirror's objects instead
+of copying them (`git clone --shared`), while keeping its own branches. Mirrors and
+workspace clones are recorded in the cache's index, see
+{py:class}`mass_driver.cache_index.CacheIndex`.
+
+Activities declaring which files their plugins need (see
+{py:attr}`mass_driver.models.activity.ActivityLoaded.sparse_paths`) mirror repos
+partially, without file contents (blobs), and check out only the files needed
+(sparse-checkout). Missing file contents are fetched from the remote on demand.
+Activities needing no checkout at all (see
+{py:attr}`mass_driver.models.activity.ActivityLoaded.needs_checkout`) get the mirror
+alone, with no workspace clone.
+"""
+
+import asyncio
+import atexit
 import logging
-from pathlib import Path
+import os
+import shutil
+import threading
+from contextlib import closing
+from hashlib import sha1
+from pathlib import Path, PurePosixPath
 from tempfile import mkdtemp
 
+from git import GitCommandError
 from git import Repo as GitRepo
 
+from mass_driver.cache_index import CacheIndex
+from mass_driver.git_backend import git_backend
 from mass_driver.models.migration import MigrationLoaded
 
 DEFAULT_CACHE = Path(".mass_driver/repos/")
 
+DEFAULT_WORKSPACE = "default"
+"""The workspace of activities with no migration branch to name theirs after"""
+
+MIRROR_REFSPEC = "+refs/heads/*:refs/heads/*"
+"""What mirrors fetch: all branches of the remote, as their own branches"""
+
+PARTIAL_CLONE_FILTER = "blob:none"
+"""What partial mirrors leave out: file contents, fetched on demand"""
+
 
 def clone_if_remote(
-    repo_path: str, cache_folder: Path, logger: logging.Logger
+    repo_path: str,
+    cache_folder: Path,
+    logger: logging.Logger,
+    timeout: float | None = None,
+    workspace: str = DEFAULT_WORKSPACE,
+    sparse_paths: list[str] | None = None,
+    checkout: bool = True,
+    clone_local: bool = False,
 ) -> GitRepo:
-    """Build a GitRepo; If repo_path isn't a directory, clone it"""
+    """Build a GitRepo; If repo_path isn't a directory, clone it into workspace
+
+    Clones of the workspace are made from the repo's mirror: cloned if missing,
+    else fetched (incrementally) first. Each git command is killed past timeout
+    seconds, if set.
+
+    Given sparse_paths (gitignore-style patterns), missing mirrors are cloned
+    partially, and only matching files are checked out. None checks out all files.
+    Without checkout, the (bare) mirror is all we get, no workspace clone.
+
+    Local repos are used in place, unless asked to clone_local, see
+    {py:func}`clone_local_repo`.
+    """
     if Path(repo_path).is_dir():
+        if clone_local and checkout:
+            return clone_local_repo(
+                repo_path, cache_folder, logger, timeout, workspace, sparse_paths
+            )
         logger.info("Given an existing (local) repo: no cloning")
-        # Clone it into cache anyway
-        return GitRepo(path=repo_path)  # TODO: Actually clone-move the repo on the way.
-    # SSH clone URL e.g: git@github.com:OverkillGuy/python-template
-    if ":" in repo_path:  # Presence of : is proxy for SSH clone URL
-        *_junk, repo_blurb = repo_path.split(":")
-        org, repo_name = repo_blurb.split("/")
-    else:
-        org = "local"
-        repo_name = Path(repo_path).name
-    clone_target = cache_folder / org / repo_name
+        return GitRepo(path=repo_path)
+    mirror = mirror_path(repo_path, cache_folder)
+    if not checkout and mirror.is_dir():
+        logger.info("Given a URL we mirrored already, no checkout needed: no cloning")
+        index_use(cache_folder, repo_path, workspace)
+        return GitRepo(mirror)
+    clone_target = clone_target_path(repo_path, cache_folder, workspace)
     if clone_target.is_dir():
         logger.info("Given a URL for we cloned already: no cloning")
-        return GitRepo(clone_target)
-    logger.info("Given a URL, cache miss: cloning")
+        index_use(cache_folder, repo_path, workspace)
+        cloned = GitRepo(clone_target)
+        sparse_command = sparse_checkout_command(clone_target, sparse_paths)
+        if sparse_command is not None:
+            cloned.git.execute(sparse_command, kill_after_timeout=timeout)
+        return cloned
+    if mirror.is_dir():
+        logger.info("Given a URL we mirrored already: fetching mirror")
+        GitRepo(mirror).git.fetch("origin", prune=True, kill_after_timeout=timeout)
+    else:
+        logger.info("Given a URL, cache miss: mirroring")
+        staging = mirror_staging_path(mirror)
+        staged = GitRepo.clone_from(
+            url=repo_path,
+            to_path=staging,
+            bare=True,
+            filter=None if sparse_paths is None else PARTIAL_CLONE_FILTER,
+            kill_after_timeout=timeout,
+        )
+        staged.git.config("remote.origin.fetch", MIRROR_REFSPEC)
+        install_mirror(staging, mirror)
+    index_fetch(cache_folder, repo_path)
+    if not checkout:
+        return GitRepo(mirror)
     cloned = GitRepo.clone_from(
-        url=repo_path,
+        url=str(mirror.resolve()),
         to_path=clone_target,
-        multi_options=["--depth=1"],
+        shared=True,
+        no_checkout=True,
+        kill_after_timeout=timeout,
     )
+    try:
+        for command in workspace_setup_commands(mirror, repo_path, sparse_paths):
+            cloned.git.execute(command, kill_after_timeout=timeout)
+    except BaseException:
+        shutil.rmtree(clone_target)  # Never leave a half-setup workspace in cache
+        raise
+    index_workspace_clone(cache_folder, repo_path, workspace)
     return cloned
 
 
+def clone_local_repo(
+    repo_path: str,
+    cache_folder: Path,
+    logger: logging.Logger,
+    timeout: float | None = None,
+    workspace: str = DEFAULT_WORKSPACE,
+    sparse_paths: list[str] | None = None,
+) -> GitRepo:
+    """Clone a local repo into workspace, hardlinking its objects instead of copying
+
+    Near-instant, and using no extra space for objects: the repo's own folder is
+    left untouched, and concurrent activities get their own clones. Cloned
+    already, the clone catches up with the local repo instead (see
+    {py:func}`sync_from_mirror`). The clone's origin is the local repo's own
+    origin, if any, for pushing. Recorded in the cache's index, with the local
+    repo standing in for the mirror, see {py:func}`index_local_clone`.
+    """
+    local_repo = Path(repo_path).resolve()
+    clone_target = clone_target_path(repo_path, cache_folder, workspace)
+    if clone_target.is_dir():
+        logger.info("Given a local repo we cloned already: catching up with it")
+        cloned = GitRepo(clone_target)
+        sync_from_mirror(cloned, local_repo, timeout)
+        sparse_command = sparse_checkout_command(clone_target, sparse_paths)
+        if sparse_command is not None:
+            cloned.git.execute(sparse_command, kill_after_timeout=timeout)
+        index_local_clone(cache_folder, repo_path, workspace)
+        return cloned
+    logger.info("Given a local repo: cloning into cache, hardlinking its objects")
+    # Local path (not file:// URL) clones hardlink objects, else copy them
+    cloned = GitRepo.clone_from(
+        url=str(local_repo),
+        to_path=clone_target,
+        no_checkout=True,
+        kill_after_timeout=timeout,
+    )
+    local_remotes = GitRepo(local_repo).remotes
+    origin_url = (
+        local_remotes.origin.url if "origin" in local_remotes else str(local_repo)
+    )
+    try:
+        for command in workspace_setup_commands(local_repo, origin_url, sparse_paths):
+            cloned.git.execute(command, kill_after_timeout=timeout)
+    except BaseException:
+        shutil.rmtree(clone_target)  # Never leave a half-setup workspace in cache
+        raise
+    index_local_clone(cache_folder, repo_path, workspace, created=True)
+    return cloned
+
+
+def clone_cache_hit(repo_path: str, cache_folder: Path) -> bool | None:
+    """Tell whether cloning repo_path would hit the cache, None for local repos
+
+    Cloning from an existing mirror is a hit, though it fetches the mirror first.
+    """
+    if Path(repo_path).is_dir():
+        return None
+    return mirror_path(repo_path, cache_folder).is_dir()
+
+
+async def clone_if_remote_async(
+    repo_path: str,
+    cache_folder: Path,
+    logger: logging.Logger,
+    workspace: str = DEFAULT_WORKSPACE,
+    sparse_paths: list[str] | None = None,
+    checkout: bool = True,
+    clone_local: bool = False,
+    timeout: float | None = None,
+) -> GitRepo:
+    """Build a GitRepo; If repo_path isn't a directory, clone it via asyncio subprocess
+
+    Equivalent to {py:func}`clone_if_remote`, without blocking a thread on cloning.
+    Other blocking work (reading repos, the cache index) runs in threads, keeping
+    the event loop free for other repos. Git commands run in threads (local repos'
+    clones) are killed past timeout seconds, if set.
+    """
+    if Path(repo_path).is_dir():
+        if clone_local and checkout:
+            return await asyncio.to_thread(
+                clone_local_repo,
+                repo_path,
+                cache_folder,
+                logger,
+                timeout=timeout,
+                workspace=workspace,
+                sparse_paths=sparse_paths,
+            )
+        logger.info("Given an existing (local) repo: no cloning")
+        return await asyncio.to_thread(GitRepo, repo_path)
+    mirror = mirror_path(repo_path, cache_folder)
+    if not checkout and mirror.is_dir():
+        logger.info("Given a URL we mirrored already, no checkout needed: no cloning")
+        await asyncio.to_thread(index_use, cache_folder, repo_path, workspace)
+        return await asyncio.to_thread(GitRepo, mirror)
+    clone_target = clone_target_path(repo_path, cache_folder, workspace)
+    if clone_target.is_dir():
+        logger.info("Given a URL for we cloned already: no cloning")
+        await asyncio.to_thread(index_use, cache_folder, repo_path, workspace)
+        sparse_command = await asyncio.to_thread(
+            sparse_checkout_command, clone_target, sparse_paths
+        )
+        if sparse_command is not None:
+            await run_git_async(*sparse_command[1:], cwd=clone_target)
+        return await asyncio.to_thread(GitRepo, clone_target)
+    if mirror.is_dir():
+        logger.info("Given a URL we mirrored already: fetching mirror")
+        await run_git_async("fetch", "--prune", "origin", cwd=mirror)
+    else:
+        logger.info("Given a URL, cache miss: mirroring")
+        staging = mirror_staging_path(mirror)
+        partial = [] if sparse_paths is None else [f"--filter={PARTIAL_CLONE_FILTER}"]
+        await run_git_async("clone", "--bare", *partial, "--", repo_path, str(staging))
+        await run_git_async(
+            "config", "remote.origin.fetch", MIRROR_REFSPEC, cwd=staging
+        )
+        await asyncio.to_thread(install_mirror, staging, mirror)
+    await asyncio.to_thread(index_fetch, cache_folder, repo_path)
+    if not checkout:
+        return await asyncio.to_thread(GitRepo, mirror)
+    await run_git_async(
+        "clone",
+        "--shared",
+        "--no-checkout",
+        "--",
+        str(mirror.resolve()),
+        str(clone_target),
+    )
+    try:
+        setup_commands = await asyncio.to_thread(
+            workspace_setup_commands, mirror, repo_path, sparse_paths
+        )
+        for command in setup_commands:
+            await run_git_async(*command[1:], cwd=clone_target)
+    except BaseException:
+        shutil.rmtree(clone_target)  # Never leave a half-setup workspace in cache
+        raise
+    await asyncio.to_thread(index_workspace_clone, cache_folder, repo_path, workspace)
+    return await asyncio.to_thread(GitRepo, clone_target)
+
+
+def is_partial_mirror(mirror: Path) -> bool:
+    """Tell whether a mirror is partial: missing file contents, fetched on demand"""
+    config = GitRepo(mirror).config_reader()
+    return bool(config.get_value('remote "origin"', "promisor", default=False))
+
+
+def workspace_setup_commands(
+    mirror: Path, repo_path: str, sparse_paths: list[str] | None = None
+) -> list[list[str]]:
+    """Get the git commands setting up a workspace, freshly cloned without checkout
+
+    The workspace's origin is set back to the remote, for pushing. Workspaces of
+    partial mirrors fetch missing file contents from that remote too.
+    """
+    commands = [["git", "remote", "set-url", "origin", repo_path]]
+    if is_partial_mirror(mirror):
+        commands += [
+            ["git", "config", "remote.origin.promisor", "true"],
+            ["git", "config", "remote.origin.partialclonefilter", PARTIAL_CLONE_FILTER],
+        ]
+    if sparse_paths is not None:
+        commands.append(["git", "sparse-checkout", "set", "--no-cone", *sparse_paths])
+    commands.append(["git", "reset", "--quiet", "--hard"])  # The actual checkout
+    return commands
+
+
+def sparse_checkout_patterns(repo_path: Path) -> list[str] | None:
+    """Get the sparse-checkout patterns of a (non-bare) repo, None if not sparse"""
+    repo = GitRepo(repo_path)
+    try:  # Via git itself, as sparse-checkout sets it in the per-worktree config
+        sparse = repo.git.config("--bool", "core.sparseCheckout")
+    except GitCommandError:  # Unset
+        return None
+    if sparse != "true":
+        return None
+    patterns_file = Path(repo.git_dir) / "info" / "sparse-checkout"
+    if not patterns_file.is_file():
+        return None
+    return patterns_file.read_text().splitlines()
+
+
+def sparse_checkout_command(
+    repo_path: Path, sparse_paths: list[str] | None
+) -> list[str] | None:
+    """Get the git command to check out sparse_paths only, None if already so
+
+    None sparse_paths check out all files.
+    """
+    current_paths = sparse_checkout_patterns(repo_path)
+    if current_paths == sparse_paths:
+        return None
+    if sparse_paths is None:
+        return ["git", "sparse-checkout", "disable"]
+    return ["git", "sparse-checkout", "set", "--no-cone", *sparse_paths]
+
+
+def list_remote_branches(repo: GitRepo, timeout: float | None = None) -> dict[str, str]:
+    """List the branches of a repo's origin remote (cheaply), as SHA by branch ref"""
+    refs = str(repo.git.ls_remote("--heads", "origin", kill_after_timeout=timeout))
+    return {ref: sha for sha, ref in (line.split() for line in refs.splitlines())}
+
+
+def unpushed_branches(repo: GitRepo) -> list[str]:
+    """List a repo's local branches with commits on none of its origin's branches
+
+    Such as a migration's branch, committed but not pushed (yet).
+    """
+    branches = str(repo.git.for_each_ref("--format=%(refname:short)", "refs/heads"))
+    return [
+        branch
+        for branch in branches.split()
+        if repo.git.rev_list(branch, "--not", "--remotes=origin", max_count=1)
+    ]
+
+
+def sync_from_mirror(repo: GitRepo, mirror: Path, timeout: float | None = None):
+    """Catch a clone up with its mirror, without network
+
+    The clone's remote branches are updated from the mirror. If on a branch
+    tracking one of those (a base branch, never committed to), it's reset to it.
+    Other branches (like a migration's) are left as-is.
+    """
+    repo.git.fetch(
+        str(mirror.resolve()),
+        "+refs/heads/*:refs/remotes/origin/*",
+        prune=True,
+        kill_after_timeout=timeout,
+    )
+    if repo.head.is_detached:
+        return
+    tracking = repo.active_branch.tracking_branch()
+    if tracking is None or tracking.remote_name != "origin":
+        return
+    repo.head.reset(tracking.commit, index=True, working_tree=True)
+
+
+def repo_cache_name(repo_path: str) -> Path:
+    """Get the (relative) path a (remote) repo is cached under, as org/name"""
+    # SSH clone URL e.g: git@github.com:OverkillGuy/python-template
+    if ":" in repo_path:  # Presence of : is proxy for URL (SSH, file://...)
+        *_junk, repo_blurb = repo_path.split(":")
+        org, repo_name = repo_blurb.split("/")[-2:]
+    else:  # Local repos of the same name get told apart by path
+        org = "local"
+        path_digest = sha1(str(Path(repo_path).resolve()).encode()).hexdigest()
+        repo_name = f"{Path(repo_path).resolve().name}-{path_digest[:8]}"
+    return Path(org) / repo_name
+
+
+def clone_target_path(
+    repo_path: str, cache_folder: Path, workspace: str = DEFAULT_WORKSPACE
+) -> Path:
+    """Get the path in cache folder where a (remote) repo gets cloned, per workspace"""
+    return cache_folder / "workspaces" / workspace / repo_cache_name(repo_path)
+
+
+def mirror_path(repo_path: str, cache_folder: Path) -> Path:
+    """Get the path in cache folder where a (remote) repo gets mirrored (bare)"""
+    cache_name = repo_cache_name(repo_path)
+    return cache_folder / "mirrors" / cache_name.parent / f"{cache_name.name}.git"
+
+
+def index_fetch(cache_folder: Path, repo_path: str, fetched_at: float | None = None):
+    """Record a repo's mirror in the cache index, as just cloned or fetched
+
+    Mirrors found in cache but not indexed can be recorded as fetched long ago.
+    """
+    mirror = mirror_path(repo_path, cache_folder)
+    backend = git_backend()
+    with closing(CacheIndex(cache_folder)) as index:
+        index.record_fetch(
+            str(repo_cache_name(repo_path)),
+            repo_path,
+            mirror,
+            backend.head_sha(mirror),
+            backend.active_branch(mirror),
+            git_pack_size(mirror) or 0,
+            fetched_at,
+        )
+
+
+def index_workspace_clone(cache_folder: Path, repo_path: str, workspace: str):
+    """Record a repo's workspace clone in the cache index, as just created"""
+    clone_target = clone_target_path(repo_path, cache_folder, workspace)
+    with closing(CacheIndex(cache_folder)) as index:
+        index.record_workspace_clone(
+            str(repo_cache_name(repo_path)),
+            workspace,
+            clone_target,
+            folder_size(clone_target),
+        )
+
+
+def index_local_clone(
+    cache_folder: Path, repo_path: str, workspace: str, created: bool = False
+):
+    """Record a local repo's workspace clone in the cache index, as just synced
+
+    The local repo is indexed in place of a mirror, sized zero as it's not part of
+    the cache: evicting the repo only removes its workspace clones.
+    """
+    local_repo = Path(repo_path).resolve()
+    backend = git_backend()
+    with closing(CacheIndex(cache_folder)) as index:
+        index.record_fetch(
+            str(repo_cache_name(repo_path)),
+            str(local_repo),
+            local_repo,
+            backend.head_sha(local_repo),
+            backend.active_branch(local_repo),
+            0,
+        )
+    if created:
+        index_workspace_clone(cache_folder, repo_path, workspace)
+    else:
+        index_use(cache_folder, repo_path, workspace)
+
+
+def index_use(cache_folder: Path, repo_path: str, workspace: str):
+    """Record in the cache index that a repo's workspace clone was just used"""
+    with closing(CacheIndex(cache_folder)) as index:
+        index.mark_used(str(repo_cache_name(repo_path)), workspace)
+
+
+def mirror_staging_path(mirror: Path) -> Path:
+    """Get a path to create a mirror at, before moving it in place when complete"""
+    mirror.parent.mkdir(parents=True, exist_ok=True)
+    return mirror.with_name(
+        f".{mirror.name}.{os.getpid()}.{threading.get_native_id()}.tmp"
+    )
+
+
+def install_mirror(staging: Path, mirror: Path):
+    """Move a complete mirror in place, unless another process beat us to it
+
+    Renaming is atomic: other processes never see a half-cloned mirror.
+    """
+    try:
+        staging.rename(mirror)
+    except OSError:
+        if not mirror.is_dir():
+            raise
+        shutil.rmtree(staging)  # Mirrored concurrently by another run: use theirs
+
+
+async def run_git_async(*args: str, cwd: Path | None = None) -> str:
+    """Run a git command as asyncio subprocess, returning its stdout
+
+    Raises:
+      GitCommandError: When the git command fails (non-zero exit code)
+    """
+    proc = await asyncio.create_subprocess_exec(
+        "git",
+        *args,
+        cwd=cwd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:  # Timed out (or run aborted): don't leak git
+        proc.kill()
+        await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise GitCommandError(["git", *args], proc.returncode, stderr, stdout)
+    return stdout.decode()
+
+
+def git_pack_size(repo_path: Path) -> int | None:
+    """Get the size of a repo's git packs (bare or not), if it's a repo at all"""
+    pack_folder = repo_path / ".git" / "objects" / "pack"
+    if not pack_folder.is_dir():
+        pack_folder = repo_path / "objects" / "pack"  # Bare repo, like mirrors
+    if not pack_folder.is_dir():
+        return None
+    return sum(pack.stat().st_size for pack in pack_folder.iterdir())
+
+
+def folder_size(folder: Path) -> int:
+    """Get the disk used by a folder's files, recursively, in bytes"""
+    total = 0
+    for dirpath, _dirnames, filenames in os.walk(folder):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:  # Deleted while walking, say by git gc
+                pass
+    return total
+
+
 def get_cache_folder(cache: bool, logger: logging.Logger) -> Path:
-    """Create a cache folder, either locally or in temp"""
+    """Create a cache folder, either locally or in temp (wiped on exit)"""
     cache_folder = DEFAULT_CACHE
     if not cache:
         cache_folder = Path(mkdtemp(suffix=".cache"))
-        logger.info(
-            f"Using repo cache folder: {cache_folder}/ (Won't wipe it on exit!)"
-        )
+        atexit.register(shutil.rmtree, cache_folder, ignore_errors=True)
+        logger.info(f"Using repo cache folder: {cache_folder}/ (Wiped on exit)")
     return cache_folder
 
 
-def commit(repo: GitRepo, migration: MigrationLoaded):
-    """Commit the repo's changes in branch_name, given the PatchDriver that did it"""
-    assert repo.is_dirty(
-        untracked_files=True
-    ), "GitRepo shouldn't be clean on committing"
-    branch = repo.create_head(migration.branch_name)
-    branch.checkout()
-    repo.git.add(A=True)
+def commit(
+    repo: GitRepo,
+    migration: MigrationLoaded,
+    timeout: float | None = None,
+    paths: list[str] | None = None,
+):
+    """Commit the repo's changes in branch_name, given the PatchDriver that did it
+
+    Only the changes to paths (relative to repo root) are committed, if given,
+    sparing a scan of the whole repo for changes. Each git command is killed past
+    timeout seconds, if set. Done via the git backend in use, see
+    {py:func}`mass_driver.git_backend.git_backend`.
+    """
+    backend = git_backend()
+    repo_path = Path(repo.working_dir)
+    dirty = backend.is_dirty(repo_path, paths)
+    assert dirty, "GitRepo shouldn't be clean on committing"
+    if migration.branch_name is None:
+        raise ValueError("Migration has no branch name to commit on")
     author = None  # If stays None, git uses default commit author
     if migration.commit_author_email or migration.commit_author_name:
         name, email = migration.commit_author_name, migration.commit_author_email
         author = f"{name} <{email}>"  # Actor(name=migration.commit_author_name,
         #       email=migration.commit_author_email)
-    repo.git.commit(m=migration.commit_message, author=author)
+    backend.commit_all(
+        repo_path,
+        migration.branch_name,
+        migration.commit_message,
+        author,
+        timeout,
+        paths,
+    )
+
 
+def unrecorded_changes(
+    repo: GitRepo, paths: list[str], timeout: float | None = None
+) -> list[str]:
+    """List the repo's changed files left out of paths (relative to repo root)
 
-def push(repo: GitRepo, branch_name: str):
-    """Push a branch of the repo to a remote"""
+    Scans the whole repo for changes, killing git past timeout seconds if set.
+    """
+    recorded = {PurePosixPath(path).as_posix() for path in paths}
+    changed = git_backend().changed_files(Path(repo.working_dir), timeout)
+    return sorted(path for path in changed if path not in recorded)
+
+
+def push(repo: GitRepo, branch_name: str, timeout: float | None = None):
+    """Push a branch of the repo to a remote, killing git past timeout seconds if set"""
     remote = repo.remote()
-    remote.push(refspec=branch_name)
+    remote.push(refspec=branch_name, kill_after_timeout=timeout)
+
 
+def switch_branch_then_pull(
+    repo: GitRepo,
+    pull: bool,
+    branch_name: str | None = None,
+    timeout: float | None = None,
+):
+    """Switch branch then pull, killing git past timeout seconds if set"""
+    if branch_name is not None:
+        repo.git.checkout(branch_name, kill_after_timeout=timeout)
+    if pull:
+        repo.remote().pull(kill_after_timeout=timeout)
 
-def switch_branch_then_pull(repo: GitRepo, pull: bool, branch_name: str | None = None):
-    """Switch branch then pull"""
+
+async def switch_branch_then_pull_async(
+    repo: GitRepo, pull: bool, branch_name: str | None = None
+):
+    """Switch branch then pull, via asyncio subprocess"""
+    repo_path = Path(repo.working_dir)
     if branch_name is not None:
-        repo.git.checkout(branch_name)
+        await run_git_async("checkout", branch_name, cwd=repo_path)
     if pull:
-        repo.remote().pull()
+        await run_git_async("pull", cwd=repo_path)
+
+
+def active_branch(repo: GitRepo) -> str:
+    """Get the branch checked out in a repo, via the git backend in use
+
+    Raises:
+      TypeError: When the repo's HEAD is detached, not on a branch
+    """
+    branch = git_backend().active_branch(Path(repo.working_dir))
+    if branch is None:
+        raise TypeError(f"HEAD of {repo.working_dir} is detached, not on a branch")
+    return branch
 
 
 def get_default_branch(r: GitRepo) -> str:
     """Get the default branch of a repository"""
-    # From https://github.com/gitpython-developers/GitPython/discussions/1364#discussioncomment-1530384
-    try:
-        return r.remotes.origin.refs.HEAD.ref.remote_head
-    except Exception:
+    default_branch = git_backend().default_branch(Path(r.working_dir))
+    if default_branch is None:
         raise ValueError(
             "base_branch param could not be autodetected: no git remote available"
         )
+    return default_branch
@@ -0,0 +1,384 @@
+"""Backends for the git operations done on each repo: status, commit, refs reading
+
+GitPython (the default) runs most operations as `git` subprocesses: over thousands
+of repos, that's many thousands of process spawns. The dulwich backend does status,
+staging, commit, and refs reading in-process instead (`dulwich` extra).
+Cloning, fetching, and pushing always go through `git` itself (see
+{py:mod}`mass_driver.git`).
+
+The backend in use is process-wide, selected via {py:func}`using_git_backend`.
+"""
+
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+
+from git import GitConfigParser
+from git import Repo as GitRepo
+
+
+class GitBackend:
+    """Base class of git backends, doing per-repo git operations given repo path"""
+
+    name: str = "base"
+    """The name of the backend, as selected on CLI"""
+
+    def is_dirty(self, repo_path: Path, paths: list[str] | None = None) -> bool:
+        """Check if the repo has changes to commit, untracked files included
+
+        Only paths (relative to repo root) are checked, if given, instead of
+        scanning the whole repo.
+        """
+        raise NotImplementedError("GitBackend base class can't read, use derived")
+
+    def changed_files(self, repo_path: Path, timeout: float | None = None) -> list[str]:
+        """List the files with changes to commit (relative to repo root), scanning all
+
+        Untracked files are included, ignored files skipped.
+        """
+        raise NotImplementedError("GitBackend base class can't read, use derived")
+
+    def active_branch(self, repo_path: Path) -> str | None:
+        """Get the branch checked out in the repo, if any (None if detached HEAD)"""
+        raise NotImplementedError("GitBackend base class can't read, use derived")
+
+    def head_sha(self, repo_path: Path) -> str | None:
+        """Get the commit checked out in the repo, if any (None if no commit yet)"""
+        raise NotImplementedError("GitBackend base class can't read, use derived")
+
+    def remote_urls(self, repo_path: Path) -> list[str]:
+        """Get the URLs of the repo's origin remote, if any"""
+        raise NotImplementedError("GitBackend base class can't read, use derived")
+
+    def default_branch(self, repo_path: Path) -> str | None:
+        """Get the default branch of the repo's origin remote, if known"""
+        raise NotImplementedError("GitBackend base class can't read, use derived")
+
+    def commit_all(
+        self,
+        repo_path: Path,
+        branch_name: str,
+        message: str,
+        author: str | None = None,
+        timeout: float | None = None,
+        paths: list[str] | None = None,
+    ):
+        """Commit all the repo's changes onto a new branch, checked out
+
+        Args:
+          repo_path: The repo to commit in
+          branch_name: The new branch to commit on, created at current commit
+          message: The commit message
+          author: The commit author, as "Name <email>", or None for git's default
+          timeout: Seconds after which to kill git subprocesses, if any, if set
+          paths: The only files to commit changes of (relative to repo root), if
+            given, instead of scanning the whole repo for changes
+        """
+        raise NotImplementedError("GitBackend base class can't commit, use derived")
+
+
+class GitPythonBackend(GitBackend):
+    """Git operations via GitPython, mostly as `git` subprocesses"""
+
+    name = "gitpython"
+
+    def is_dirty(self, repo_path: Path, paths: list[str] | None = None) -> bool:
+        """Check if the repo has changes to commit, untracked files included"""
+        if paths is not None:
+            return bool(self.changed_paths(GitRepo(repo_path), paths))
+        return GitRepo(repo_path).is_dirty(untracked_files=True)
+
+    def changed_files(self, repo_path: Path, timeout: float | None = None) -> list[str]:
+        """List the files with changes to commit, via `git status` of the whole repo"""
+        return self.changed_paths(GitRepo(repo_path), [], timeout)
+
+    def changed_paths(
+        self, repo: GitRepo, paths: list[str], timeout: float | None = None
+    ) -> list[str]:
+        """Get which of paths have changes to commit, via `git status` of just those
+
+        Paths are taken literally, not as glob patterns. Ignored files are skipped.
+        No paths at all get the whole repo's changes.
+        """
+        status = repo.git(literal_pathspecs=True).status(
+            "--porcelain",
+            "-z",
+            "--untracked-files=all",
+            "--",
+            *paths,
+            kill_after_timeout=timeout,
+        )
+        entries = iter(status.split("\0"))
+        changed = []
+        for entry in entries:
+            if not entry:
+                continue
+            changed.append(entry[3:])  # Entries are "XY path"
+            if entry[0] in "RC":  # Renames and copies are followed by source path
+                next(entries, None)
+        return changed
+
+    def active_branch(self, repo_path: Path) -> str | None:
+        """Get the branch checked out in the repo, if any (None if detached HEAD)"""
+        repo = GitRepo(repo_path)
+        if repo.head.is_detached:
+            return None
+        return repo.head.reference.name
+
+    def head_sha(self, repo_path: Path) -> str | None:
+        """Get the commit checked out in the repo, if any (None if no commit yet)"""
+        head = GitRepo(repo_path).head
+        return head.commit.hexsha if head.is_valid() else None
+
+    def remote_urls(self, repo_path: Path) -> list[str]:
+        """Get the URLs of the repo's origin remote, if any"""
+        try:
+            return list(GitRepo(repo_path).remote().urls)
+        except ValueError:  # No such remote
+            return []
+
+    def default_branch(self, repo_path: Path) -> str | None:
+        """Get the default branch of the repo's origin remote, if known"""
+        # From https://github.com/gitpython-developers/GitPython/discussions/1364
+        try:
+            return GitRepo(repo_path).remotes.origin.refs.HEAD.ref.remote_head
+        except Exception:
+            return None
+
+    def commit_all(
+        self,
+        repo_path: Path,
+        branch_name: str,
+        message: str,
+        author: str | None = None,
+        timeout: float | None = None,
+        paths: list[str] | None = None,
+    ):
+        """Commit all the repo's changes onto a new branch, checked out"""
+        repo = GitRepo(repo_path)
+        repo.create_head(branch_name).checkout()
+        if paths is None:
+            repo.git.add(A=True, kill_after_timeout=timeout)
+        else:
+            changed = self.changed_paths(repo, paths, timeout)
+            if changed:  # No path given would add everything
+                repo.git(literal_pathspecs=True).add(
+                    "-A", "--", *changed, kill_after_timeout=timeout
+                )
+        repo.git.commit(m=message, author=author, kill_after_timeout=timeout)
+
+
+class DulwichBackend(GitBackend):
+    """Git operations in-process, via dulwich (pure-Python git)
+
+    Sparse-checkout workspace clones (see
+    {py:attr}`mass_driver.models.activity.ActivityLoaded.sparse_paths`) are read and
+    committed via GitPython instead: files left out of their checkout would look
+    deleted to dulwich. Timeouts don't apply, as there's no subprocess to kill.
+    """
+
+    name = "dulwich"
+
+    def __init__(self):
+        """Check dulwich is installed, as it's an optional dependency"""
+        try:
+            import dulwich  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "The dulwich git backend needs dulwich: pip install dulwich"
+            ) from e
+        self._fallback = GitPythonBackend()
+
+    def is_dirty(self, repo_path: Path, paths: list[str] | None = None) -> bool:
+        """Check if the repo has changes to commit, untracked files included"""
+        from dulwich import porcelain
+        from dulwich.repo import Repo
+
+        if is_sparse(repo_path):
+            return self._fallback.is_dirty(repo_path, paths)
+        if paths is not None:
+            with Repo(str(repo_path)) as repo:
+                return bool(self.changed_paths(repo, repo_path, paths))
+        status = porcelain.status(str(repo_path), untracked_files="all")
+        staged = any(status.staged.values())
+        return staged or bool(status.unstaged) or bool(status.untracked)
+
+    def changed_files(self, repo_path: Path, timeout: float | None = None) -> list[str]:
+        """List the files with changes to commit, via dulwich's status
+
+        Timeout is ignored, except for sparse-checkout repos, read via git.
+        """
+        from dulwich import porcelain
+
+        if is_sparse(repo_path):
+            return self._fallback.changed_files(repo_path, timeout)
+        status = porcelain.status(str(repo_path), untracked_files="all")
+        staged = [path for paths in status.staged.values() for path in paths]
+        changed = [*staged, *status.unstaged, *status.untracked]
+        return list(dict.fromkeys(os.fsdecode(path) for path in changed))
+
+    def active_branch(self, repo_path: Path) -> str | None:
+        """Get the branch checked out in the repo, if any (None if detached HEAD)"""
+        from dulwich.repo import Repo
+
+        with Repo(str(repo_path)) as repo:
+            head_refs, _sha = repo.refs.follow(b"HEAD")
+        if len(head_refs) < 2:  # HEAD points at a commit, not a branch
+            return None
+        return head_refs[-1].decode().removeprefix("refs/heads/")
+
+    def head_sha(self, repo_path: Path) -> str | None:
+        """Get the commit checked out in the repo, if any (None if no commit yet)"""
+        from dulwich.repo import Repo
+
+        with Repo(str(repo_path)) as repo:
+            _head_refs, sha = repo.refs.follow(b"HEAD")
+        return sha.decode() if sha is not None else None
+
+    def remote_urls(self, repo_path: Path) -> list[str]:
+        """Get the URLs of the repo's origin remote, if any"""
+        from dulwich.repo import Repo
+
+        with Repo(str(repo_path)) as repo:
+            config = repo.get_config()
+        try:
+            return [
+                url.decode()
+                for url in config.get_multivar((b"remote", b"origin"), b"url")
+            ]
+        except KeyError:
+            return []
+
+    def default_branch(self, repo_path: Path) -> str | None:
+        """Get the default branch of the repo's origin remote, if known"""
+        from dulwich.repo import Repo
+
+        with Repo(str(repo_path)) as repo:
+            head_refs, _sha = repo.refs.follow(b"refs/remotes/origin/HEAD")
+        if len(head_refs) < 2:  # No remote HEAD known
+            return None
+        return head_refs[-1].decode().removeprefix("refs/remotes/origin/")
+
+    def changed_paths(self, repo, repo_path: Path, paths: list[str]) -> list[str]:
+        """Get which of paths differ from the (dulwich) repo's index
+
+        That's edited, new, or deleted files, checking just those. Ignored files
+        are skipped.
+        """
+        from dulwich.ignore import IgnoreFilterManager
+        from dulwich.index import blob_from_path_and_stat
+
+        index = repo.open_index()
+        ignores = IgnoreFilterManager.from_repo(repo)
+        unique_paths = dict.fromkeys(PurePosixPath(path).as_posix() for path in paths)
+        changed = []
+        for path in unique_paths:
+            full_path = repo_path / path
+            index_path = os.fsencode(path)
+            tracked = index_path in index
+            if not os.path.lexists(full_path):
+                if tracked:  # Deleted
+                    changed.append(path)
+            elif not tracked:
+                if not ignores.is_ignored(path):  # New
+                    changed.append(path)
+            else:
+                blob = blob_from_path_and_stat(
+                    os.fsencode(full_path), full_path.lstat()
+                )
+                if blob.id != index[index_path].sha:  # Edited
+                    changed.append(path)
+        return changed
+
+    def commit_all(
+        self,
+        repo_path: Path,
+        branch_name: str,
+        message: str,
+        author: str | None = None,
+        timeout: float | None = None,
+        paths: list[str] | None = None,
+    ):
+        """Commit all the repo's changes onto a new branch, checked out
+
+        Timeout is ignored, except for sparse-checkout repos, committed via git.
+        """
+        from dulwich import porcelain
+        from dulwich.repo import Repo
+
+        if is_sparse(repo_path):
+            self._fallback.commit_all(
+                repo_path, branch_name, message, author, timeout, paths
+            )
+            return
+        with Repo(str(repo_path)) as repo:
+            branch_ref = f"refs/heads/{branch_name}".encode()
+            if not repo.refs.add_if_new(branch_ref, repo.head()):
+                raise ValueError(f"Branch '{branch_name}' already exists")
+            # Same commit as before: switching branch leaves the checkout as is
+            repo.refs.set_symbolic_ref(b"HEAD", branch_ref)
+            if paths is not None:
+                changed = self.changed_paths(repo, repo_path, paths)
+            else:
+                status = porcelain.status(repo, untracked_files="all")
+                changed = [os.fsdecode(path) for path in status.unstaged]
+                changed += [os.fsdecode(path) for path in status.untracked]
+            present = [path for path in changed if (repo_path / path).exists()]
+            if present:
+                porcelain.add(repo, [str(repo_path / path) for path in present])
+            deleted = [path for path in changed if not (repo_path / path).exists()]
+            if deleted:
+                index = repo.open_index()
+                for path in deleted:
+                    del index[os.fsencode(path)]
+                index.write()
+            porcelain.commit(
+                repo,
+                message=message.encode(),
+                author=author.encode() if author is not None else None,
+            )
+
+
+def is_sparse(repo_path: Path) -> bool:
+    """Check if a repo has sparse-checkout enabled, reading its git config files
+
+    Git enables sparse-checkout in the per-worktree config file, which overrides
+    the repo's config file.
+    """
+    sparse = False
+    for config_path in [
+        repo_path / ".git" / "config",
+        repo_path / ".git" / "config.worktree",
+    ]:
+        if config_path.is_file():
+            config = GitConfigParser(str(config_path), read_only=True)
+            sparse = config.get_value("core", "sparseCheckout", sparse) is True
+    return sparse
+
+
+GIT_BACKENDS: dict[str, type[GitBackend]] = {
+    GitPythonBackend.name: GitPythonBackend,
+    DulwichBackend.name: DulwichBackend,
+}
+"""The git backends available, by name"""
+
+_BACKEND: GitBackend = GitPythonBackend()
+"""The git backend of this process"""
+
+
+def git_backend() -> GitBackend:
+    """Get the git backend in use in this process"""
+    return _BACKEND
+
+
+@contextmanager
+def using_git_backend(name: str) -> Iterator[GitBackend]:
+    """Use the named git backend for all git operations in process within context"""
+    global _BACKEND
+    previous = _BACKEND
+    _BACKEND = GIT_BACKENDS[name]()
+    try:
+        yield _BACKEND
+    finally:
+        _BACKEND = previous
@@ -0,0 +1,194 @@
+"""Read a repo's files straight from git objects, without checking them out
+
+A {py:class}`GitTreePath` is a read-only view of a commit's files, behaving like
+a (read-only) {py:class}`pathlib.Path`, backed by a persistent `git cat-file
+--batch` process: one per repo, however many files are read. Scanners declared
+via {py:func}`mass_driver.models.scan.scans_tree` get one, letting scan-only
+activities skip checking out repos, scanning their (bare) mirrors instead.
+"""
+
+import subprocess
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+
+TREE_MODE = "40000"
+"""The git mode of tree (directory) entries"""
+
+SUBMODULE_MODE = "160000"
+"""The git mode of submodule (commit) entries"""
+
+
+class GitObjectReader:
+    """Reads git objects from a repo, via a persistent `git cat-file --batch`
+
+    Thread-safe: reads are done one at a time. Tree listings are cached.
+    """
+
+    def __init__(self, repo_path: Path):
+        """Start reading from the repo at repo_path (bare or not)"""
+        self._process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=repo_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self._lock = threading.Lock()
+        self._trees: dict[str, dict[str, str] | None] = {}
+
+    def read(self, object_name: str) -> tuple[str, bytes] | None:
+        """Read an object (like 'HEAD:README.md'), as its type and content, if any"""
+        stdin, stdout = self._process.stdin, self._process.stdout
+        assert stdin is not None and stdout is not None, "Should pipe cat-file"
+        with self._lock:
+            stdin.write(object_name.encode() + b"\n")
+            stdin.flush()
+            header = stdout.readline()
+            if not header or header.endswith((b" missing\n", b" ambiguous\n")):
+                return None
+            _sha, object_type, size = header.split()
+            content = stdout.read(int(size) + 1)[:-1]  # Content ends with newline
+        return object_type.decode(), content
+
+    def tree(self, object_name: str) -> dict[str, str] | None:
+        """List a tree (like 'HEAD:src'), as git mode by entry name, if a tree"""
+        if object_name not in self._trees:
+            found = self.read(object_name)
+            self._trees[object_name] = (
+                parse_tree(found[1]) if found and found[0] == "tree" else None
+            )
+        return self._trees[object_name]
+
+    def close(self):
+        """Stop the cat-file process"""
+        if self._process.stdin is not None:
+            self._process.stdin.close()
+        self._process.wait()
+
+
+def parse_tree(content: bytes) -> dict[str, str]:
+    """Parse a (raw) git tree object, into git mode by entry name"""
+    entries = {}
+    position = 0
+    while position < len(content):
+        name_end = content.index(b"\0", position)
+        mode, name = content[position:name_end].split(b" ", 1)
+        entries[name.decode()] = mode.decode()
+        position = name_end + 1 + 20  # Entry ends with a binary SHA-1
+    return entries
+
+
+class GitTreePath:
+    """A read-only path into the files of a repo's commit, like a pathlib.Path
+
+    Supports joining (`/`), checking existence, reading files, and listing
+    directories. Symlinks aren't followed: they read as files holding their target.
+    """
+
+    def __init__(
+        self, reader: GitObjectReader, revision: str, parts: tuple[str, ...] = ()
+    ):
+        """View the files of revision (like 'HEAD' or a branch), from given path"""
+        self._reader = reader
+        self.revision = revision
+        """The commit whose files are viewed, as any git revision"""
+        self.parts = parts
+        """The path's components, from the root of the repo"""
+
+    def __truediv__(self, other: str | PurePosixPath | Path) -> "GitTreePath":
+        """Join a (relative) path to this one"""
+        parts = list(self.parts)
+        for part in PurePosixPath(other).parts:
+            if part == "..":
+                parts = parts[:-1]
+            elif part not in (".", "/"):
+                parts.append(part)
+        return GitTreePath(self._reader, self.revision, tuple(parts))
+
+    def __str__(self) -> str:
+        """Show the path as git revision syntax, like 'HEAD:src/main.py'"""
+        return self._object_name
+
+    def __repr__(self) -> str:
+        """Show the path for debugging"""
+        return f"GitTreePath('{self}')"
+
+    def __eq__(self, other: object) -> bool:
+        """Compare paths by revision and components"""
+        if not isinstance(other, GitTreePath):
+            return NotImplemented
+        return (self.revision, self.parts) == (other.revision, other.parts)
+
+    def __hash__(self) -> int:
+        """Hash paths by revision and components"""
+        return hash((self.revision, self.parts))
+
+    @property
+    def name(self) -> str:
+        """The final path component, empty for the repo's root"""
+        return self.parts[-1] if self.parts else ""
+
+    @property
+    def parent(self) -> "GitTreePath":
+        """The path's parent directory"""
+        return GitTreePath(self._reader, self.revision, self.parts[:-1])
+
+    def exists(self) -> bool:
+        """Check the path exists in the commit"""
+        return self._mode is not None
+
+    def is_dir(self) -> bool:
+        """Check the path is a directory in the commit"""
+        return self._mode == TREE_MODE
+
+    def is_file(self) -> bool:
+        """Check the path is a file (or symlink) in the commit"""
+        return self._mode not in (None, TREE_MODE, SUBMODULE_MODE)
+
+    def read_bytes(self) -> bytes:
+        """Read the file's contents"""
+        found = self._reader.read(self._object_name)
+        if found is None:
+            raise FileNotFoundError(f"No such file in git tree: '{self}'")
+        object_type, content = found
+        if object_type != "blob":
+            raise IsADirectoryError(f"Not a file in git tree: '{self}'")
+        return content
+
+    def read_text(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        """Read the file's contents, as text"""
+        return self.read_bytes().decode(encoding, errors)
+
+    def iterdir(self) -> Iterator["GitTreePath"]:
+        """List the directory's entries"""
+        entries = self._reader.tree(self._object_name)
+        if entries is None:
+            raise NotADirectoryError(f"Not a directory in git tree: '{self}'")
+        for entry_name in entries:
+            yield self / entry_name
+
+    @property
+    def _object_name(self) -> str:
+        """The path as git revision syntax, for cat-file"""
+        return f"{self.revision}:{'/'.join(self.parts)}"
+
+    @property
+    def _mode(self) -> str | None:
+        """The git mode of the path in the commit, None if missing"""
+        if not self.parts:
+            return TREE_MODE
+        parent_entries = self._reader.tree(self.parent._object_name)
+        if parent_entries is None:
+            return None
+        return parent_entries.get(self.name)
+
+
+@contextmanager
+def open_tree(repo_path: Path, revision: str = "HEAD") -> Iterator[GitTreePath]:
+    """View the files of a repo's revision, without checkout, within context"""
+    reader = GitObjectReader(repo_path)
+    try:
+        yield GitTreePath(reader, revision)
+    finally:
+        reader.close()
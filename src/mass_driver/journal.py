@@ -0,0 +1,162 @@
+"""Crash-safe journal of a run, recording each repo's outcome as it completes
+
+The journal is an append-only file of JSON lines, one {py:class}`RepoOutcome` per
+line, flushed to disk as soon as each repo is processed. A crashed (or
+interrupted) run can then be resumed from its journal, skipping repos already done.
+
+The same format streams a run's full outcome (`--jsonl-outfile`), instead of
+dumping one giant JSON document at the end: see {py:func}`outcome_from_journal`.
+"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterator
+
+from pydantic import ValidationError
+
+from mass_driver.models.activity import ActivityOutcome, RepoOutcome
+from mass_driver.models.repository import IndexedRepos, RepoID
+
+
+class RunJournal:
+    """An append-only journal of repo outcomes, one JSON line per repo"""
+
+    def __init__(
+        self,
+        journal_path: Path,
+        fsync: bool = True,
+        append: bool = True,
+        repos_sourced: IndexedRepos | None = None,
+    ):
+        """Open the journal for appending (or overwriting), creating it if needed
+
+        Without fsync, records are only flushed, trading crash-safety for speed.
+        Given repos_sourced, each record embeds its repo as sourced, so the
+        journal is enough to rebuild the whole outcome.
+        """
+        self.journal_path = journal_path
+        self.fsync = fsync
+        self.repos_sourced = repos_sourced
+        self._file = open(journal_path, "a+" if append else "w+")
+        self._lock = threading.Lock()
+        if self._file.tell() > 0:
+            # End any line left truncated by a crash, so new records stay readable
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                self._file.write("\n")
+
+    def record(self, repo_outcome: RepoOutcome):
+        """Append a repo's outcome to the journal, forcing it to disk"""
+        if self.repos_sourced is not None and repo_outcome.sourced_repo is None:
+            repo_outcome = repo_outcome.copy(
+                update={"sourced_repo": self.repos_sourced.get(repo_outcome.repo_id)}
+            )
+        line = repo_outcome.json(exclude_none=True) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        """Close the journal file"""
+        self._file.close()
+
+
+def iter_journal(journal_path: Path, logger: logging.Logger) -> Iterator[RepoOutcome]:
+    """Lazily read back the repo outcomes of a journal, one record at a time
+
+    A truncated last line (crash mid-write) is ignored.
+    """
+    with open(journal_path) as journal_file:
+        for line_number, line in enumerate(journal_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield RepoOutcome.parse_raw(line)
+            except ValidationError:
+                logger.warning(f"Ignoring unreadable journal line {line_number}")
+
+
+def load_journal(
+    journal_path: Path, logger: logging.Logger
+) -> dict[RepoID, RepoOutcome]:
+    """Read back the run outcomes of a journal, latest record of each repo winning
+
+    Records of later phases (Forge) are skipped, only clone/scan/patch count.
+    """
+    return {
+        repo_outcome.repo_id: repo_outcome
+        for repo_outcome in iter_journal(journal_path, logger)
+        if repo_outcome.cloned_repo is not None or repo_outcome.error is not None
+    }
+
+
+def outcome_from_journal(
+    journal_path: Path, logger: logging.Logger, keep_scan_results: bool = True
+) -> ActivityOutcome:
+    """Rebuild a whole ActivityOutcome from a journal, later records winning
+
+    Without keep_scan_results, scan results (the bulk of scan runs) are skipped.
+    """
+    outcome = ActivityOutcome(repos_sourced={})
+    for repo_outcome in iter_journal(journal_path, logger):
+        repo_id = repo_outcome.repo_id
+        if repo_outcome.sourced_repo is not None:
+            outcome.repos_sourced[repo_id] = repo_outcome.sourced_repo
+        if repo_outcome.cloned_repo is not None:
+            outcome.repos_cloned[repo_id] = repo_outcome.cloned_repo
+        if repo_id in outcome.repos_clone_timed_out:  # Later record wins
+            outcome.repos_clone_timed_out.remove(repo_id)
+        if repo_outcome.clone_timed_out:
+            outcome.repos_clone_timed_out.append(repo_id)
+        if keep_scan_results and repo_outcome.scan_result is not None:
+            outcome.scan_result = outcome.scan_result or {}
+            outcome.scan_result[repo_id] = repo_outcome.scan_result
+        if repo_outcome.migration_result is not None:
+            outcome.migration_result = outcome.migration_result or {}
+            outcome.migration_result[repo_id] = repo_outcome.migration_result
+        if repo_outcome.forge_result is not None:
+            outcome.forge_result = outcome.forge_result or {}
+            outcome.forge_result[repo_id] = repo_outcome.forge_result
+        if repo_outcome.timings:
+            outcome.phase_timings.setdefault(repo_id, []).extend(repo_outcome.timings)
+    return outcome
+
+
+def finished_repos(outcomes: dict[RepoID, RepoOutcome]) -> dict[RepoID, RepoOutcome]:
+    """Select the repo outcomes that needn't be redone: cloned (scanned/patched) OK
+
+    Repos that failed to clone (or timed out cloning, see
+    {py:attr}`mass_driver.models.activity.RepoOutcome.clone_timed_out`) are retried
+    when resuming.
+    """
+    return {
+        repo_id: repo_outcome
+        for repo_id, repo_outcome in outcomes.items()
+        if repo_outcome.cloned_repo is not None and repo_outcome.error is None
+    }
+
+
+def merge_resumed(
+    outcome: ActivityOutcome,
+    repos_sourced: IndexedRepos,
+    resumed: dict[RepoID, RepoOutcome],
+) -> ActivityOutcome:
+    """Fold the repo outcomes resumed from a journal into a run's outcome"""
+    outcome.repos_sourced = repos_sourced
+    for repo_id, repo_outcome in resumed.items():
+        if repo_outcome.cloned_repo is not None:
+            outcome.repos_cloned[repo_id] = repo_outcome.cloned_repo
+        if outcome.scan_result is not None and repo_outcome.scan_result is not None:
+            outcome.scan_result[repo_id] = repo_outcome.scan_result
+        if (
+            outcome.migration_result is not None
+            and repo_outcome.migration_result is not None
+        ):
+            outcome.migration_result[repo_id] = repo_outcome.migration_result
+        if repo_outcome.timings:
+            outcome.phase_timings[repo_id] = repo_outcome.timings
+    return outcome
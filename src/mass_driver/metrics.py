@@ -0,0 +1,156 @@
+"""Live metrics of a run, written periodically to a Prometheus textfile
+
+Unattended runs are watched by scraping the textfile (via node_exporter's textfile
+collector), alerting on stalls via the time the last repo was done.
+
+Metrics are kept from repos' outcomes as they arrive, via {py:meth}`RunMetrics.record`.
+Phases in progress are those of this process only (not the `process` executor's).
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from mass_driver.models.activity import RepoOutcome
+from mass_driver.timing import phases_in_progress
+
+DEFAULT_METRICS_INTERVAL = 15.0
+"""How often to write the metrics textfile, in seconds"""
+
+PHASE_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+"""Upper bounds of the phase duration histogram's buckets, in seconds"""
+
+
+class RunMetrics:
+    """Counters and histograms of a run, updated from repos' outcomes"""
+
+    def __init__(self):
+        """Start a run with no repo done"""
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.last_repo_at: float | None = None
+        self.repos: Counter[tuple[str, str]] = Counter()
+        """Repos processed, by (stage, outcome)"""
+        self.clone_cache: Counter[str] = Counter()
+        """Clones served from the cache ('hit') or cloned ('miss')"""
+        self.forge_api_calls = 0
+        self.phase_buckets: dict[str, list[int]] = {}
+        self.phase_sums: dict[str, float] = {}
+        self.phase_counts: Counter[str] = Counter()
+
+    def record(self, repo_outcome: RepoOutcome):
+        """Count a repo's outcome, and its phases' timings. A repo callback"""
+        with self._lock:
+            self.last_repo_at = time.time()
+            if repo_outcome.error is not None:
+                self.repos["clone", "error"] += 1
+            if repo_outcome.migration_result is not None:
+                migration_outcome = repo_outcome.migration_result.outcome.value
+                self.repos["migration", migration_outcome] += 1
+            if repo_outcome.forge_result is not None:
+                self.repos["forge", repo_outcome.forge_result.outcome.value] += 1
+            for timing in repo_outcome.timings or []:
+                self._observe_phase(timing.phase, timing.wall_seconds)
+                if timing.cache_hit is not None:
+                    self.clone_cache["hit" if timing.cache_hit else "miss"] += 1
+                if timing.phase == "forge":
+                    self.forge_api_calls += 1
+
+    def _observe_phase(self, phase: str, seconds: float):
+        """Add a phase duration to its histogram"""
+        buckets = self.phase_buckets.setdefault(phase, [0] * len(PHASE_BUCKETS))
+        for index, upper_bound in enumerate(PHASE_BUCKETS):
+            if seconds <= upper_bound:
+                buckets[index] += 1
+        self.phase_sums[phase] = self.phase_sums.get(phase, 0.0) + seconds
+        self.phase_counts[phase] += 1
+
+    def render(self) -> str:
+        """Render the metrics in Prometheus text format"""
+        with self._lock:
+            lines = [
+                "# HELP mass_driver_run_start_time_seconds When the run started",
+                "# TYPE mass_driver_run_start_time_seconds gauge",
+                f"mass_driver_run_start_time_seconds {self.started_at}",
+                "# HELP mass_driver_last_repo_done_time_seconds When a repo was last "
+                "done, to alert on stalls",
+                "# TYPE mass_driver_last_repo_done_time_seconds gauge",
+                f"mass_driver_last_repo_done_time_seconds {self.last_repo_at or 0}",
+                "# HELP mass_driver_repos_total Repos processed, by stage and outcome",
+                "# TYPE mass_driver_repos_total counter",
+            ]
+            for (stage, outcome), count in sorted(self.repos.items()):
+                lines.append(
+                    f'mass_driver_repos_total{{stage="{stage}",outcome="{outcome}"}} '
+                    f"{count}"
+                )
+            lines += [
+                "# HELP mass_driver_clone_cache_total Clones by cache hit or miss",
+                "# TYPE mass_driver_clone_cache_total counter",
+            ]
+            for result, count in sorted(self.clone_cache.items()):
+                lines.append(
+                    f'mass_driver_clone_cache_total{{result="{result}"}} {count}'
+                )
+            lines += [
+                "# HELP mass_driver_forge_api_calls_total PR creation calls to Forge",
+                "# TYPE mass_driver_forge_api_calls_total counter",
+                f"mass_driver_forge_api_calls_total {self.forge_api_calls}",
+                "# HELP mass_driver_phase_duration_seconds Duration of repo phases",
+                "# TYPE mass_driver_phase_duration_seconds histogram",
+            ]
+            for phase, buckets in sorted(self.phase_buckets.items()):
+                metric = "mass_driver_phase_duration_seconds"
+                for upper_bound, count in zip(PHASE_BUCKETS, buckets):
+                    lines.append(
+                        f'{metric}_bucket{{phase="{phase}",le="{upper_bound}"}} {count}'
+                    )
+                lines += [
+                    f'{metric}_bucket{{phase="{phase}",le="+Inf"}} '
+                    f"{self.phase_counts[phase]}",
+                    f'{metric}_sum{{phase="{phase}"}} {self.phase_sums[phase]}',
+                    f'{metric}_count{{phase="{phase}"}} {self.phase_counts[phase]}',
+                ]
+        lines += [
+            "# HELP mass_driver_phases_in_progress Phases running now, by phase",
+            "# TYPE mass_driver_phases_in_progress gauge",
+        ]
+        for phase, count in sorted(phases_in_progress().items()):
+            lines.append(f'mass_driver_phases_in_progress{{phase="{phase}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, textfile_path: Path):
+        """Write the metrics to textfile, atomically (for scrapers to never see half)"""
+        temp_path = textfile_path.with_name(f".{textfile_path.name}.tmp")
+        temp_path.write_text(self.render())
+        os.replace(temp_path, textfile_path)
+
+
+@contextmanager
+def writing_metrics(
+    metrics: RunMetrics,
+    textfile_path: Path,
+    interval: float = DEFAULT_METRICS_INTERVAL,
+) -> Iterator[RunMetrics]:
+    """Write the metrics to textfile every interval seconds, and once more at exit"""
+    stopped = threading.Event()
+
+    def write_periodically():
+        while not stopped.wait(interval):
+            metrics.write(textfile_path)
+
+    writer = threading.Thread(
+        target=write_periodically, name="metrics-writer", daemon=True
+    )
+    metrics.write(textfile_path)
+    writer.start()
+    try:
+        yield metrics
+    finally:
+        stopped.set()
+        writer.join()
+        metrics.write(textfile_path)
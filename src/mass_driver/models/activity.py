@@ -3,10 +3,13 @@
 Encompasses both Migrations and Forge activities.
 """
 
+from typing import Callable
+
 from pydantic import BaseModel
 from tomllib import loads
 
 from mass_driver.discovery import get_scanner
+from mass_driver.git import DEFAULT_WORKSPACE
 from mass_driver.models.forge import PRResult
 from mass_driver.models.migration import (  # Forge,
     TOML_PROJECTKEY,
@@ -21,7 +24,13 @@ from mass_driver.models.migration import (  # Forge,
     load_source,
 )
 from mass_driver.models.patchdriver import PatchResult
-from mass_driver.models.repository import IndexedClonedRepos, IndexedRepos, RepoID
+from mass_driver.models.repository import (
+    ClonedRepo,
+    IndexedClonedRepos,
+    IndexedRepos,
+    RepoID,
+    SourcedRepo,
+)
 from mass_driver.models.scan import ScanFile, ScanLoaded, Scanner
 
 IndexedPatchResult = dict[RepoID, PatchResult]
@@ -37,6 +46,25 @@ IndexedScanResult = dict[RepoID, ScanResult]
 """A set of results of N scanners over multiple repos, indexed by original repo URL"""
 
 
+class PhaseTimeouts(BaseModel):
+    """How many seconds each phase of processing a repo may take, if limited
+
+    A repo running past its phase's timeout is recorded as timed out, its git
+    subprocesses killed, and the worker moves on to the next repo.
+    """
+
+    clone: float | None = None
+    """Timeout of cloning (or pulling) a repo"""
+    scan: float | None = None
+    """Timeout of running all scanners on a repo"""
+    migrate: float | None = None
+    """Timeout of running the PatchDriver on a repo"""
+    commit: float | None = None
+    """Timeout of committing a repo's patch"""
+    push: float | None = None
+    """Timeout of pushing a repo's branch, before Forge creates PR"""
+
+
 class ActivityFile(BaseModel):
     """Top-level object for migration + forge, proxy for TOML file, pre-class-load"""
 
@@ -44,6 +72,9 @@ class ActivityFile(BaseModel):
     scan: ScanFile | None = None
     migration: MigrationFile | None = None
     forge: ForgeFile | None = None
+    timeouts: PhaseTimeouts = PhaseTimeouts()
+    clone_local: bool = False
+    """Clone local repos into cache (hardlinked), rather than patching them in place"""
 
 
 class ActivityLoaded(BaseModel):
@@ -53,6 +84,9 @@ class ActivityLoaded(BaseModel):
     scan: ScanLoaded | None = None
     migration: MigrationLoaded | None = None
     forge: ForgeLoaded | None = None
+    timeouts: PhaseTimeouts = PhaseTimeouts()
+    clone_local: bool = False
+    """Clone local repos into cache (hardlinked), rather than patching them in place"""
 
     @classmethod
     def from_config(cls, config_toml: str):
@@ -60,6 +94,109 @@ class ActivityLoaded(BaseModel):
         activity_file = load_activity_toml(config_toml)
         return load_activity(activity_file)
 
+    @property
+    def workspace(self) -> str:
+        """The workspace to clone repos into, named after the migration branch
+
+        Activities committing to different branches get their own clones of repos,
+        sharing the cached mirrors.
+        """
+        if self.migration is None or self.migration.branch_name is None:
+            return DEFAULT_WORKSPACE
+        return self.migration.branch_name.replace("/", "_")
+
+    @property
+    def sparse_paths(self) -> list[str] | None:
+        """The only files to check out, needed by the scanners and driver, if known
+
+        None (all files) unless every plugin declares the files it needs, see
+        {py:meth}`mass_driver.models.patchdriver.PatchDriver.needed_paths`.
+        """
+        plugin_paths = []
+        if self.scan is not None:
+            plugin_paths += [scanner.needed_paths for scanner in self.scan.scanners]
+        if self.migration is not None:
+            plugin_paths.append(self.migration.driver.needed_paths())
+        if not plugin_paths or any(paths is None for paths in plugin_paths):
+            return None
+        return sorted({path for paths in plugin_paths for path in paths or []})
+
+    @property
+    def needs_checkout(self) -> bool:
+        """Whether repos need checking out, else scanning their mirrors is enough
+
+        Only scan activities (no migration, no forge) whose scanners all read git
+        trees (see {py:func}`mass_driver.models.scan.scans_tree`) need no checkout.
+        """
+        if self.migration is not None or self.forge is not None or self.scan is None:
+            return True
+        return not all(scanner.tree_only for scanner in self.scan.scanners)
+
+
+class ConcurrencySample(BaseModel):
+    """A change in the number of workers of a run, as decided by adaptive concurrency"""
+
+    elapsed_seconds: float
+    """When the change happened, in seconds since start of the run"""
+    workers: int
+    """The number of workers from then on"""
+    reason: str
+    """Why the number of workers changed"""
+
+
+class PhaseTiming(BaseModel):
+    """How long a phase of processing a repo took (clone, scan, migrate...)"""
+
+    phase: str
+    """The phase timed, like 'clone', 'migrate', or 'scanner.<name>' (per Scanner)"""
+    started_at: float
+    """When the phase started, as UNIX timestamp"""
+    wall_seconds: float
+    """How long the phase took, wall-clock"""
+    cpu_seconds: float | None = None
+    """CPU time of the phase (excluding subprocesses like git), if measured"""
+    bytes_fetched: int | None = None
+    """How many bytes the phase fetched (git packs), if known"""
+    cache_hit: bool | None = None
+    """Whether the clone was served from the clone cache (clone phase only)"""
+    pid: int
+    """The process the phase ran in"""
+    thread_id: int
+    """The (native) thread the phase ran in"""
+
+
+IndexedPhaseTimings = dict[RepoID, list[PhaseTiming]]
+"""A set of phase timings of multiple repos, indexed by original repo URL"""
+
+
+class RepoOutcome(BaseModel):
+    """The outcome of running activities over a single repo"""
+
+    repo_id: RepoID
+    """The repo this outcome is about"""
+    cloned_repo: ClonedRepo | None = None
+    """The repo, as cloned. None if cloning failed"""
+    scan_result: ScanResult | None = None
+    """The scan results for this repo, if scanning"""
+    migration_result: PatchResult | None = None
+    """The result of the Migration on this repo, if migrating"""
+    error: str | None = None
+    """The error that stopped processing this repo, if any"""
+    clone_timed_out: bool = False
+    """Whether cloning ran past its timeout (see error), rather than failing"""
+    sourced_repo: SourcedRepo | None = None
+    """The repo, as discovered from Source, when storing outcome standalone"""
+    forge_result: PRResult | None = None
+    """The result of a Forge on this repo, if forging"""
+    elapsed_seconds: float | None = None
+    """How long processing this repo (clone, scan, migrate) took, wall-clock"""
+    timings: list[PhaseTiming] | None = None
+    """How long each phase of processing this repo took"""
+
+
+RepoCallback = Callable[[RepoOutcome], None]
+"""A function called with each repo's outcome, as soon as that repo is processed"""
+
 
 class ActivityOutcome(BaseModel):
     """The outcome of running activities"""
@@ -68,12 +205,18 @@ class ActivityOutcome(BaseModel):
     """The repos, as discovered from Source"""
     repos_cloned: IndexedClonedRepos = {}
     """The repos, as cloned"""
+    repos_clone_timed_out: list[RepoID] = []
+    """The repos given up on, as cloning them ran past its timeout"""
     scan_result: IndexedScanResult | None = None
     """A lookup table of the scan results, indexed by repos_input url"""
     migration_result: IndexedPatchResult | None = None
     """A lookup table of the results of a Migration, indexed by repos_input url"""
     forge_result: IndexedPRResult | None = None
     """A lookup table of the results of a Forge, indexed by repos_input url"""
+    concurrency_log: list[ConcurrencySample] | None = None
+    """The number of workers over time, if run with adaptive concurrency"""
+    phase_timings: IndexedPhaseTimings = {}
+    """How long each phase of processing each repo took"""
 
 
 def load_activity_toml(activity_config: str) -> ActivityFile:
@@ -102,6 +245,8 @@ def load_activity(activity: ActivityFile) -> ActivityLoaded:
         scan=scan_loaded if activity.scan is not None else None,
         migration=migration_loaded if activity.migration is not None else None,
         forge=forge_loaded if activity.forge is not None else None,
+        timeouts=activity.timeouts,
+        clone_local=activity.clone_local,
     )
 
 
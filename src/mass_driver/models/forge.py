@@ -60,6 +60,8 @@ class PROutcome(str, Enum):
     """The PR was created correctly"""
     PR_FAILED = "PR_FAILED"
     """The PR failed to be created"""
+    PR_TIMED_OUT = "PR_TIMED_OUT"
+    """The git push before PR creation ran past its timeout"""
 
 
 class PRResult(BaseModel):
@@ -40,6 +40,13 @@ class MigrationLoaded(MigrationFile):
         migration_nodriver = load_migration(config_toml)
         return load_driver(migration_nodriver)
 
+    def fresh(self) -> "MigrationLoaded":
+        """Get a copy of this migration with a fresh driver, to patch a new repo with
+
+        Ensures no driver state persists between repos, without deep-copying config.
+        """
+        return self.copy(update={"driver": self.driver.fresh()})
+
 
 def load_migration(migration_config: str) -> MigrationFile:
     """Load up a TOML config of a migration into memory"""
@@ -1,6 +1,7 @@
 """PatchDriver base object definition"""
 from enum import Enum
 from logging import Logger
+from typing import ClassVar
 
 from pydantic import BaseModel, Extra
 
@@ -18,6 +19,8 @@ class PatchOutcome(str, Enum):
     """The repo is missing a pre-requisite that makes patching irrelevant"""
     PATCH_ERROR = "PATCH_ERROR"
     """The Patch tried to apply, but failed somehow"""
+    TIMED_OUT = "TIMED_OUT"
+    """The Patch (or its commit) ran past its timeout, and was abandoned"""
 
 
 class PatchResult(BaseModel):
@@ -32,8 +35,18 @@ class PatchResult(BaseModel):
 class PatchDriver(BaseModel):
     """Base class for creating patches over repositories"""
 
+    stateless: ClassVar[bool] = False
+    """Whether the driver never mutates its own fields during {py:meth}`run`
+
+    Stateless drivers share their (already validated) config values between repos,
+    see {py:meth}`fresh`. Set it on the driver class, not in config.
+    """
     _logger: Logger
     """The logger object for this driver. Given dynamically by migration"""
+    _timeout: float | None = None
+    """Seconds this driver has to patch a repo, if limited. Given dynamically too"""
+    _changed_paths: list[str] | None = None
+    """The files this driver wrote or deleted in the repo, if recorded. Reset per run"""
 
     def run(self, repo: ClonedRepo) -> PatchResult:
         """Apply the update to given (cloned) Git Repository.
@@ -42,11 +55,59 @@ class PatchDriver(BaseModel):
         """
         raise NotImplementedError("PatchDriver base class can't run, use derived")
 
+    def needed_paths(self) -> list[str] | None:
+        """Get the only files this driver reads or writes, as gitignore-style patterns
+
+        Repos get checked out with just the files their activity's plugins need
+        (sparse-checkout), making clones of large repos cheap: files the driver
+        creates must match too. Defaults to None, needing all files.
+        """
+        return None
+
+    def changed_paths(self) -> list[str] | None:
+        """Get the files this driver wrote or deleted in the repo, relative to its root
+
+        Committing stages only these, instead of the whole repo, unless other files
+        changed too. Defaults to None (unknown, staging it all), unless the driver
+        recorded its changes via {py:meth}`record_change`.
+        """
+        return self._changed_paths
+
+    def record_change(self, path: str):
+        """Record a file this driver wrote or deleted, relative to the repo's root
+
+        Drivers recording changes should record every file they touch: files not
+        recorded get a warning, and the whole repo's changes committed instead.
+        """
+        if self._changed_paths is None:
+            self._changed_paths = []
+        self._changed_paths.append(path)
+
+    def fresh(self) -> "PatchDriver":
+        """Get a fresh instance of this driver, to patch a new repo with
+
+        Deep-copies the driver, so no state persists between repos. Drivers
+        declared {py:attr}`stateless` are copied cheaply instead: the new instance
+        shares the config values, saving time and memory on big configs.
+        """
+        if self.stateless:
+            return self.copy()
+        return self.copy(deep=True)
+
     @property
     def logger(self):
         """Grab the logger of this driver, as passed dynamically via mass-driver code"""
         return self._logger
 
+    @property
+    def timeout(self) -> float | None:
+        """Grab the seconds this driver has to patch a repo, if limited
+
+        Drivers running subprocesses should kill them past this timeout: once timed
+        out, mass-driver moves on to the next repo, abandoning the driver's run.
+        """
+        return self._timeout
+
     class Config:
         """Pydantic config of the PatchDriver class"""
 
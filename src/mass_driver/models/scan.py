@@ -4,9 +4,41 @@ from typing import Any, Callable, NamedTuple
 
 from pydantic import BaseModel
 
+from mass_driver.git_tree import GitTreePath
+
 ScannerFunc = Callable[[Path], dict[str, Any]]
 """The scanner function itself, taking cloned repo, returning a dict of findings"""
 
+RepoFiles = Path | GitTreePath
+"""What scanners read repos from: a checked out repo, or its files in git objects"""
+
+
+def needs_paths(*patterns: str) -> Callable[[ScannerFunc], ScannerFunc]:
+    """Declare the only files a scanner function reads, as gitignore-style patterns
+
+    Repos get checked out with just the files their activity's plugins need (see
+    {py:attr}`mass_driver.models.activity.ActivityLoaded.sparse_paths`).
+    Undeclared scanners need all files.
+    """
+
+    def declare(func: ScannerFunc) -> ScannerFunc:
+        func.needed_paths = list(patterns)  # type: ignore[attr-defined]
+        return func
+
+    return declare
+
+
+def scans_tree(func: Callable[[RepoFiles], dict[str, Any]]) -> ScannerFunc:
+    """Declare a scanner function reads the repo via a read-only git tree view
+
+    The scanner gets a {py:class}`mass_driver.git_tree.GitTreePath` of the repo's
+    commit instead of a checked out folder: only joining, existence checks, file
+    reads, and directory listing. Activities of just such scanners (no
+    migration, no forge) skip checking out repos.
+    """
+    func.tree_only = True  # type: ignore[attr-defined]
+    return func
+
 
 class Scanner(NamedTuple):
     """A single scanner"""
@@ -16,6 +48,22 @@ class Scanner(NamedTuple):
     func: ScannerFunc
     """The scanner function itself"""
 
+    @property
+    def needed_paths(self) -> list[str] | None:
+        """The files the scanner reads, as gitignore-style patterns. None for all
+
+        Declared via {py:func}`needs_paths`.
+        """
+        return getattr(self.func, "needed_paths", None)
+
+    @property
+    def tree_only(self) -> bool:
+        """Whether the scanner reads repos via git tree view, needing no checkout
+
+        Declared via {py:func}`scans_tree`.
+        """
+        return getattr(self.func, "tree_only", False)
+
 
 class ScanFile(BaseModel):
     """Config file for Scan Activity"""
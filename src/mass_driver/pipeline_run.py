@@ -0,0 +1,375 @@
+"""Pipelined variant of the main activity: each phase gets its own pool of workers
+
+Where {py:func}`mass_driver.activity_run.thread_run` runs clone, scan, migrate and
+commit serially inside the same thread, here each phase is a separate pool of
+threads, connected by bounded queues. Network-bound clones don't compete with
+patching for worker slots: repo N+1 can be cloning while repo N is being patched.
+"""
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from mass_driver.activity_run import LOGGER_PREFIX, RunCollector
+from mass_driver.concurrency import AUTO_WORKERS, Workers
+from mass_driver.git import GitRepo, get_cache_folder
+from mass_driver.models.activity import (
+    ActivityLoaded,
+    ActivityOutcome,
+    PhaseTiming,
+    RepoCallback,
+    RepoOutcome,
+    ScanResult,
+)
+from mass_driver.models.patchdriver import PatchOutcome, PatchResult
+from mass_driver.models.repository import (
+    ClonedRepo,
+    IndexedRepos,
+    RepoID,
+    SourcedRepo,
+)
+from mass_driver.process_repo import (
+    clone_repo,
+    commit_patch,
+    patch_repo,
+    scan_repo,
+)
+from mass_driver.timeouts import PhaseTimeoutError
+from mass_driver.timing import recording_timings
+
+DEFAULT_STAGE_WORKERS = {"clone": 8, "scan": 2, "migrate": 2, "commit": 2}
+"""How many workers each phase gets by default, by phase name"""
+
+DEFAULT_QUEUE_SIZE = 16
+"""How many repos can wait between two phases before the upstream phase blocks"""
+
+
+def parse_stage_workers(stage_workers: str) -> dict[str, int]:
+    """Parse the value of the `--stage-workers` flag: 'phase=N' pairs, comma-separated
+
+    Such as 'clone=16,migrate=8'. Phases not given keep their default size.
+    """
+    workers_by_stage = {}
+    for stage_pair in stage_workers.split(","):
+        stage, worker_count_str = stage_pair.split("=")
+        stage, worker_count = stage.strip(), int(worker_count_str)
+        if stage not in DEFAULT_STAGE_WORKERS:
+            raise ValueError(
+                f"Unknown phase {stage!r}, expected one of {list(DEFAULT_STAGE_WORKERS)}"
+            )
+        if worker_count < 1:
+            raise ValueError(f"Need at least 1 worker for {stage}, got {worker_count}")
+        workers_by_stage[stage] = worker_count
+    return workers_by_stage
+
+
+_DONE = object()
+"""Sentinel marking the end of a queue's items"""
+
+
+@dataclass
+class PipelineItem:
+    """A single repo making its way through the phases of the pipeline"""
+
+    repo_id: RepoID
+    repo: SourcedRepo
+    logger: logging.Logger
+    cloned_repo: ClonedRepo | None = None
+    repo_gitobj: GitRepo | None = None
+    scan_result: ScanResult | None = None
+    patch_result: PatchResult | None = None
+    changed_paths: list[str] | None = None
+    """The files the driver wrote or deleted, if it recorded them, to commit only"""
+    error: str | None = None
+    """The error of an earlier phase, skipping all later phases"""
+    clone_timed_out: bool = False
+    """Whether cloning ran past its timeout (see error)"""
+    started_at: float | None = None
+    """When this repo's processing started (clone phase), as monotonic time"""
+    timings: list[PhaseTiming] = field(default_factory=list)
+    """How long each phase of processing this repo took"""
+
+
+StageFunc = Callable[[PipelineItem], None]
+"""A phase of the pipeline, mutating the item in place with its result"""
+
+
+def pipeline_run(
+    activity: ActivityLoaded,
+    repos: IndexedRepos,
+    cache: bool,
+    workers: Workers | None = None,
+    stage_workers: dict[str, int] | None = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    repo_callbacks: list[RepoCallback] | None = None,
+    keep_repo_results: bool = True,
+) -> ActivityOutcome:
+    """Run the main activity PIPELINED: per-phase pools of clone, scan, migrate, commit
+
+    Produces the same {py:class}`ActivityOutcome` as
+    {py:func}`mass_driver.activity_run.thread_run`. The workers parameter sizes
+    the (network-bound) clone phase, while stage_workers overrides any phase's size.
+    """
+    if workers == AUTO_WORKERS:
+        raise ValueError("Pipeline run doesn't support adaptive workers")
+    logger = logging.getLogger(LOGGER_PREFIX)
+    clone_workers = {} if workers is None else {"clone": workers}
+    workers_by_stage = DEFAULT_STAGE_WORKERS | clone_workers | (stage_workers or {})
+    repo_count = len(repos.keys())
+    cache_folder = get_cache_folder(cache, logger=logger)
+    stages: list[tuple[str, StageFunc]] = [
+        (
+            "clone",
+            clone_stage(
+                cache_folder,
+                activity.workspace,
+                activity.sparse_paths,
+                activity.timeouts.clone,
+                activity.needs_checkout,
+                activity.clone_local,
+            ),
+        ),
+    ]
+    what_array = ["clone"]
+    if activity.scan is not None:
+        stages.append(("scan", scan_stage(activity)))
+        what_array.append(f"{len(activity.scan.scanners)} scanners")
+    if activity.migration is not None:
+        stages.append(("migrate", migrate_stage(activity)))
+        stages.append(("commit", commit_stage(activity)))
+        what_array.append(f"{activity.migration.driver=}")
+    workers_desc = ", ".join(
+        f"{name}={workers_by_stage[name]}" for name, _func in stages
+    )
+    logger.info(
+        f"Processing {repo_count} with {' and '.join(what_array)}, "
+        f"via Pipeline ({workers_desc})"
+    )
+
+    inbox: queue.Queue = queue.Queue(maxsize=queue_size)
+    first_inbox = inbox
+    threads: list[threading.Thread] = []
+    for stage_name, stage_func in stages:
+        outbox: queue.Queue = queue.Queue(maxsize=queue_size)
+        threads.extend(
+            start_stage(
+                stage_name, stage_func, workers_by_stage[stage_name], inbox, outbox
+            )
+        )
+        inbox = outbox
+    feeder = threading.Thread(
+        target=feed_repos,
+        args=(repos, first_inbox, logger),
+        name="pipeline-feed",
+        daemon=True,
+    )
+    feeder.start()
+
+    collector = RunCollector(activity, repos, repo_callbacks, keep_repo_results)
+    repo_index = 0
+    while (item := inbox.get()) is not _DONE:
+        repo_index += 1
+        logger.info(f"[{repo_index:04d}/{repo_count:04d}] Processed {item.repo_id}")
+        collector.add(
+            RepoOutcome(
+                repo_id=item.repo_id,
+                cloned_repo=item.cloned_repo,
+                scan_result=item.scan_result,
+                migration_result=item.patch_result,
+                error=item.error,
+                clone_timed_out=item.clone_timed_out,
+                timings=item.timings,
+                elapsed_seconds=(
+                    time.monotonic() - item.started_at
+                    if item.started_at is not None
+                    else None
+                ),
+            )
+        )
+    feeder.join()
+    for thread in threads:
+        thread.join()
+    logger.info("Action completed: exiting")
+    return collector.outcome()
+
+
+def feed_repos(repos: IndexedRepos, inbox: queue.Queue, logger: logging.Logger):
+    """Send all repos into the pipeline's first phase, blocking when it's full"""
+    for repo_id, repo in repos.items():
+        repo_logger = logging.getLogger(
+            f"{logger.name}.repo.{repo_id.replace('.','_')}"
+        )
+        inbox.put(PipelineItem(repo_id=repo_id, repo=repo, logger=repo_logger))
+    inbox.put(_DONE)
+
+
+def start_stage(
+    stage_name: str,
+    stage_func: StageFunc,
+    worker_count: int,
+    inbox: queue.Queue,
+    outbox: queue.Queue,
+) -> list[threading.Thread]:
+    """Start the worker threads of a phase, plus a closer signaling its end"""
+    workers = [
+        threading.Thread(
+            target=stage_worker,
+            args=(stage_name, stage_func, inbox, outbox),
+            name=f"pipeline-{stage_name}-{worker_index}",
+            daemon=True,
+        )
+        for worker_index in range(worker_count)
+    ]
+    closer = threading.Thread(
+        target=close_stage,
+        args=(workers, outbox),
+        name=f"pipeline-{stage_name}-closer",
+        daemon=True,
+    )
+    for thread in workers + [closer]:
+        thread.start()
+    return workers + [closer]
+
+
+def stage_worker(
+    stage_name: str, stage_func: StageFunc, inbox: queue.Queue, outbox: queue.Queue
+):
+    """Process items from inbox until done, passing them on to outbox
+
+    Errors escaping the phase are recorded on the item, skipping its later phases:
+    a dead worker would drop the repo, and stall upstream phases once all are dead.
+    """
+    while (item := inbox.get()) is not _DONE:
+        if item.error is None:
+            try:
+                with recording_timings(item.timings):
+                    stage_func(item)
+            except Exception as e:
+                item.logger.error(f"Error in {stage_name} of repo '{item.repo_id}'")
+                item.logger.error(f"Error was: {e}")
+                item.error = f"Unhandled exception caught during {stage_name}: {e}"
+        outbox.put(item)
+    inbox.put(_DONE)  # Let sibling workers of this phase see the end too
+
+
+def close_stage(workers: list[threading.Thread], outbox: queue.Queue):
+    """Once all workers of a phase are done, signal the end to next phase"""
+    for worker in workers:
+        worker.join()
+    outbox.put(_DONE)
+
+
+def clone_stage(
+    cache_folder: Path,
+    workspace: str,
+    sparse_paths: list[str] | None = None,
+    timeout: float | None = None,
+    checkout: bool = True,
+    clone_local: bool = False,
+) -> StageFunc:
+    """Create the clone phase of the pipeline, cloning into given workspace
+
+    Only files matching sparse_paths are checked out, if given. Without checkout,
+    remote repos are only mirrored. Local repos are cloned too if clone_local.
+    """
+
+    def clone(item: PipelineItem):
+        item.started_at = time.monotonic()
+        try:
+            item.logger.info(f"Processing {item.repo_id}...")
+            item.cloned_repo, item.repo_gitobj = clone_repo(
+                item.repo,
+                cache_folder,
+                logger=item.logger,
+                timeout=timeout,
+                workspace=workspace,
+                sparse_paths=sparse_paths,
+                checkout=checkout,
+                clone_local=clone_local,
+            )
+        except Exception as e:
+            item.logger.info(f"Error cloning repo '{item.repo_id}'\nError was: {e}")
+            item.error = str(e)
+            item.clone_timed_out = isinstance(e, PhaseTimeoutError)
+
+    return clone
+
+
+def scan_stage(activity: ActivityLoaded) -> StageFunc:
+    """Create the scan phase of the pipeline"""
+
+    def scan(item: PipelineItem):
+        if activity.scan is None or item.cloned_repo is None:
+            return
+        try:
+            item.scan_result = scan_repo(
+                activity.scan, item.cloned_repo, timeout=activity.timeouts.scan
+            )
+        except Exception as e:
+            item.logger.error(f"Error scanning repo '{item.repo_id}'")
+            item.logger.error(f"Error was: {e}")
+            # Reaching here should be impossible (catch-all in scan)
+
+    return scan
+
+
+def migrate_stage(activity: ActivityLoaded) -> StageFunc:
+    """Create the migrate phase of the pipeline: run the PatchDriver, no commit"""
+
+    def migrate(item: PipelineItem):
+        if activity.migration is None or item.cloned_repo is None:
+            return
+        try:
+            # Ensure no driver persistence between repos
+            migration_copy = activity.migration.fresh()
+            item.patch_result, _excep = patch_repo(
+                item.cloned_repo,
+                migration_copy,
+                logger=item.logger,
+                timeout=activity.timeouts.migrate,
+            )
+            item.changed_paths = migration_copy.driver.changed_paths()
+        except Exception as e:
+            item.logger.error(f"Error migrating repo '{item.repo_id}'")
+            item.logger.error(f"Error was: {e}")
+            item.patch_result = PatchResult(
+                outcome=PatchOutcome.PATCH_ERROR,
+                details=f"Unhandled exception caught during patching. Error was: {e}",
+            )
+
+    return migrate
+
+
+def commit_stage(activity: ActivityLoaded) -> StageFunc:
+    """Create the commit phase of the pipeline: save patched repos' changes"""
+
+    def commit_item(item: PipelineItem):
+        if (
+            activity.migration is None
+            or item.repo_gitobj is None
+            or item.patch_result is None
+            or item.patch_result.outcome != PatchOutcome.PATCHED_OK
+        ):
+            return
+        try:
+            item.patch_result, _excep = commit_patch(
+                item.repo_gitobj,
+                activity.migration,
+                item.patch_result,
+                item.logger,
+                timeout=activity.timeouts.commit,
+                changed_paths=item.changed_paths,
+            )
+        except Exception as e:
+            item.logger.error(f"Error committing repo '{item.repo_id}'")
+            item.logger.error(f"Error was: {e}")
+            item.patch_result = PatchResult(
+                outcome=PatchOutcome.PATCH_ERROR,
+                details=f"Unhandled exception caught during patching. Error was: {e}",
+            )
+
+    return commit_item
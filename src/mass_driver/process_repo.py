@@ -3,19 +3,32 @@
 Given a single repo, process SINGLE "activity" (clone OR migrate OR scan OR forge).
 """
 
+import asyncio
 import logging
+import time
 import traceback
+from contextlib import nullcontext
 from pathlib import Path
 
 from mass_driver.git import (
+    DEFAULT_WORKSPACE,
     GitRepo,
+    active_branch,
+    clone_cache_hit,
     clone_if_remote,
+    clone_if_remote_async,
     commit,
     get_default_branch,
+    git_pack_size,
+    mirror_path,
     push,
     switch_branch_then_pull,
+    switch_branch_then_pull_async,
+    unrecorded_changes,
 )
-from mass_driver.models.activity import ScanResult
+from mass_driver.git_backend import git_backend
+from mass_driver.git_tree import open_tree
+from mass_driver.models.activity import PhaseTimeouts, ScanResult
 from mass_driver.models.forge import PROutcome, PRResult
 from mass_driver.models.migration import ForgeLoaded, MigrationLoaded
 from mass_driver.models.patchdriver import PatchOutcome, PatchResult
@@ -24,36 +37,320 @@ from mass_driver.models.repository import (
     SourcedRepo,
 )
 from mass_driver.models.scan import ScanLoaded
+from mass_driver.profiling import profile_call
+from mass_driver.timeouts import PhaseTimeoutError, call_with_timeout
+from mass_driver.timing import timed_phase
 
 
 def clone_repo(
-    repo: SourcedRepo, cache_path: Path, logger: logging.Logger
+    repo: SourcedRepo,
+    cache_path: Path,
+    logger: logging.Logger,
+    timeout: float | None = None,
+    workspace: str = DEFAULT_WORKSPACE,
+    sparse_paths: list[str] | None = None,
+    checkout: bool = True,
+    clone_local: bool = False,
+) -> tuple[ClonedRepo, GitRepo]:
+    """Clone a repo (if needed) into workspace and switch branch, within timeout
+
+    Only files matching sparse_paths are checked out, if given. Without checkout,
+    remote repos are only mirrored. Local repos are cloned too if clone_local. See
+    {py:func}`mass_driver.git.clone_if_remote`.
+
+    Raises:
+      PhaseTimeoutError: When cloning ran past the timeout (seconds), if set
+    """
+    return call_with_timeout(
+        "clone",
+        timeout,
+        clone_repo_untimed,
+        repo,
+        cache_path,
+        logger,
+        timeout,
+        workspace,
+        sparse_paths,
+        checkout,
+        clone_local,
+    )
+
+
+def clone_repo_untimed(
+    repo: SourcedRepo,
+    cache_path: Path,
+    logger: logging.Logger,
+    git_timeout: float | None = None,
+    workspace: str = DEFAULT_WORKSPACE,
+    sparse_paths: list[str] | None = None,
+    checkout: bool = True,
+    clone_local: bool = False,
 ) -> tuple[ClonedRepo, GitRepo]:
-    """Clone a repo (if needed) and switch branch"""
-    repo_gitobj = clone_if_remote(repo.clone_url, cache_path, logger=logger)
-    switch_branch_then_pull(repo_gitobj, repo.force_pull, repo.upstream_branch)
+    """Clone a repo (if needed) and switch branch, killing git past git_timeout"""
+    with timed_phase("clone") as clone_measure:
+        clone_measure.cache_hit = clone_cache_hit(repo.clone_url, cache_path)
+        mirror_packs_before = mirror_pack_size(repo, cache_path)
+        repo_gitobj = clone_if_remote(
+            repo.clone_url,
+            cache_path,
+            logger=logger,
+            timeout=git_timeout,
+            workspace=workspace,
+            sparse_paths=sparse_paths,
+            checkout=checkout,
+            clone_local=clone_local,
+        )
+        clone_measure.bytes_fetched = cloned_bytes(
+            repo, cache_path, mirror_packs_before
+        )
+    if not repo_gitobj.bare:  # Mirrors have no checkout to switch
+        with timed_phase("pull") as pull_measure:
+            packs_before = git_pack_size(Path(repo_gitobj.working_dir))
+            switch_branch_then_pull(
+                repo_gitobj, repo.force_pull, repo.upstream_branch, timeout=git_timeout
+            )
+            pull_measure.bytes_fetched = pulled_bytes(repo, repo_gitobj, packs_before)
     repo_local_path = Path(repo_gitobj.working_dir)
     cloned_repo = ClonedRepo(
         cloned_path=repo_local_path,
-        current_branch=repo_gitobj.active_branch.name,
+        current_branch=current_branch(repo, repo_gitobj),
         **repo.dict(),
     )
     return cloned_repo, repo_gitobj
 
 
+async def clone_repo_async(
+    repo: SourcedRepo,
+    cache_path: Path,
+    logger: logging.Logger,
+    timeout: float | None = None,
+    workspace: str = DEFAULT_WORKSPACE,
+    sparse_paths: list[str] | None = None,
+    checkout: bool = True,
+    clone_local: bool = False,
+) -> tuple[ClonedRepo, GitRepo]:
+    """Clone a repo (if needed) and switch branch, via asyncio git subprocesses
+
+    Git subprocesses still running past timeout seconds (if set) are killed.
+
+    Raises:
+      PhaseTimeoutError: When cloning ran past the timeout
+    """
+    try:
+        return await asyncio.wait_for(
+            clone_repo_async_untimed(
+                repo,
+                cache_path,
+                logger,
+                workspace,
+                sparse_paths,
+                checkout,
+                clone_local,
+                timeout,
+            ),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        raise PhaseTimeoutError("clone", timeout or 0)
+
+
+async def clone_repo_async_untimed(
+    repo: SourcedRepo,
+    cache_path: Path,
+    logger: logging.Logger,
+    workspace: str = DEFAULT_WORKSPACE,
+    sparse_paths: list[str] | None = None,
+    checkout: bool = True,
+    clone_local: bool = False,
+    git_timeout: float | None = None,
+) -> tuple[ClonedRepo, GitRepo]:
+    """Clone a repo (if needed) and switch branch, via asyncio, without timeout
+
+    Blocking work (reading repos and their sizes) runs in threads, keeping the
+    event loop free. Git commands run in threads are still killed past
+    git_timeout seconds, if set: cancelling their task can't stop them.
+    """
+    with timed_phase("clone", measure_cpu=False) as clone_measure:
+        clone_measure.cache_hit = clone_cache_hit(repo.clone_url, cache_path)
+        mirror_packs_before = await asyncio.to_thread(
+            mirror_pack_size, repo, cache_path
+        )
+        repo_gitobj = await clone_if_remote_async(
+            repo.clone_url,
+            cache_path,
+            logger=logger,
+            workspace=workspace,
+            sparse_paths=sparse_paths,
+            checkout=checkout,
+            clone_local=clone_local,
+            timeout=git_timeout,
+        )
+        clone_measure.bytes_fetched = await asyncio.to_thread(
+            cloned_bytes, repo, cache_path, mirror_packs_before
+        )
+    if not repo_gitobj.bare:  # Mirrors have no checkout to switch
+        with timed_phase("pull", measure_cpu=False) as pull_measure:
+            packs_before = await asyncio.to_thread(
+                git_pack_size, Path(repo_gitobj.working_dir)
+            )
+            await switch_branch_then_pull_async(
+                repo_gitobj, repo.force_pull, repo.upstream_branch
+            )
+            pull_measure.bytes_fetched = await asyncio.to_thread(
+                pulled_bytes, repo, repo_gitobj, packs_before
+            )
+    cloned_repo = ClonedRepo(
+        cloned_path=Path(repo_gitobj.working_dir),
+        current_branch=await asyncio.to_thread(current_branch, repo, repo_gitobj),
+        **repo.dict(),
+    )
+    return cloned_repo, repo_gitobj
+
+
+def current_branch(repo: SourcedRepo, repo_gitobj: GitRepo) -> str:
+    """Get the branch to process: as checked out, else (mirrors) as asked or default"""
+    if repo_gitobj.bare and repo.upstream_branch is not None:
+        return repo.upstream_branch
+    return active_branch(repo_gitobj)
+
+
+def mirror_pack_size(repo: SourcedRepo, cache_path: Path) -> int | None:
+    """Get the size of a (remote) repo's mirror git packs, if mirrored already"""
+    if Path(repo.clone_url).is_dir():
+        return None  # Local repo, not mirrored
+    return git_pack_size(mirror_path(repo.clone_url, cache_path))
+
+
+def cloned_bytes(
+    repo: SourcedRepo, cache_path: Path, mirror_packs_before: int | None
+) -> int | None:
+    """Get how many bytes (git packs) cloning a repo fetched into its mirror
+
+    Local repos aren't cloned: nothing to tell.
+    """
+    if Path(repo.clone_url).is_dir():
+        return None
+    mirror_packs_after = mirror_pack_size(repo, cache_path) or 0
+    return mirror_packs_after - (mirror_packs_before or 0)
+
+
+def pulled_bytes(
+    repo: SourcedRepo, repo_gitobj: GitRepo, packs_before: int | None
+) -> int | None:
+    """Get how many bytes (git packs) a repo's pull fetched, if it got pulled"""
+    packs_after = git_pack_size(Path(repo_gitobj.working_dir))
+    if not repo.force_pull or packs_before is None or packs_after is None:
+        return None
+    return packs_after - packs_before
+
+
 # TODO: Avoid passing out the exception, catch the trace in details kw (see scanner_run)
 def migrate_repo(
     cloned_repo: ClonedRepo,
     repo_gitobj: GitRepo,
     migration: MigrationLoaded,
     logger: logging.Logger,
+    timeouts: PhaseTimeouts | None = None,
 ) -> tuple[PatchResult, Exception | None]:
     """Process a repo with Mass Driver"""
+    timeouts = timeouts if timeouts is not None else PhaseTimeouts()
+    result, excep = patch_repo(cloned_repo, migration, logger, timeouts.migrate)
+    if result.outcome != PatchOutcome.PATCHED_OK:
+        return (result, excep)
+    # Patched OK: Save the mutation
+    return commit_patch(
+        repo_gitobj,
+        migration,
+        result,
+        logger,
+        timeouts.commit,
+        migration.driver.changed_paths(),
+    )
+
+
+def commit_patch(
+    repo_gitobj: GitRepo,
+    migration: MigrationLoaded,
+    result: PatchResult,
+    logger: logging.Logger,
+    timeout: float | None = None,
+    changed_paths: list[str] | None = None,
+) -> tuple[PatchResult, Exception | None]:
+    """Commit a repo's patch, within timeout seconds if set
+
+    Only changed_paths are committed, if given (as reported by the driver, see
+    {py:meth}`mass_driver.models.patchdriver.PatchDriver.changed_paths`), unless
+    other files changed too, see {py:func}`commit_recorded`.
+    """
+    try:
+        with timed_phase("commit"):
+            call_with_timeout(
+                "commit",
+                timeout,
+                commit_recorded,
+                repo_gitobj,
+                migration,
+                logger,
+                timeout,
+                changed_paths,
+            )
+    except PhaseTimeoutError as e:
+        logger.error(str(e))
+        return (PatchResult(outcome=PatchOutcome.TIMED_OUT, details=str(e)), e)
+    return (result, None)
+
+
+def commit_recorded(
+    repo_gitobj: GitRepo,
+    migration: MigrationLoaded,
+    logger: logging.Logger,
+    timeout: float | None = None,
+    changed_paths: list[str] | None = None,
+):
+    """Commit a repo's patch, staging just the changed_paths recorded, if any
+
+    Files changed but not recorded (say, written by a driver subclass' hook) get
+    a warning, and the whole repo's changes are committed instead.
+    """
+    if changed_paths is not None:
+        unrecorded = unrecorded_changes(repo_gitobj, changed_paths, timeout)
+        if unrecorded:
+            logger.warning(
+                f"Driver changed files it didn't record: {', '.join(unrecorded)}. "
+                "Committing all changes instead"
+            )
+            changed_paths = None
+    commit(repo_gitobj, migration, timeout, changed_paths)
+
+
+def patch_repo(
+    cloned_repo: ClonedRepo,
+    migration: MigrationLoaded,
+    logger: logging.Logger,
+    timeout: float | None = None,
+) -> tuple[PatchResult, Exception | None]:
+    """Run the PatchDriver over a repo, without committing the outcome
+
+    A PatchDriver running past timeout seconds (if set) is abandoned, TIMED_OUT.
+    """
     try:
         migration.driver._logger = logging.getLogger(
             f"{logger.name}.driver.{migration.driver_name}"
         )
-        result = migration.driver.run(cloned_repo)
+        migration.driver._timeout = timeout
+        migration.driver._changed_paths = None
+        with timed_phase("migrate"):
+            result = call_with_timeout(
+                "migrate",
+                timeout,
+                profile_call,
+                f"driver.{migration.driver_name}",
+                migration.driver.run,
+                cloned_repo,
+            )
+    except PhaseTimeoutError as e:
+        logger.error(str(e))
+        return (PatchResult(outcome=PatchOutcome.TIMED_OUT, details=str(e)), e)
     except Exception as e:
         result = PatchResult(
             outcome=PatchOutcome.PATCH_ERROR,
@@ -61,46 +358,113 @@ def migrate_repo(
         )
         return (result, e)
     logger.info(result.outcome.value)
-    if result.outcome != PatchOutcome.PATCHED_OK:
-        return (result, None)
-    # Patched OK: Save the mutation
-    commit(repo_gitobj, migration)
     return (result, None)
 
 
 def scan_repo(
     config: ScanLoaded,
     cloned_repo: ClonedRepo,
+    timeout: float | None = None,
+) -> ScanResult:
+    """Apply all Scanners on a single repo, within timeout seconds (overall) if set
+
+    The scanner running past the timeout reports a timed-out scan_error, and
+    scanners left to run are skipped.
+    """
+    with timed_phase("scan"):
+        return scan_repo_untimed(config, cloned_repo, timeout)
+
+
+def scan_repo_untimed(
+    config: ScanLoaded,
+    cloned_repo: ClonedRepo,
+    timeout: float | None = None,
 ) -> ScanResult:
-    """Apply all Scanners on a single repo"""
+    """Apply all Scanners on a single repo, within timeout seconds if set
+
+    Scanners reading git trees (see {py:func}`mass_driver.models.scan.scans_tree`)
+    share a view of the repo's current branch, read via a single git process.
+    Local repos scanned in place give them their working tree instead, see
+    {py:func}`scanned_in_place`.
+    """
     scan_result: ScanResult = {}
-    for scanner in config.scanners:
-        try:
-            scan_result[scanner.name] = scanner.func(cloned_repo.cloned_path)
-        except Exception as e:
-            scan_result[scanner.name] = {
-                "scan_error": {
-                    "exception": str(e),
-                    "backtrace": traceback.format_exception(e),
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    reads_tree = any(scanner.tree_only for scanner in config.scanners)
+    reads_tree = reads_tree and not scanned_in_place(cloned_repo)
+    with (
+        open_tree(cloned_repo.cloned_path, cloned_repo.current_branch)
+        if reads_tree
+        else nullcontext()
+    ) as tree:
+        for scanner in config.scanners:
+            remaining = (
+                max(deadline - time.monotonic(), 0) if deadline is not None else None
+            )
+            try:
+                with timed_phase(f"scanner.{scanner.name}"):
+                    scan_result[scanner.name] = call_with_timeout(
+                        "scan",
+                        remaining,
+                        profile_call,
+                        f"scanner.{scanner.name}",
+                        scanner.func,
+                        (
+                            tree
+                            if tree is not None and scanner.tree_only
+                            else cloned_repo.cloned_path
+                        ),
+                    )
+            except PhaseTimeoutError:
+                scan_result[scanner.name] = {
+                    "scan_error": {
+                        "exception": str(PhaseTimeoutError("scan", timeout or 0)),
+                        "timed_out": True,
+                    }
+                }
+                break
+            except Exception as e:
+                scan_result[scanner.name] = {
+                    "scan_error": {
+                        "exception": str(e),
+                        "backtrace": traceback.format_exception(e),
+                    }
                 }
-            }
     return scan_result
 
 
+def scanned_in_place(cloned_repo: ClonedRepo) -> bool:
+    """Check if a repo is a local checkout scanned in place, rather than a clone
+
+    Uncommitted or untracked files of such repos are part of the scan: their
+    working tree is scanned, even by scanners reading git trees.
+    """
+    local_path = Path(cloned_repo.clone_url)
+    in_place = local_path.resolve() == cloned_repo.cloned_path.resolve()
+    return local_path.is_dir() and in_place
+
+
 def forge_per_repo(
     config: ForgeLoaded,
     repo: ClonedRepo,
+    push_timeout: float | None = None,
 ) -> PRResult:
-    """Process a single repo"""
+    """Process a single repo, pushing first (within push_timeout seconds) if asked
+
+    Raises:
+      PhaseTimeoutError: When the git push ran past push_timeout
+    """
     repo_path = repo.cloned_path
     if repo_path is None:
         raise ValueError("Repo not cloned locally, can't create PR of it")
     git_repo = GitRepo(path=str(repo_path))
     if config.git_push_first:
-        push(git_repo, config.head_branch)
+        with timed_phase("push"):
+            call_with_timeout(
+                "push", push_timeout, push, git_repo, config.head_branch, push_timeout
+            )
     # Grab the repo's remote URL to feed it to the forge for ID
     try:
-        (forge_remote_url,) = list(git_repo.remote().urls)
+        (forge_remote_url,) = git_backend().remote_urls(repo_path)
     except ValueError:
         if not config.git_push_first:
             # No remote exists for repo and we didn't wanna push anyway
@@ -113,12 +477,13 @@ def forge_per_repo(
         if config.base_branch is None
         else config.base_branch
     )
-    pr = config.forge.create_pr(
-        forge_repo_url=forge_remote_url,
-        base_branch=base_branch,
-        head_branch=config.head_branch,
-        pr_title=config.pr_title,
-        pr_body=config.pr_body,
-        draft=config.draft_pr,
-    )
+    with timed_phase("forge"):
+        pr = config.forge.create_pr(
+            forge_repo_url=forge_remote_url,
+            base_branch=base_branch,
+            head_branch=config.head_branch,
+            pr_title=config.pr_title,
+            pr_body=config.pr_body,
+            draft=config.draft_pr,
+        )
     return PRResult(outcome=PROutcome.PR_CREATED, pr_html_url=pr)
@@ -0,0 +1,140 @@
+"""Profile plugins (PatchDrivers, Scanners) over a whole run, via cProfile
+
+Each call to a plugin is profiled on its own, in whatever thread runs it, then
+aggregated per plugin. Plugin authors get their code's hot spots from real fleet
+data, instead of a single repo on their laptop.
+
+Profiling is enabled for the whole process via {py:func}`profiling`, and so doesn't
+reach other processes (`process` executor, `mass-driver worker`).
+
+From Python 3.12, cProfile (via `sys.monitoring`) is a single process-wide tool,
+profiling all threads at once: plugin calls can then only be profiled apart when
+no other thread runs, i.e. with the sequential executor. See
+{py:func}`unprofilable_reason`.
+"""
+
+import cProfile
+import pstats
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_TOP_FUNCTIONS = 10
+"""How many of the hottest functions to list, per plugin"""
+
+PER_THREAD_PROFILING = sys.version_info < (3, 12)
+"""Whether cProfile profiles just the thread enabling it, as before Python 3.12"""
+
+
+class HotFunction(NamedTuple):
+    """A function's aggregated stats, within the calls to a plugin"""
+
+    function: str
+    """Where the function is, as 'file:line(name)'"""
+    calls: int
+    """How many times the function was called"""
+    self_seconds: float
+    """Time spent in the function itself, excluding its callees"""
+    cumulative_seconds: float
+    """Time spent in the function, including its callees"""
+
+
+class PluginProfiler:
+    """Profiles of plugin calls, aggregated per plugin, safe to use across threads"""
+
+    def __init__(self):
+        """Start with no profile"""
+        self.stats: dict[str, pstats.Stats] = {}
+        self._lock = threading.Lock()
+
+    def call(self, plugin: str, func: Callable[..., T], *args, **kwargs) -> T:
+        """Call func with given arguments, profiling it as part of given plugin
+
+        Calls are left unprofiled if another profiler is active already.
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiler is active
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                if plugin in self.stats:
+                    self.stats[plugin].add(profile)
+                else:
+                    self.stats[plugin] = pstats.Stats(profile)
+
+    def combined(self) -> pstats.Stats:
+        """Get the stats of all plugins, combined"""
+        combined = pstats.Stats()
+        for stats in self.stats.values():
+            combined.add(stats)
+        return combined
+
+    def save(self, profile_path: Path):
+        """Save the combined stats to file, for pstats (or snakeviz...) to load"""
+        self.combined().dump_stats(profile_path)
+
+    def top_functions(
+        self, plugin: str, count: int = DEFAULT_TOP_FUNCTIONS
+    ) -> list[HotFunction]:
+        """Get the functions a plugin spent the most time in (self time)"""
+        func_profiles = self.stats[plugin].get_stats_profile().func_profiles
+        functions = [
+            HotFunction(
+                function=f"{func.file_name}:{func.line_number}({func_name})",
+                calls=int(func.ncalls.split("/")[0]),  # Recursive: 'total/primitive'
+                self_seconds=func.tottime,
+                cumulative_seconds=func.cumtime,
+            )
+            for func_name, func in func_profiles.items()
+        ]
+        functions.sort(key=lambda function: function.self_seconds, reverse=True)
+        return functions[:count]
+
+
+def unprofilable_reason(executor: str, queued: bool) -> str | None:
+    """Get why plugin calls can't be profiled apart with given executor, if so
+
+    Profiles can't reach other processes. Without per-thread profiling (Python
+    3.12+), concurrent plugin calls clash over the single profiler, which would
+    record other threads' frames too: only the sequential executor is profilable.
+    """
+    if executor == "process":
+        return "Can't profile plugins running in other processes"
+    if not PER_THREAD_PROFILING and (executor != "sequential" or queued):
+        return (
+            f"Can't profile plugins with the {executor} executor (or a work queue) "
+            f"on Python {sys.version_info.major}.{sys.version_info.minor}: "
+            "cProfile profiles all threads at once. Use the sequential executor"
+        )
+    return None
+
+
+_PROFILER: PluginProfiler | None = None
+"""The profiler of this process' plugin calls, if profiling"""
+
+
+@contextmanager
+def profiling(profiler: PluginProfiler) -> Iterator[PluginProfiler]:
+    """Profile all plugin calls made in this process (any thread) within context"""
+    global _PROFILER
+    _PROFILER = profiler
+    try:
+        yield profiler
+    finally:
+        _PROFILER = None
+
+
+def profile_call(plugin: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """Call a plugin's func with given arguments, profiling it if profiling"""
+    if _PROFILER is None:
+        return func(*args, **kwargs)
+    return _PROFILER.call(plugin, func, *args, **kwargs)
@@ -0,0 +1,154 @@
+"""Live progress of a run: throughput, ETA, phases in flight, outcomes so far
+
+Repos are counted as they're done (a repo callback, see
+{py:meth}`ProgressReporter.record`), while a background thread shows the progress
+periodically: rewriting a single line on terminals, else printing a line now and then.
+"""
+
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Iterator, TextIO
+
+from mass_driver.models.activity import RepoOutcome
+from mass_driver.timing import phases_in_progress
+
+TTY_INTERVAL = 0.5
+"""How often to refresh the progress line on a terminal, in seconds"""
+
+LOG_INTERVAL = 30.0
+"""How often to print a progress line when not on a terminal, in seconds"""
+
+THROUGHPUT_WINDOW = 50
+"""How many of the latest repos done to average throughput over"""
+
+
+class ProgressReporter:
+    """Progress of a stage (run, forge, review) over a known number of items"""
+
+    def __init__(
+        self,
+        label: str,
+        total: int,
+        stream: TextIO | None = None,
+        interval: float | None = None,
+    ):
+        """Start the progress of label stage, at zero of total items done
+
+        Progress is shown on stream, stderr by default.
+        """
+        self.label = label
+        self.total = total
+        self.stream = stream if stream is not None else sys.stderr
+        self.is_tty = self.stream.isatty()
+        if interval is None:
+            interval = TTY_INTERVAL if self.is_tty else LOG_INTERVAL
+        self.interval = interval
+        self.done = 0
+        self.outcomes: Counter[str] = Counter()
+        self.started_at = time.monotonic()
+        self._done_times: deque[float] = deque(maxlen=THROUGHPUT_WINDOW)
+        self._lock = threading.Lock()
+
+    def tick(self, outcome: str):
+        """Count an item done, with given outcome"""
+        with self._lock:
+            self.done += 1
+            self.outcomes[outcome] += 1
+            self._done_times.append(time.monotonic())
+
+    def record(self, repo_outcome: RepoOutcome):
+        """Count a repo done, by its outcome. A repo callback"""
+        self.tick(outcome_label(repo_outcome))
+
+    def throughput(self) -> float:
+        """Get the items done per second, over the latest items done"""
+        now = time.monotonic()
+        with self._lock:
+            done_in_window = len(self._done_times)
+            if done_in_window == self._done_times.maxlen:
+                window_start = self._done_times[0]
+                done_in_window -= 1  # The first one marks the start of the window
+            else:
+                window_start = self.started_at
+        elapsed = now - window_start
+        return done_in_window / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self) -> float | None:
+        """Estimate the seconds left to finish, from throughput, if any yet"""
+        throughput = self.throughput()
+        if throughput == 0:
+            return None
+        return max(self.total - self.done, 0) / throughput
+
+    def render(self) -> str:
+        """Describe the progress so far, as a single line"""
+        percent = self.done / self.total * 100 if self.total else 100.0
+        eta = self.eta_seconds()
+        eta_desc = format_duration(eta) if eta is not None else "?"
+        parts = [
+            f"{self.label}: {self.done}/{self.total} ({percent:.1f}%), "
+            f"{self.throughput():.2f}/s, ETA {eta_desc}"
+        ]
+        in_flight = {phase: n for phase, n in phases_in_progress().items() if n}
+        if in_flight:
+            parts.append(
+                "in flight: "
+                + ", ".join(f"{phase} {n}" for phase, n in sorted(in_flight.items()))
+            )
+        with self._lock:
+            outcomes = self.outcomes.most_common()
+        if outcomes:
+            parts.append(", ".join(f"{outcome} {n}" for outcome, n in outcomes))
+        return " | ".join(parts)
+
+    def show(self, final: bool = False):
+        """Show the progress: rewriting the line on terminals, else a new line"""
+        if self.is_tty:
+            self.stream.write("\r" + self.render() + "\x1b[K" + ("\n" if final else ""))
+        else:
+            self.stream.write(self.render() + "\n")
+        self.stream.flush()
+
+
+@contextmanager
+def showing_progress(reporter: ProgressReporter) -> Iterator[ProgressReporter]:
+    """Show the reporter's progress periodically within context, and once at exit"""
+    stopped = threading.Event()
+
+    def show_periodically():
+        while not stopped.wait(reporter.interval):
+            reporter.show()
+
+    shower = threading.Thread(target=show_periodically, name="progress", daemon=True)
+    shower.start()
+    try:
+        yield reporter
+    finally:
+        stopped.set()
+        shower.join()
+        reporter.show(final=True)
+
+
+def outcome_label(repo_outcome: RepoOutcome) -> str:
+    """Sum up a repo's outcome in one word, for tallies"""
+    if repo_outcome.error is not None:
+        return "ERROR"
+    if repo_outcome.forge_result is not None:
+        return repo_outcome.forge_result.outcome.value
+    if repo_outcome.migration_result is not None:
+        return repo_outcome.migration_result.outcome.value
+    return "DONE"
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration for humans, like '1h02m', '3m05s' or '12s'"""
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{secs:02d}s"
+    return f"{secs}s"
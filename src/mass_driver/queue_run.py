@@ -0,0 +1,426 @@
+"""Work-queue variant of the main activity: many workers drain one run's repos
+
+The coordinator (`mass-driver run --queue`) enqueues the sourced repos, along with
+the Activity file, into a local SQLite file. Any number of `mass-driver worker`
+processes (on this host, or sharing the file over NFS) then claim repos one at a
+time, in enqueued order, process them, and post back each repo's outcome. The
+coordinator drains the queue too, gathering outcomes as repos get done, until all
+are.
+
+Repos are claimed with a lease, renewed while the repo is processed: a repo whose
+worker died (lease expired) goes back to being claimable by other workers, up to
+a few attempts before giving up on that repo.
+"""
+
+import logging
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from mass_driver.activity_run import (
+    LOGGER_PREFIX,
+    RunCollector,
+    clone_failed,
+    per_repo_process,
+)
+from mass_driver.concurrency import AUTO_WORKERS, Workers
+from mass_driver.git import get_cache_folder
+from mass_driver.models.activity import (
+    ActivityLoaded,
+    ActivityOutcome,
+    RepoCallback,
+    RepoOutcome,
+    load_activity,
+    load_activity_toml,
+)
+from mass_driver.models.repository import IndexedRepos, RepoID, SourcedRepo
+
+DEFAULT_LEASE_SECONDS = 1800.0
+"""How long a worker can hold a repo before others may claim it back"""
+
+DEFAULT_POLL_SECONDS = 1.0
+"""How long idle workers wait between checks for claimable repos"""
+
+DEFAULT_MAX_ATTEMPTS = 3
+"""How many times a repo is claimed (lease lost each time) before giving up on it"""
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS repos (
+    repo_id TEXT PRIMARY KEY,
+    repo TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT,
+    completed_order INTEGER
+);
+"""
+
+
+class WorkQueue:
+    """A durable queue of repos to process, in a SQLite file
+
+    Each repo is 'pending', then 'leased' by a worker, then 'done' with its outcome.
+    Repos are handed out in enqueued order, and outcomes kept in completion order.
+    Not thread-safe: use one WorkQueue per thread.
+    """
+
+    def __init__(self, queue_path: Path):
+        """Open the queue file, creating it (and its tables) if needed"""
+        self.queue_path = queue_path
+        self._db = sqlite3.connect(queue_path, timeout=60, isolation_level=None)
+        self._db.executescript(QUEUE_SCHEMA)
+
+    def enqueue(self, activity_config: str, repos: IndexedRepos):
+        """Store the activity and the repos to process, in order, into an empty queue
+
+        Raises:
+          ValueError: If the queue file already holds repos, say of a previous run
+        """
+        with self._transaction():
+            (queued,) = self._db.execute("SELECT COUNT(*) FROM repos").fetchone()
+            if queued:
+                raise ValueError(
+                    f"Work queue {self.queue_path} already holds {queued} repos: "
+                    "remove it, or use another queue file"
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO activity (id, config) VALUES (1, ?)",
+                (activity_config,),
+            )
+            self._db.executemany(
+                "INSERT INTO repos (repo_id, repo, position) VALUES (?, ?, ?)",
+                [
+                    (repo_id, repo.json(), position)
+                    for position, (repo_id, repo) in enumerate(repos.items())
+                ],
+            )
+
+    def activity_config(self) -> str:
+        """Get the Activity file (TOML) of the queued run"""
+        row = self._db.execute("SELECT config FROM activity WHERE id = 1").fetchone()
+        if row is None:
+            raise ValueError(f"No activity in work queue {self.queue_path}")
+        return row[0]
+
+    def claim(
+        self,
+        worker: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> SourcedRepo | None:
+        """Lease the next repo to process (pending, or with expired lease), if any
+
+        Repos whose lease expired max_attempts times are given up on instead: done,
+        with an error outcome.
+        """
+        now = time.time()
+        with self._transaction():
+            while True:
+                row = self._db.execute(
+                    "SELECT repo_id, repo, attempts FROM repos "
+                    "WHERE status = 'pending' "
+                    "OR (status = 'leased' AND lease_expires < ?) "
+                    "ORDER BY position LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    return None
+                repo_id, repo_json, attempts = row
+                if attempts < max_attempts:
+                    break
+                error = f"Gave up after {attempts} attempts, each lost its lease"
+                self._mark_done(RepoOutcome(repo_id=repo_id, error=error))
+            self._db.execute(
+                "UPDATE repos SET status = 'leased', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE repo_id = ?",
+                (worker, now + lease_seconds, repo_id),
+            )
+        return SourcedRepo.parse_raw(repo_json)
+
+    def renew(
+        self, worker: str, repo_id: RepoID, lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> bool:
+        """Extend the lease of a repo being processed, unless lost to another
+
+        Returns:
+          Whether the lease was renewed, i.e. the worker still held it
+        """
+        with self._transaction():
+            cursor = self._db.execute(
+                "UPDATE repos SET lease_expires = ? "
+                "WHERE repo_id = ? AND status = 'leased' AND worker = ?",
+                (time.time() + lease_seconds, repo_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, worker: str, repo_outcome: RepoOutcome) -> bool:
+        """Post the outcome of a leased repo, unless the lease was lost to another
+
+        Returns:
+          Whether the outcome was recorded, i.e. the worker still held the lease
+        """
+        with self._transaction():
+            return self._mark_done(repo_outcome, worker)
+
+    def counts(self) -> dict[str, int]:
+        """Count the repos of the queue, by status"""
+        rows = self._db.execute("SELECT status, COUNT(*) FROM repos GROUP BY status")
+        return dict(rows.fetchall())
+
+    def outcomes(self, repo_ids: list[RepoID]) -> list[RepoOutcome]:
+        """Get the outcomes of given repos, for those done"""
+        outcomes = []
+        for repo_id in repo_ids:
+            row = self._db.execute(
+                "SELECT outcome FROM repos WHERE repo_id = ? AND status = 'done'",
+                (repo_id,),
+            ).fetchone()
+            if row is not None:
+                outcomes.append(RepoOutcome.parse_raw(row[0]))
+        return outcomes
+
+    def outcomes_since(self, seen: int) -> list[RepoOutcome]:
+        """Get the outcomes of repos done since the first seen ones, in order"""
+        rows = self._db.execute(
+            "SELECT outcome FROM repos WHERE status = 'done' "
+            "ORDER BY completed_order LIMIT -1 OFFSET ?",
+            (seen,),
+        )
+        return [RepoOutcome.parse_raw(outcome) for (outcome,) in rows.fetchall()]
+
+    def close(self):
+        """Close the queue file"""
+        self._db.close()
+
+    def _mark_done(self, repo_outcome: RepoOutcome, worker: str | None = None) -> bool:
+        """Record the outcome of a leased (by worker, if given) repo, in a transaction
+
+        Returns:
+          Whether the outcome was recorded
+        """
+        cursor = self._db.execute(
+            "UPDATE repos SET status = 'done', outcome = ?, lease_expires = NULL, "
+            "completed_order = (SELECT COALESCE(MAX(completed_order), 0) + 1 "
+            "FROM repos) "
+            "WHERE repo_id = ? AND status = 'leased' AND worker = COALESCE(?, worker)",
+            (repo_outcome.json(exclude_none=True), repo_outcome.repo_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    @contextmanager
+    def _transaction(self):
+        """Run a write transaction, locking the queue file from other writers upfront"""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+
+def queue_run(
+    activity: ActivityLoaded,
+    repos: IndexedRepos,
+    cache: bool,
+    queue_path: Path,
+    activity_config: str,
+    workers: Workers | None = None,
+    repo_callbacks: list[RepoCallback] | None = None,
+    keep_repo_results: bool = True,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+) -> ActivityOutcome:
+    """Run the main activity via WORK QUEUE: enqueue repos, drain, gather outcomes
+
+    The coordinator drains the queue alongside any `mass-driver worker`, via
+    workers threads (default 1), waiting for all repos to be done. Outcomes are
+    gathered (passed to repo_callbacks) every poll_seconds, as repos get done by
+    any worker.
+    """
+    if workers == AUTO_WORKERS:
+        raise ValueError("Work queue run doesn't support adaptive workers")
+    logger = logging.getLogger(LOGGER_PREFIX)
+    work_queue = WorkQueue(queue_path)
+    try:
+        work_queue.enqueue(activity_config, repos)
+        logger.info(f"Enqueued {len(repos)} repos into work queue {queue_path}")
+        collector = RunCollector(activity, repos, repo_callbacks, keep_repo_results)
+        threads = start_drain_threads(
+            queue_path,
+            activity,
+            cache,
+            int(workers or 1),
+            lease_seconds,
+            poll_seconds,
+        )
+        gathered = 0
+        while True:
+            draining = any(thread.is_alive() for thread in threads)
+            for repo_outcome in work_queue.outcomes_since(gathered):
+                collector.add(repo_outcome)
+                gathered += 1
+            if not draining:
+                break
+            time.sleep(poll_seconds)
+    finally:
+        work_queue.close()
+    logger.info("Action completed: exiting")
+    return collector.outcome()
+
+
+def worker_activity_from_queue(work_queue: WorkQueue) -> ActivityLoaded:
+    """Load the queued run's activity, minus Source and Forge (coordinator's job)"""
+    activity_file = load_activity_toml(work_queue.activity_config())
+    return load_activity(activity_file.copy(update={"source": None, "forge": None}))
+
+
+def drain_queue_threads(
+    queue_path: Path,
+    activity: ActivityLoaded,
+    cache: bool,
+    thread_count: int,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+):
+    """Drain the work queue via thread_count threads, until all repos are done"""
+    threads = start_drain_threads(
+        queue_path, activity, cache, thread_count, lease_seconds, poll_seconds
+    )
+    for thread in threads:
+        thread.join()
+
+
+def start_drain_threads(
+    queue_path: Path,
+    activity: ActivityLoaded,
+    cache: bool,
+    thread_count: int,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+) -> list[threading.Thread]:
+    """Start thread_count threads draining the work queue, each until all are done"""
+    worker_prefix = f"{socket.gethostname()}-{threading.get_native_id()}"
+    threads = [
+        threading.Thread(
+            target=drain_queue,
+            args=(queue_path, activity, cache, f"{worker_prefix}-{thread_index}"),
+            kwargs={"lease_seconds": lease_seconds, "poll_seconds": poll_seconds},
+            name=f"queue-worker-{thread_index}",
+        )
+        for thread_index in range(thread_count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def drain_queue(
+    queue_path: Path,
+    activity: ActivityLoaded,
+    cache: bool,
+    worker: str,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+):
+    """Claim and process repos from the work queue, until all repos are done
+
+    When no repo is claimable but some are still leased by other workers, waits:
+    their lease may expire, making them claimable again. The lease of the repo at
+    hand is renewed while it's processed, see {py:func}`renewing_lease`.
+    """
+    logger = logging.getLogger(f"{LOGGER_PREFIX}.{worker}")
+    cache_folder = get_cache_folder(cache, logger=logger)
+    work_queue = WorkQueue(queue_path)
+    try:
+        while True:
+            repo = work_queue.claim(worker, lease_seconds)
+            if repo is None:
+                counts = work_queue.counts()
+                if not counts.get("pending") and not counts.get("leased"):
+                    break  # All done
+                time.sleep(poll_seconds)
+                continue
+            with renewing_lease(queue_path, worker, repo.repo_id, lease_seconds):
+                repo_outcome = process_queued_repo(repo, activity, cache_folder, logger)
+            if not work_queue.complete(worker, repo_outcome):
+                logger.warning(f"Lost lease of {repo.repo_id}: outcome discarded")
+                continue
+            counts = work_queue.counts()
+            logger.info(
+                f"[{counts.get('done', 0):04d}/{sum(counts.values()):04d}] "
+                f"Processed {repo.repo_id}"
+            )
+    finally:
+        work_queue.close()
+
+
+@contextmanager
+def renewing_lease(
+    queue_path: Path,
+    worker: str,
+    repo_id: RepoID,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+):
+    """Renew the lease of a repo every third of lease_seconds, in the background
+
+    So that repos taking longer than lease_seconds aren't claimed by other workers
+    while still processed: leases then only expire for dead workers.
+    """
+    stopped = threading.Event()
+
+    def heartbeat():
+        """Renew the lease until stopped, or lost"""
+        work_queue = WorkQueue(queue_path)
+        try:
+            while not stopped.wait(max(lease_seconds / 3, 0.1)):
+                if not work_queue.renew(worker, repo_id, lease_seconds):
+                    logger = logging.getLogger(f"{LOGGER_PREFIX}.{worker}")
+                    logger.warning(f"Lost lease of {repo_id}: can't renew it")
+                    break
+        finally:
+            work_queue.close()
+
+    thread = threading.Thread(target=heartbeat, name=f"lease-{worker}")
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def process_queued_repo(
+    repo: SourcedRepo,
+    activity: ActivityLoaded,
+    cache_folder: Path,
+    logger: logging.Logger,
+) -> RepoOutcome:
+    """Process a single repo claimed from the queue, into its outcome"""
+    repo_id = repo.repo_id
+    repo_logger = logging.getLogger(f"{logger.name}.repo.{repo_id.replace('.','_')}")
+    started_at = time.monotonic()
+    try:
+        cloned_repo, scan_result, patch_result, timings = per_repo_process(
+            repo_id, repo, activity, repo_logger, cache_folder
+        )
+    except Exception as e:
+        return clone_failed(repo_id, e, time.monotonic() - started_at)
+    return RepoOutcome(
+        repo_id=repo_id,
+        cloned_repo=cloned_repo,
+        scan_result=scan_result,
+        migration_result=patch_result,
+        elapsed_seconds=time.monotonic() - started_at,
+        timings=timings,
+    )
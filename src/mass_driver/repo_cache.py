@@ -0,0 +1,189 @@
+"""Keep the repo cache within a size budget, evicting least-recently-used repos
+
+Each cached repo (its mirror, along with its clones in every workspace) is evicted
+as a whole: workspace clones borrow the mirror's objects, and can't outlive it.
+Local repos cloned into cache have no mirror of ours: evicting them only removes
+their workspace clones, never the local repo. Repos with a workspace clone holding
+unpushed commits are kept, unless forced: those may be migrations not forged yet.
+Sizes and last use come from the cache's index (see
+{py:class}`mass_driver.cache_index.CacheIndex`), reconciled with the mirrors on disk.
+"""
+
+import logging
+import shutil
+import time
+from contextlib import closing
+from pathlib import Path
+
+from git import GitError
+
+from mass_driver.cache_index import CacheIndex, IndexedMirror
+from mass_driver.git import (
+    GitRepo,
+    folder_size,
+    index_fetch,
+    mirror_staging_path,
+    unpushed_branches,
+)
+
+SIZE_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+"""Multipliers of size suffixes, as binary units (K is KiB...)"""
+
+STALE_STAGING_SECONDS = 24 * 3600.0
+"""How old a half-cloned mirror gets before it's presumed abandoned (clone died)"""
+
+
+def parse_size(size: str) -> int:
+    """Parse a size in bytes, with optional binary suffix: '500M', '10G', '1.5T'"""
+    multiplier = SIZE_UNITS.get(size[-1:].upper())
+    if multiplier is None:
+        size_bytes = int(size)
+    else:
+        size_bytes = int(float(size[:-1]) * multiplier)
+    if size_bytes < 0:
+        raise ValueError(f"Size should be positive, got {size}")
+    return size_bytes
+
+
+def format_size(size_bytes: int) -> str:
+    """Format a size in bytes for humans, like '1.2G' or '340.0K'"""
+    for suffix, multiplier in reversed(SIZE_UNITS.items()):
+        if size_bytes >= multiplier:
+            return f"{size_bytes / multiplier:.1f}{suffix}"
+    return f"{size_bytes}B"
+
+
+def cached_repos(cache_folder: Path) -> list[IndexedMirror]:
+    """List the repos in cache, with their size and when they were last used"""
+    with closing(CacheIndex(cache_folder)) as index:
+        reconcile_index(index, cache_folder)
+        return index.mirrors()
+
+
+def reconcile_index(index: CacheIndex, cache_folder: Path):
+    """Match the cache index with the mirrors on disk, listing mirrors only
+
+    Mirrors gone from disk are forgotten, as are local repos without any workspace
+    clone left on disk. Mirrors not indexed (cached before the index existed) are
+    indexed, along with their workspace clones, measured on disk.
+    """
+    on_disk = {
+        f"{mirror.parent.name}/{mirror.name.removesuffix('.git')}": mirror
+        for mirror in (cache_folder / "mirrors").glob("*/*.git")
+        if not mirror.name.startswith(".")  # Mirror being cloned, not in cache yet
+    }
+    indexed = set()
+    for repo in index.mirrors():
+        if repo.local:
+            if not any(clone.path.is_dir() for clone in repo.workspace_clones):
+                index.remove(repo.cache_name)
+            continue
+        indexed.add(repo.cache_name)
+        if repo.cache_name not in on_disk:
+            index.remove(repo.cache_name)
+    workspaces_folder = cache_folder / "workspaces"
+    for cache_name in on_disk.keys() - indexed:
+        mirror = on_disk[cache_name]
+        clone_url = GitRepo(mirror).remotes.origin.url
+        index_fetch(cache_folder, clone_url, mirror.stat().st_mtime)
+        for clone in workspaces_folder.glob(f"*/{cache_name}"):
+            index.record_workspace_clone(
+                cache_name, clone.parent.parent.name, clone, folder_size(clone)
+            )
+
+
+def unpushed_clones(repo: IndexedMirror, logger: logging.Logger) -> list[Path]:
+    """List a repo's workspace clones with local branches not pushed to origin
+
+    Clones git can't read (say, half-deleted) hold nothing to keep.
+    """
+    unpushed = []
+    for clone in repo.workspace_clones:
+        if not clone.path.is_dir():
+            continue
+        try:
+            branches = unpushed_branches(GitRepo(clone.path))
+        except GitError as e:
+            logger.debug(f"Can't list branches of {clone.path}: {e}")
+            continue
+        if branches:
+            unpushed.append(clone.path)
+    return unpushed
+
+
+def evict(repo: IndexedMirror, index: CacheIndex):
+    """Remove a repo from cache (workspace clones, then mirror) and from its index
+
+    The mirror is moved out of the way first, so other runs never clone from a
+    half-deleted mirror: they mirror the repo again instead. Local repos only get
+    their workspace clones removed.
+    """
+    for clone in repo.workspace_clones:
+        shutil.rmtree(clone.path, ignore_errors=True)
+    index.remove(repo.cache_name)
+    if repo.local:
+        return
+    doomed = mirror_staging_path(repo.path)
+    try:
+        repo.path.rename(doomed)
+    except OSError:  # Evicted concurrently already
+        return
+    shutil.rmtree(doomed, ignore_errors=True)
+
+
+def remove_stale_staging(cache_folder: Path, logger: logging.Logger) -> int:
+    """Remove the half-cloned mirrors left behind by clones that died
+
+    Returns:
+      How many were removed
+    """
+    removed = 0
+    stale_before = time.time() - STALE_STAGING_SECONDS
+    for staging in (cache_folder / "mirrors").glob("*/.*.tmp"):
+        if staging.stat().st_mtime < stale_before:
+            logger.info(f"Removing abandoned half-cloned mirror {staging}")
+            shutil.rmtree(staging, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def collect_garbage(
+    cache_folder: Path, max_bytes: int, logger: logging.Logger, force: bool = False
+) -> list[IndexedMirror]:
+    """Evict least-recently-used repos until the cache fits within max_bytes
+
+    Repos with workspace clones holding unpushed commits are skipped, with a
+    warning, unless forced.
+
+    Returns:
+      The repos evicted, least-recently-used first
+    """
+    remove_stale_staging(cache_folder, logger)
+    with closing(CacheIndex(cache_folder)) as index:
+        reconcile_index(index, cache_folder)
+        repos = sorted(index.mirrors(), key=lambda repo: repo.last_used or 0)
+        total_bytes = sum(repo.total_bytes for repo in repos)
+        evicted = []
+        for repo in repos:
+            if total_bytes <= max_bytes:
+                break
+            unpushed = [] if force else unpushed_clones(repo, logger)
+            if unpushed:
+                logger.warning(
+                    f"Not evicting {repo.cache_name}: unpushed commits in "
+                    f"{', '.join(str(clone) for clone in unpushed)} "
+                    "(push them, or force eviction)"
+                )
+                continue
+            logger.info(
+                f"Evicting {repo.cache_name} ({format_size(repo.total_bytes)}), "
+                f"last used {time.ctime(repo.last_used or 0)}"
+            )
+            evict(repo, index)
+            total_bytes -= repo.total_bytes
+            evicted.append(repo)
+    logger.info(
+        f"Repo cache at {format_size(total_bytes)} (budget {format_size(max_bytes)}) "
+        f"after evicting {len(evicted)} repos"
+    )
+    return evicted
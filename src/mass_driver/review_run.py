@@ -1,25 +1,29 @@
 """Check the status of created PRs, in bulk"""
 import logging
 from collections import defaultdict
+from contextlib import nullcontext
 
 from mass_driver.models.forge import Forge
+from mass_driver.progress import ProgressReporter, showing_progress
 
 ERROR_STATUS = "error fetching status"
 
 
-def review(pr_list: list[str], forge: Forge):
-    """Review the status of many given PRs"""
+def review(pr_list: list[str], forge: Forge, show_progress: bool = False):
+    """Review the status of many given PRs, showing live progress if asked"""
     unique_prs = list(set(pr_list))
     pr_count = len(unique_prs)
     pr_status: dict[str, str] = {}  # Status of each PR from forge
-    for pr_index, pr_url in enumerate(unique_prs, start=1):
-        try:
-            logging.info(f"[{pr_index:03d}/{pr_count:03d}] Fetching PR status...")
-            pr_status[pr_url] = forge.get_pr_status(pr_url)
-        except Exception as e:
-            logging.error(f"Error when fetching PR status {pr_url}. Issue was: {e}")
-            pr_status[pr_url] = ERROR_STATUS
-            continue
+    progress = ProgressReporter("review", pr_count)
+    with showing_progress(progress) if show_progress else nullcontext():
+        for pr_index, pr_url in enumerate(unique_prs, start=1):
+            try:
+                logging.info(f"[{pr_index:03d}/{pr_count:03d}] Fetching PR status...")
+                pr_status[pr_url] = forge.get_pr_status(pr_url)
+            except Exception as e:
+                logging.error(f"Error when fetching PR status {pr_url}. Issue was: {e}")
+                pr_status[pr_url] = ERROR_STATUS
+            progress.tick(pr_status[pr_url])
     forge_statuses = forge.pr_statuses
     actual_statuses = set(pr_status.values())
     statuses_not_sorted = actual_statuses - set(forge_statuses) - set([ERROR_STATUS])
@@ -3,18 +3,24 @@
 from pathlib import Path
 from typing import Any
 
+from mass_driver.models.scan import RepoFiles, needs_paths, scans_tree
 
-def has_dir(repo: Path, target: str) -> bool:
+
+def has_dir(repo: RepoFiles, target: str) -> bool:
     """Check target directory exists under repo"""
     return (repo / Path(target)).is_dir()
 
 
-def has_file(repo: Path, target: str) -> bool:
+def has_file(repo: RepoFiles, target: str) -> bool:
     """Check file dir_to_check exists under repo"""
     return (repo / Path(target)).is_file()
 
 
-def rootlevel_files(repo: Path) -> dict[str, Any]:
+@needs_paths(
+    "/CHANGELOG.md", "/README.md", "/LICENSE", "/Makefile", "/.gitignore", "/Dockerfile"
+)
+@scans_tree
+def rootlevel_files(repo: RepoFiles) -> dict[str, Any]:
     """Detect some files at the root of the repo"""
     return {
         "changelog_md": has_file(repo, "CHANGELOG.md"),
@@ -26,7 +32,9 @@ def rootlevel_files(repo: Path) -> dict[str, Any]:
     }
 
 
-def dockerfile_from_scanner(repo: Path) -> dict[str, Any]:
+@needs_paths("/Dockerfile")
+@scans_tree
+def dockerfile_from_scanner(repo: RepoFiles) -> dict[str, Any]:
     """Report the repo's Dockerfile's FROM line(s)"""
     dockerfile_path = repo / "Dockerfile"
     dockerfile_exists = dockerfile_path.is_file()
@@ -0,0 +1,132 @@
+"""Order repos longest-job-first, so huge repos don't end up in a run's tail
+
+A parallel run lasts at least as long as its slowest repo. Started last, a huge
+monorepo keeps the run going single-threaded long after all other workers are idle.
+Starting the biggest repos first instead, the run's wall-clock time approaches the
+total work divided by the number of workers.
+
+A repo's expected cost is its duration in previous runs, as kept in a duration
+history file. Repos without history are estimated from their cached clone's size.
+"""
+
+import json
+import logging
+import os
+from contextlib import closing
+from pathlib import Path
+
+from mass_driver.cache_index import INDEX_FILE, CacheIndex
+from mass_driver.git import DEFAULT_CACHE, git_pack_size, repo_cache_name
+from mass_driver.models.activity import RepoOutcome
+from mass_driver.models.repository import IndexedRepos, RepoID
+
+DURATIONS_FILE = DEFAULT_CACHE.parent / "durations.json"
+"""The duration history file, stored next to cached repos"""
+
+DEFAULT_BYTES_PER_SECOND = 10_000_000.0
+"""How fast repos are processed, per byte of clone, absent any history to tell"""
+
+
+class DurationHistory:
+    """How long each repo took to process in previous runs, in seconds"""
+
+    def __init__(self, history_path: Path | None = None):
+        """Load the history from given file, if any and existing"""
+        self.history_path = history_path
+        self.durations: dict[RepoID, float] = self.load()
+        self.recorded: dict[RepoID, float] = {}
+
+    def load(self) -> dict[RepoID, float]:
+        """Read the history file, if any: unreadable (say, half-written) as empty"""
+        if self.history_path is None or not self.history_path.is_file():
+            return {}
+        try:
+            durations = json.loads(self.history_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        return durations if isinstance(durations, dict) else {}
+
+    def record(self, repo_outcome: RepoOutcome):
+        """Keep the duration of a repo processed OK. A repo callback"""
+        if repo_outcome.error is None and repo_outcome.elapsed_seconds is not None:
+            self.durations[repo_outcome.repo_id] = repo_outcome.elapsed_seconds
+            self.recorded[repo_outcome.repo_id] = repo_outcome.elapsed_seconds
+
+    def save(self):
+        """Save the history to its file, if any, unless its folder doesn't exist
+
+        Durations recorded here are merged into the file as it is now, in case
+        concurrent runs saved theirs meanwhile, then written atomically.
+        Runs over local repos only don't create a cache folder: nor history file.
+        """
+        if self.history_path is None or not self.history_path.parent.is_dir():
+            return
+        self.durations = self.load() | self.recorded
+        temp_path = self.history_path.with_name(
+            f".{self.history_path.name}.{os.getpid()}.tmp"
+        )
+        temp_path.write_text(json.dumps(self.durations, indent=2))
+        os.replace(temp_path, self.history_path)
+
+
+def longest_first(
+    repos: IndexedRepos,
+    history: DurationHistory,
+    cache_folder: Path,
+    logger: logging.Logger,
+) -> IndexedRepos:
+    """Order repos by expected cost, most expensive first
+
+    Repos with no known cost (never processed, not cached) go first, in their
+    Source order: for all we know, they may be the biggest.
+    """
+    clone_sizes = cached_clone_sizes(repos, cache_folder)
+    bytes_per_second = history_rate(history, clone_sizes)
+    costs: dict[RepoID, float] = {}
+    for repo_id in repos:
+        if repo_id in history.durations:
+            costs[repo_id] = history.durations[repo_id]
+        elif repo_id in clone_sizes:
+            costs[repo_id] = clone_sizes[repo_id] / bytes_per_second
+    unknown = [repo_id for repo_id in repos if repo_id not in costs]
+    by_cost = sorted(costs, key=lambda repo_id: costs[repo_id], reverse=True)
+    logger.info(
+        f"Ordering repos longest-first: {len(by_cost)} with known cost, "
+        f"{len(unknown)} unknown (first)"
+    )
+    return {repo_id: repos[repo_id] for repo_id in unknown + by_cost}
+
+
+def history_rate(history: DurationHistory, clone_sizes: dict[RepoID, int]) -> float:
+    """Estimate the bytes (of clone) processed per second, from history if any"""
+    total_bytes, total_seconds = 0, 0.0
+    for repo_id, clone_size in clone_sizes.items():
+        if repo_id not in history.durations:
+            continue
+        total_bytes += clone_size
+        total_seconds += history.durations[repo_id]
+    if total_bytes == 0 or total_seconds == 0:
+        return DEFAULT_BYTES_PER_SECOND
+    return total_bytes / total_seconds
+
+
+def cached_clone_sizes(repos: IndexedRepos, cache_folder: Path) -> dict[RepoID, int]:
+    """Get the size of repos' cached clones (their git packs), for those cloned
+
+    Remote repos' size is that of their mirror, as per the cache's index.
+    """
+    mirror_sizes: dict[str, int] = {}
+    if (cache_folder / INDEX_FILE).is_file():
+        with closing(CacheIndex(cache_folder)) as index:
+            mirror_sizes = {
+                mirror.cache_name: mirror.size_bytes for mirror in index.mirrors()
+            }
+    clone_sizes = {}
+    for repo_id, repo in repos.items():
+        if Path(repo.clone_url).is_dir():
+            clone_size = git_pack_size(Path(repo.clone_url))
+        else:
+            clone_size = mirror_sizes.get(str(repo_cache_name(repo.clone_url)))
+        if clone_size is not None:
+            clone_sizes[repo_id] = clone_size
+    return clone_sizes
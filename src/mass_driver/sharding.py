@@ -0,0 +1,64 @@
+"""Split a run across machines (shards), then merge the shards' outcomes back
+
+Repos are assigned to shards by hash of their repo_id: stable across machines and
+runs, no matter the order the Source lists repos in.
+"""
+
+import hashlib
+
+from mass_driver.models.activity import ActivityOutcome
+from mass_driver.models.repository import IndexedRepos, RepoID
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """Parse the value of the `--shard` flag: 'i/N', for shard i (from 1) of N"""
+    shard_index_str, shard_count_str = shard.split("/")
+    shard_index, shard_count = int(shard_index_str), int(shard_count_str)
+    if not 1 <= shard_index <= shard_count:
+        raise ValueError(f"Shard index should be in 1..{shard_count}, got {shard}")
+    return shard_index, shard_count
+
+
+def shard_of(repo_id: RepoID, shard_count: int) -> int:
+    """Get the shard (from 1) a repo belongs to, out of shard_count shards"""
+    repo_hash = hashlib.sha1(repo_id.encode()).digest()
+    return int.from_bytes(repo_hash[:8], "big") % shard_count + 1
+
+
+def select_shard(
+    repos: IndexedRepos, shard_index: int, shard_count: int
+) -> IndexedRepos:
+    """Keep only the repos belonging to given shard (from 1) of shard_count"""
+    return {
+        repo_id: repo
+        for repo_id, repo in repos.items()
+        if shard_of(repo_id, shard_count) == shard_index
+    }
+
+
+def merge_outcomes(outcomes: list[ActivityOutcome]) -> ActivityOutcome:
+    """Combine the outcomes of shards into one, as if from a single run
+
+    Concurrency logs are per-machine, and so aren't merged. Phase timings of a repo
+    in several shards (e.g. run, then forged on another machine) are combined.
+    """
+    merged = ActivityOutcome()
+    for outcome in outcomes:
+        merged.repos_sourced |= outcome.repos_sourced
+        merged.repos_cloned |= outcome.repos_cloned
+        merged.repos_clone_timed_out += outcome.repos_clone_timed_out
+        if outcome.scan_result is not None:
+            merged.scan_result = (merged.scan_result or {}) | outcome.scan_result
+        if outcome.migration_result is not None:
+            merged.migration_result = (
+                merged.migration_result or {}
+            ) | outcome.migration_result
+        if outcome.forge_result is not None:
+            merged.forge_result = (merged.forge_result or {}) | outcome.forge_result
+        for repo_id, timings in outcome.phase_timings.items():
+            merged.phase_timings.setdefault(repo_id, []).extend(timings)
+    # Repos timed out in a shard, yet cloned in another, got cloned after all
+    merged.repos_clone_timed_out = sorted(
+        set(merged.repos_clone_timed_out) - set(merged.repos_cloned)
+    )
+    return merged
@@ -1,13 +1,21 @@
 """Summarize the result of a run, even a previous one"""
+import math
+import time
 from collections import defaultdict
 from logging import Logger
 
+from mass_driver.cache_index import IndexedMirror
 from mass_driver.models.activity import (
+    ActivityOutcome,
+    ConcurrencySample,
     IndexedPatchResult,
+    IndexedPhaseTimings,
     IndexedPRResult,
 )
 from mass_driver.models.forge import PROutcome
 from mass_driver.models.repository import IndexedRepos
+from mass_driver.profiling import PluginProfiler
+from mass_driver.repo_cache import format_size
 
 
 def group_by_outcome(result):
@@ -24,6 +32,20 @@ def summarize_source(result: IndexedRepos, logger: Logger):
     logger.info(f"Source results: discovered {len(result.keys())} repos")
 
 
+def summarize_clone(result: ActivityOutcome, logger: Logger):
+    """Summarize cloning: repos cloned, timed out, or failed to clone otherwise"""
+    sourced = len(result.repos_sourced)
+    cloned = len(result.repos_cloned)
+    timed_out = len(result.repos_clone_timed_out)
+    failed = max(sourced - cloned - timed_out, 0)
+    logger.info(
+        f"Clone results: cloned {cloned} of {sourced} repos, "
+        f"{timed_out} timed out, {failed} failed"
+    )
+    for repo_id in result.repos_clone_timed_out:
+        logger.info(f"- TIMED_OUT: {repo_id}")
+
+
 def summarize_migration(
     result: IndexedPatchResult, logger: Logger, details: bool = True
 ):
@@ -47,6 +69,83 @@ def summarize_forge(result: IndexedPRResult, logger: Logger, details: bool = Tru
         print_forge(repos_by_outcome, logger)
 
 
+def summarize_concurrency(history: list[ConcurrencySample], logger: Logger):
+    """Summarize how the number of workers changed over the run"""
+    if not history:
+        return
+    worker_counts = [sample.workers for sample in history]
+    logger.info(
+        f"Concurrency: {len(history) - 1} changes, between {min(worker_counts)} "
+        f"and {max(worker_counts)} workers, ending at {worker_counts[-1]}"
+    )
+    for sample in history:
+        logger.info(
+            f"- {sample.elapsed_seconds:07.1f}s: {sample.workers:02} workers "
+            f"({sample.reason})"
+        )
+
+
+def summarize_timings(phase_timings: IndexedPhaseTimings, logger: Logger):
+    """Summarize how long each phase took across repos: p50/p95/max wall-clock"""
+    timings_by_phase = defaultdict(list)
+    for repo_timings in phase_timings.values():
+        for timing in repo_timings:
+            timings_by_phase[timing.phase].append(timing)
+    if not timings_by_phase:
+        return
+    logger.info("Phase timings (wall-clock seconds, per repo):")
+    for phase, timings in timings_by_phase.items():
+        wall = sorted(timing.wall_seconds for timing in timings)
+        cpu = sum(timing.cpu_seconds or 0.0 for timing in timings)
+        fetched = sum(timing.bytes_fetched or 0 for timing in timings)
+        logger.info(
+            f"- {phase}: {len(wall)} times, p50 {percentile(wall, 50):.2f}s, "
+            f"p95 {percentile(wall, 95):.2f}s, max {wall[-1]:.2f}s, "
+            f"total CPU {cpu:.2f}s, {fetched} bytes fetched"
+        )
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """Get the given percentile of (sorted, non-empty) values, by nearest rank"""
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def summarize_profile(profiler: PluginProfiler, top: int, logger: Logger):
+    """Summarize the profile of plugins: the top hottest functions of each"""
+    for plugin in sorted(profiler.stats):
+        logger.info(f"Profile of {plugin}: top {top} functions by self time")
+        logger.info(f"{'calls':>9} {'self(s)':>9} {'cumul(s)':>9}  function")
+        for hot in profiler.top_functions(plugin, top):
+            logger.info(
+                f"{hot.calls:9d} {hot.self_seconds:9.3f} "
+                f"{hot.cumulative_seconds:9.3f}  {hot.function}"
+            )
+
+
+def summarize_cache(repos: list[IndexedMirror], logger: Logger, top: int = 10):
+    """Summarize the repo cache: its size, and the top biggest repos in it"""
+    total_bytes = sum(repo.total_bytes for repo in repos)
+    clone_count = sum(len(repo.workspace_clones) for repo in repos)
+    logger.info(
+        f"Repo cache: {len(repos)} repos ({clone_count} workspace clones), "
+        f"{format_size(total_bytes)} total"
+    )
+    if not repos:
+        return
+    logger.info(f"Top {top} biggest repos:")
+    for repo in sorted(repos, key=lambda repo: repo.total_bytes, reverse=True)[:top]:
+        logger.info(
+            f"{format_size(repo.total_bytes):>9}  {repo.cache_name} "
+            f"(last used {time.ctime(repo.last_used or 0)})"
+        )
+    least_recent = min(repos, key=lambda repo: repo.last_used or 0)
+    logger.info(
+        f"Least recently used: {least_recent.cache_name}, "
+        f"on {time.ctime(least_recent.last_used or 0)}"
+    )
+
+
 def print_prs(result: IndexedPRResult, logger: Logger):
     """Print the list of PRs created"""
     success_prs = []
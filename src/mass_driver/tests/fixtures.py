@@ -26,10 +26,15 @@ def copy_folder(repo_data, tmp_path):
 
 
 def massdrive_runlocal(
-    repo_url: str | None, activity_configfilepath: Path
+    repo_url: str | None,
+    activity_configfilepath: Path,
+    extra_args: list[str] | None = None,
 ) -> ActivityOutcome:
     """Run 'mass-driver run' with a local repo and activity config
 
+    Any extra_args are appended to the 'mass-driver run' arguments, like
+    `["--executor", "process"]`.
+
     Returns:
         ActivityOutcome of the execution
     """
@@ -40,6 +45,8 @@ def massdrive_runlocal(
     ]
     if repo_url is not None:
         massdrive_args.extend(["--repo-path", repo_url])
+    if extra_args is not None:
+        massdrive_args.extend(extra_args)
     return massdriver_cli(massdrive_args)
 
 
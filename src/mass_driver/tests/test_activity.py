@@ -4,12 +4,17 @@ Feature: Unified 'Activities' for separable migration-then-forge
 
 """
 
+import json
+import logging
+import pstats
 from pathlib import Path
 
 import pytest
 
+from mass_driver.cli import cli as massdriver_cli
 from mass_driver.forge_run import PROutcome
 from mass_driver.forges.dummy import DUMMY_PR_URL
+from mass_driver.journal import outcome_from_journal
 from mass_driver.models.patchdriver import PatchOutcome
 from mass_driver.tests.fixtures import (
     copy_folder,
@@ -80,3 +85,276 @@ def test_scan(tmp_path, shared_datadir):
     assert scan_result["root-files"][
         "readme_md"
     ], "Should have discovered README.md in sample repo"
+
+
+@pytest.mark.parametrize(
+    "executor,workers",
+    [
+        ("thread", "2"),
+        ("thread", "auto"),
+        ("process", "auto"),
+        ("pipeline", "2"),
+        ("async", "2"),
+    ],
+)
+def test_scan_and_migrate_executors(executor, workers, tmp_path, shared_datadir):
+    """Scenario: Parallel executors give same outcome as sequential
+
+    As a mass-driver user
+    I need to process many repos at once, across threads or processes
+    To speed up processing of large fleets of repos
+    """
+    repo_path = Path(tmp_path / "test_repo/")
+    copy_folder(Path(shared_datadir / "sample_repo"), repo_path)
+    repoize(repo_path)
+    activityconfig_filepath = shared_datadir / "activity.toml"
+    # When I run mass-driver with given executor
+    result = massdrive_runlocal(
+        str(repo_path),
+        activityconfig_filepath,
+        ["--executor", executor, "--workers", workers],
+    )
+    if result.migration_result is None or result.scan_result is None:
+        return pytest.fail("Should have a migration and scan result")
+    repo_id = str(repo_path)
+    # Then the migration is OK
+    assert (
+        result.migration_result[repo_id].outcome == PatchOutcome.PATCHED_OK
+    ), "Wrong outcome from patching"
+    # And scan results came back from the worker
+    assert result.scan_result[repo_id]["root-files"][
+        "readme_md"
+    ], "Should have discovered README.md in sample repo"
+    # And each phase of processing the repo was timed
+    phases = {timing.phase for timing in result.phase_timings[repo_id]}
+    assert {"clone", "scan", "migrate"} <= phases, "Should time each phase"
+
+
+def test_resume_from_journal(tmp_path, shared_datadir):
+    """Scenario: Resume a crashed run from its journal
+
+    As a mass-driver user
+    I need to resume a crashed run without redoing finished repos
+    To avoid losing hours of work on large fleets of repos
+    """
+    repo_path = Path(tmp_path / "test_repo/")
+    copy_folder(Path(shared_datadir / "sample_repo"), repo_path)
+    repoize(repo_path)
+    activityconfig_filepath = shared_datadir / "activity.toml"
+    journal_path = tmp_path / "journal.jsonl"
+    repo_id = str(repo_path)
+    # Given a run that journaled its repo's outcome
+    massdrive_runlocal(
+        repo_id, activityconfig_filepath, ["--journal", str(journal_path)]
+    )
+    assert len(journal_path.read_text().splitlines()) == 1, "Should journal 1 repo"
+    # And the journal was cut short by a crash mid-write
+    with open(journal_path, "a") as journal_file:
+        journal_file.write('{"repo_id": "half-writt')
+    # When I resume the run from the journal
+    result = massdrive_runlocal(
+        repo_id, activityconfig_filepath, ["--resume", str(journal_path)]
+    )
+    if result.migration_result is None:
+        return pytest.fail("Should have a migration result")
+    # Then the repo wasn't patched again, keeping the journaled outcome
+    assert (
+        result.migration_result[repo_id].outcome == PatchOutcome.PATCHED_OK
+    ), "Should reuse the journaled outcome, not re-patch (ALREADY_PATCHED)"
+    assert repo_id in result.repos_cloned, "Should have journaled clone"
+
+
+def test_profile_plugins(tmp_path, shared_datadir):
+    """Scenario: Profile the PatchDriver and Scanners over a run
+
+    As a mass-driver plugin author
+    I need my plugin profiled across all repos of a run
+    To optimize it against real fleet data
+    """
+    repo_path = Path(tmp_path / "test_repo/")
+    copy_folder(Path(shared_datadir / "sample_repo"), repo_path)
+    repoize(repo_path)
+    activityconfig_filepath = shared_datadir / "activity.toml"
+    profile_path = tmp_path / "plugins.prof"
+    # When I run mass-driver with profiling
+    massdrive_runlocal(
+        str(repo_path), activityconfig_filepath, ["--profile", str(profile_path)]
+    )
+    # Then the combined profile covers both the PatchDriver and the Scanners
+    stats_profile = pstats.Stats(str(profile_path)).get_stats_profile()
+    assert "run" in stats_profile.func_profiles, "Should profile PatchDriver"
+    assert (
+        "rootlevel_files" in stats_profile.func_profiles
+    ), "Should profile the Scanner"
+
+
+def test_trace_file(tmp_path, shared_datadir):
+    """Scenario: Save a trace of the run's phases, for timeline analysis
+
+    As a mass-driver user
+    I need a timeline of each repo's phases, on the worker that ran them
+    To spot idle workers and stragglers of a run
+    """
+    repo_path = Path(tmp_path / "test_repo/")
+    copy_folder(Path(shared_datadir / "sample_repo"), repo_path)
+    repoize(repo_path)
+    activityconfig_filepath = shared_datadir / "activity.toml"
+    trace_path = tmp_path / "trace.json"
+    # When I run mass-driver, saving a trace
+    massdrive_runlocal(
+        str(repo_path),
+        activityconfig_filepath,
+        ["--executor", "thread", "--trace-file", str(trace_path)],
+    )
+    # Then the trace has spans for the repo, each phase, and each scanner
+    span_names = {
+        event["name"] for event in json.loads(trace_path.read_text())["traceEvents"]
+    }
+    assert {
+        str(repo_path),
+        "clone",
+        "scanner.root-files",
+        "migrate",
+        "commit",
+        "forge",
+    } <= span_names, "Should trace repo, phases, and scanners"
+
+
+def test_metrics_file(tmp_path, shared_datadir):
+    """Scenario: Keep live metrics of the run in a Prometheus textfile
+
+    As a mass-driver user running unattended
+    I need the run's throughput scrapable by Prometheus
+    To alert on stalled runs
+    """
+    repo_path = Path(tmp_path / "test_repo/")
+    copy_folder(Path(shared_datadir / "sample_repo"), repo_path)
+    repoize(repo_path)
+    activityconfig_filepath = shared_datadir / "activity.toml"
+    metrics_path = tmp_path / "mass_driver.prom"
+    # When I run mass-driver, keeping metrics
+    massdrive_runlocal(
+        str(repo_path), activityconfig_filepath, ["--metrics-file", str(metrics_path)]
+    )
+    # Then the metrics count the patched and forged repo
+    metrics = metrics_path.read_text().splitlines()
+    assert (
+        'mass_driver_repos_total{stage="migration",outcome="PATCHED_OK"} 1' in metrics
+    ), "Should count patched repo"
+    assert (
+        'mass_driver_repos_total{stage="forge",outcome="PR_CREATED"} 1' in metrics
+    ), "Should count forged repo"
+    assert "mass_driver_forge_api_calls_total 1" in metrics, "Should count PR calls"
+
+
+def test_progress(tmp_path, shared_datadir, capsys):
+    """Scenario: Show live progress of the run, then the Forge
+
+    As a mass-driver user
+    I need to see how far along a long run is
+    To plan around it
+    """
+    repo_path = Path(tmp_path / "test_repo/")
+    copy_folder(Path(shared_datadir / "sample_repo"), repo_path)
+    repoize(repo_path)
+    activityconfig_filepath = shared_datadir / "activity.toml"
+    # When I run mass-driver, showing progress
+    massdrive_runlocal(str(repo_path), activityconfig_filepath, ["--progress"])
+    # Then progress of both the run and the Forge was shown
+    progress = capsys.readouterr().err
+    assert "run: 1/1 (100.0%)" in progress, "Should show run progress"
+    assert "forge: 1/1 (100.0%)" in progress, "Should show Forge progress"
+
+
+def test_jsonl_outfile_streams_outcome(tmp_path, shared_datadir):
+    """Scenario: Stream the outcome to JSON lines file, per repo
+
+    As a mass-driver user
+    I need the outcome streamed to disk as each repo completes
+    To keep memory use flat over fleet-wide runs
+    """
+    repo_path = Path(tmp_path / "test_repo/")
+    copy_folder(Path(shared_datadir / "sample_repo"), repo_path)
+    repoize(repo_path)
+    activityconfig_filepath = shared_datadir / "activity.toml"
+    jsonl_path = tmp_path / "outcome.jsonl"
+    repo_id = str(repo_path)
+    # When I run mass-driver, streaming outcome to JSONL
+    result = massdrive_runlocal(
+        repo_id, activityconfig_filepath, ["--jsonl-outfile", str(jsonl_path)]
+    )
+    # Then the scan results weren't kept in memory
+    assert result.scan_result is None, "Should drop streamed scan results"
+    # And the whole outcome can be rebuilt from the JSONL file
+    streamed = outcome_from_journal(jsonl_path, logging.getLogger("test"))
+    assert streamed.repos_sourced == result.repos_sourced, "Should stream Source"
+    assert streamed.repos_cloned == result.repos_cloned, "Should stream clones"
+    assert streamed.migration_result == result.migration_result, "Should stream patch"
+    assert streamed.forge_result == result.forge_result, "Should stream Forge"
+    if streamed.scan_result is None:
+        return pytest.fail("Should have streamed scan results")
+    assert "root-files" in streamed.scan_result[repo_id], "Should stream scans"
+
+
+def test_sharded_run_then_merge(tmp_path, shared_datadir):
+    """Scenario: Split a run in shards, then merge their outcomes
+
+    As a mass-driver user
+    I need to split a run across machines, then combine their outcomes
+    To process large fleets of repos beyond a single machine's capacity
+    """
+    repo_path = Path(tmp_path / "test_repo/")
+    copy_folder(Path(shared_datadir / "sample_repo"), repo_path)
+    repoize(repo_path)
+    activityconfig_filepath = shared_datadir / "activity.toml"
+    repo_id = str(repo_path)
+    # Given a run of all the shards, each saving their outcome
+    shard_files = [tmp_path / "shard1.json", tmp_path / "shard2.jsonl"]
+    massdrive_runlocal(
+        repo_id,
+        activityconfig_filepath,
+        ["--shard", "1/2", "--json-outfile", str(shard_files[0])],
+    )
+    massdrive_runlocal(
+        repo_id,
+        activityconfig_filepath,
+        ["--shard", "2/2", "--jsonl-outfile", str(shard_files[1])],
+    )
+    # When I merge the outcomes of the shards
+    merged = massdriver_cli(["merge-outcomes", *map(str, shard_files)])
+    # Then the repo was processed by exactly one shard
+    assert list(merged.repos_sourced) == [repo_id], "Should merge shard's repo"
+    if merged.migration_result is None:
+        return pytest.fail("Should have a migration result")
+    assert (
+        merged.migration_result[repo_id].outcome == PatchOutcome.PATCHED_OK
+    ), "Should merge the shard's patch result"
+
+
+def test_queue_run(tmp_path, shared_datadir):
+    """Scenario: Run activity via a work queue
+
+    As a mass-driver user
+    I need many workers to drain the repos of a single run
+    To avoid idle workers while others are stuck on huge repos
+    """
+    repo_path = Path(tmp_path / "test_repo/")
+    copy_folder(Path(shared_datadir / "sample_repo"), repo_path)
+    repoize(repo_path)
+    activityconfig_filepath = shared_datadir / "activity.toml"
+    queue_path = tmp_path / "queue.db"
+    repo_id = str(repo_path)
+    # When I run mass-driver via a work queue
+    result = massdrive_runlocal(
+        repo_id,
+        activityconfig_filepath,
+        ["--queue", str(queue_path), "--workers", "2"],
+    )
+    if result.migration_result is None:
+        return pytest.fail("Should have a migration result")
+    # Then the repo was processed by the queue's workers
+    assert (
+        result.migration_result[repo_id].outcome == PatchOutcome.PATCHED_OK
+    ), "Should gather the outcome posted to the queue"
+    # And a worker joining late finds nothing left to do
+    assert massdriver_cli(["worker", str(queue_path)]), "Should drain empty queue"
@@ -0,0 +1,69 @@
+"""Per-phase timeouts of processing a repo, freeing workers from hung repos
+
+Python threads can't be killed: a phase running past its timeout is abandoned in
+its (daemon) thread instead, while the worker moves on to the next repo.
+Subprocesses are killed by the phases themselves, passing the same timeout to
+git (see `kill_after_timeout`) or to their subprocess calls, see
+{py:attr}`mass_driver.models.patchdriver.PatchDriver.timeout`.
+"""
+
+import contextvars
+import threading
+import time
+from typing import Callable, TypeVar
+
+from mass_driver.timing import add_offloaded_cpu
+
+T = TypeVar("T")
+
+
+class PhaseTimeoutError(TimeoutError):
+    """A phase of processing a repo ran past its timeout"""
+
+    def __init__(self, phase: str, timeout: float):
+        """Describe which phase timed out, after how long"""
+        super().__init__(f"Timed out during {phase} phase, after {timeout}s")
+        self.phase = phase
+        self.timeout = timeout
+
+    def __reduce__(self):
+        """Pickle with phase and timeout, say to return from worker processes"""
+        return (PhaseTimeoutError, (self.phase, self.timeout))
+
+
+def call_with_timeout(
+    phase: str, timeout: float | None, func: Callable[..., T], *args, **kwargs
+) -> T:
+    """Call func with given arguments, giving up on it after timeout seconds
+
+    Without timeout, func is simply called. Otherwise, func runs in a daemon
+    thread (in a copy of the current context), which is abandoned if it doesn't
+    return in time. Its CPU time counts towards the current timed phase, if any.
+
+    Raises:
+      PhaseTimeoutError: When func ran past the timeout
+    """
+    if timeout is None:
+        return func(*args, **kwargs)
+    outcome: dict = {}
+
+    def call():
+        cpu_start = time.thread_time()
+        try:
+            outcome["result"] = func(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            add_offloaded_cpu(time.thread_time() - cpu_start)
+
+    context = contextvars.copy_context()
+    thread = threading.Thread(
+        target=context.run, args=(call,), name=f"{phase}-timeout", daemon=True
+    )
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise PhaseTimeoutError(phase, timeout)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
@@ -0,0 +1,110 @@
+"""Per-phase timing of processing repos: wall-clock time, CPU time, bytes fetched
+
+Engines set up a list to record a repo's timings into, via
+{py:func}`recording_timings`. The code of each phase (clone, pull, scan...) then
+times itself via {py:func}`timed_phase`, without knowing about engines or repos.
+Recording follows the context: for phases offloaded to other threads, run them in
+a copy of the current context (see {py:func}`contextvars.copy_context`).
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator
+
+from mass_driver.models.activity import PhaseTiming
+
+
+@dataclass
+class PhaseMeasure:
+    """The measures of a running phase, that the phase can add to"""
+
+    bytes_fetched: int | None = None
+    """How many bytes the phase fetched over network, if known"""
+    cache_hit: bool | None = None
+    """Whether the phase was served from the clone cache, if relevant"""
+    offloaded_cpu_seconds: float = 0.0
+    """CPU time spent by other threads, working on behalf of this phase"""
+
+
+_TIMINGS: ContextVar[list[PhaseTiming] | None] = ContextVar(
+    "phase_timings", default=None
+)
+"""Where to record phase timings, for the repo being processed (if any)"""
+
+_PHASE: ContextVar[PhaseMeasure | None] = ContextVar("phase_measure", default=None)
+"""The phase running now, if any"""
+
+_IN_PROGRESS: Counter[str] = Counter()
+"""How many of each phase are running now, in this process"""
+
+_IN_PROGRESS_LOCK = threading.Lock()
+
+
+@contextmanager
+def recording_timings(timings: list[PhaseTiming]) -> Iterator[list[PhaseTiming]]:
+    """Record the timings of the phases run within this context into given list"""
+    token = _TIMINGS.set(timings)
+    try:
+        yield timings
+    finally:
+        _TIMINGS.reset(token)
+
+
+@contextmanager
+def timed_phase(phase: str, measure_cpu: bool = True) -> Iterator[PhaseMeasure]:
+    """Time the phase run within this context, if recording timings
+
+    CPU time is the time of the current thread, plus any offloaded to other threads
+    (see {py:func}`add_offloaded_cpu`). Subprocesses' CPU time isn't counted.
+    Phases may nest: offloaded CPU time counts towards the enclosing phase too.
+    Without measure_cpu (asyncio code, sharing the thread), CPU time isn't recorded.
+    """
+    measure = PhaseMeasure()
+    timings = _TIMINGS.get()
+    if timings is None:
+        yield measure
+        return
+    token = _PHASE.set(measure)
+    with _IN_PROGRESS_LOCK:
+        _IN_PROGRESS[phase] += 1
+    started_at = time.time()
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield measure
+    finally:
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.thread_time() - cpu_start + measure.offloaded_cpu_seconds
+        _PHASE.reset(token)
+        add_offloaded_cpu(measure.offloaded_cpu_seconds)
+        with _IN_PROGRESS_LOCK:
+            _IN_PROGRESS[phase] -= 1
+        timings.append(
+            PhaseTiming(
+                phase=phase,
+                started_at=started_at,
+                wall_seconds=wall_seconds,
+                cpu_seconds=cpu_seconds if measure_cpu else None,
+                bytes_fetched=measure.bytes_fetched,
+                cache_hit=measure.cache_hit,
+                pid=os.getpid(),
+                thread_id=threading.get_native_id(),
+            )
+        )
+
+
+def phases_in_progress() -> dict[str, int]:
+    """Count the phases being timed right now in this process, by phase"""
+    with _IN_PROGRESS_LOCK:
+        return dict(_IN_PROGRESS)
+
+
+def add_offloaded_cpu(cpu_seconds: float):
+    """Count CPU time spent in another thread towards the phase running, if any"""
+    measure = _PHASE.get()
+    if measure is not None:
+        measure.offloaded_cpu_seconds += cpu_seconds
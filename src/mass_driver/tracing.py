@@ -0,0 +1,69 @@
+"""Export a run's phase timings as a trace, for timeline analysis
+
+The trace is in Chrome's Trace Event format (JSON), which trace viewers like
+Perfetto (ui.perfetto.dev) or `chrome://tracing` load. Each phase of each repo is a
+span on the thread (and process) that ran it, showing worker idle gaps and
+stragglers. Each repo also gets a span of its own, from its first phase to its last
+before forging, on a track of its own.
+"""
+
+import json
+from pathlib import Path
+
+from mass_driver.models.activity import IndexedPhaseTimings
+
+FORGE_PHASES = {"push", "forge"}
+"""The phases of the Forge, run after the main activity is over"""
+
+
+def trace_events(phase_timings: IndexedPhaseTimings) -> list[dict]:
+    """Convert phase timings to trace events, as microseconds from the run's start"""
+    all_timings = [timing for timings in phase_timings.values() for timing in timings]
+    if not all_timings:
+        return []
+    run_start = min(timing.started_at for timing in all_timings)
+
+    def micros(timestamp: float) -> float:
+        return round((timestamp - run_start) * 1_000_000, 1)
+
+    events = []
+    for repo_id, timings in phase_timings.items():
+        for timing in timings:
+            events.append(
+                {
+                    "name": timing.phase,
+                    "cat": "phase",
+                    "ph": "X",
+                    "ts": micros(timing.started_at),
+                    "dur": round(timing.wall_seconds * 1_000_000, 1),
+                    "pid": timing.pid,
+                    "tid": timing.thread_id,
+                    "args": {
+                        "repo_id": repo_id,
+                        "cpu_seconds": timing.cpu_seconds,
+                        "bytes_fetched": timing.bytes_fetched,
+                    },
+                }
+            )
+        run_timings = [timing for timing in timings if timing.phase not in FORGE_PHASES]
+        if not run_timings:
+            continue
+        repo_start = min(timing.started_at for timing in run_timings)
+        repo_end = max(
+            timing.started_at + timing.wall_seconds for timing in run_timings
+        )
+        repo_span = {
+            "name": repo_id,
+            "cat": "repo",
+            "id": repo_id,
+            "pid": run_timings[0].pid,
+        }
+        events.append(repo_span | {"ph": "b", "ts": micros(repo_start)})
+        events.append(repo_span | {"ph": "e", "ts": micros(repo_end)})
+    return events
+
+
+def write_trace(phase_timings: IndexedPhaseTimings, trace_path: Path):
+    """Write the trace of given phase timings to file, as Chrome trace JSON"""
+    trace = {"traceEvents": trace_events(phase_timings), "displayTimeUnit": "ms"}
+    trace_path.write_text(json.dumps(trace))
@@ -0,0 +1,88 @@
+"""Check the index of the repo cache, kept up to date by cloning
+
+Feature: SQLite index of cached repos
+  As a mass-driver user with thousands of repos cached
+  I need what's cached (size, HEAD, freshness, last use) queryable from one file
+  In order to schedule, evict, and refresh without opening every git directory
+"""
+
+import logging
+import shutil
+
+from git import Repo
+
+from mass_driver.cache_index import INDEX_FILE, CacheIndex
+from mass_driver.git import clone_if_remote, mirror_path
+from mass_driver.repo_cache import cached_repos
+
+LOGGER = logging.getLogger()
+
+
+def make_upstream(tmp_path) -> tuple[Repo, str]:
+    """Create an 'upstream' repo with a commit, giving it and its (file://) URL"""
+    upstream = Repo.init(tmp_path / "org" / "upstream", initial_branch="main")
+    (tmp_path / "org" / "upstream" / "README.md").write_text("Hello\n")
+    upstream.index.add("README.md")
+    upstream.index.commit("Initial commit")
+    return upstream, f"file://{tmp_path / 'org' / 'upstream'}"
+
+
+def test_clone_records_mirror_in_index(tmp_path):
+    """Scenario: Cloning a remote repo records its mirror and workspace clone"""
+    # Given a remote repo, not cached yet
+    upstream, repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    # When I clone it into a workspace
+    clone_if_remote(repo_url, cache_folder, LOGGER, workspace="ws")
+    # Then its mirror is indexed, with HEAD, default branch and size
+    mirror = CacheIndex(cache_folder).mirror("org/upstream")
+    assert mirror is not None, "Should index the mirror"
+    assert mirror.clone_url == repo_url, "Should record the clone URL"
+    assert mirror.head_sha == upstream.head.commit.hexsha, "Should record HEAD"
+    assert mirror.default_branch == "main", "Should record default branch"
+    assert mirror.size_bytes > 0, "Should record mirror size"
+    assert mirror.last_fetched and mirror.last_used, "Should record fetch and use"
+    # And its workspace clone, with its size
+    assert [clone.workspace for clone in mirror.workspace_clones] == ["ws"], "Clone"
+    assert mirror.workspace_clones[0].size_bytes > 0, "Should record clone size"
+
+
+def test_index_tells_repos_changed_since(tmp_path):
+    """Scenario: The index tells which repos' HEAD moved since a given time"""
+    # Given a remote repo, cloned a while ago
+    upstream, repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    clone_if_remote(repo_url, cache_folder, LOGGER, workspace="a")
+    index = CacheIndex(cache_folder)
+    first_seen = index.mirror("org/upstream")
+    assert first_seen is not None and first_seen.last_fetched, "Should index"
+    # When I clone it again, with no change upstream
+    clone_if_remote(repo_url, cache_folder, LOGGER, workspace="b")
+    # Then it's not changed since the first clone
+    assert not index.changed_since(first_seen.last_fetched), "Should be unchanged"
+    # When the remote moves, and I clone it again
+    new_commit = upstream.index.commit("Second commit")
+    clone_if_remote(repo_url, cache_folder, LOGGER, workspace="c")
+    # Then it's changed since the first clone, at the new HEAD
+    changed = index.changed_since(first_seen.last_fetched)
+    assert [mirror.cache_name for mirror in changed] == ["org/upstream"], "Changed"
+    assert changed[0].head_sha == new_commit.hexsha, "Should record new HEAD"
+
+
+def test_index_reconciled_with_disk(tmp_path):
+    """Scenario: Mirrors cached before the index existed get indexed on listing"""
+    # Given a cached remote repo, whose index got lost
+    _upstream, repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    clone_if_remote(repo_url, cache_folder, LOGGER, workspace="ws")
+    (cache_folder / INDEX_FILE).unlink()
+    # When I list the cached repos
+    repos = cached_repos(cache_folder)
+    # Then the mirror is indexed again, along with its workspace clone
+    assert [repo.cache_name for repo in repos] == ["org/upstream"], "Should reindex"
+    assert repos[0].clone_url == repo_url, "Should find the clone URL"
+    assert len(repos[0].workspace_clones) == 1, "Should reindex workspace clone"
+    # When its mirror gets deleted from disk
+    shutil.rmtree(mirror_path(repo_url, cache_folder))
+    # Then listing forgets it
+    assert not cached_repos(cache_folder), "Should forget deleted mirror"
@@ -0,0 +1,143 @@
+"""Check commits stage just the files drivers changed, when drivers report them
+
+Feature: Commit only the files a PatchDriver changed
+  As a mass-driver user patching large monorepos
+  I need commits to stage just the files the driver wrote or deleted
+  In order to avoid scanning the whole repo for changes on every commit
+"""
+
+import logging
+from pathlib import Path
+
+import pytest
+from git import Repo
+
+from mass_driver.drivers.bricks import GlobFileEditor
+from mass_driver.drivers.deleter import FileDeleter
+from mass_driver.drivers.stamper import Stamper
+from mass_driver.models.migration import MigrationLoaded
+from mass_driver.models.patchdriver import PatchDriver, PatchOutcome, PatchResult
+from mass_driver.models.repository import ClonedRepo
+from mass_driver.process_repo import migrate_repo
+
+LOGGER = logging.getLogger()
+
+
+class UnreportedWriter(PatchDriver):
+    """A driver writing a file without recording it, like opaque drivers do"""
+
+    def run(self, repo: ClonedRepo) -> PatchResult:
+        """Write a file, unrecorded"""
+        (repo.cloned_path / "written.txt").write_text("Written\n")
+        return PatchResult(outcome=PatchOutcome.PATCHED_OK)
+
+
+class ChangelogUpdater(GlobFileEditor):
+    """An editor of text files, also noting its edits in a changelog, unrecorded"""
+
+    def before_run(self, targets):
+        """Note the edits to come in a changelog, bypassing change recording"""
+        (targets[0].parent / "CHANGELOG.md").write_text("Edited text files\n")
+
+    def process_file(self, filename, file_contents: str) -> str | PatchResult:
+        """Shout the file's contents"""
+        return file_contents.upper()
+
+
+@pytest.fixture
+def clone(tmp_path, monkeypatch) -> Repo:
+    """Clone an 'upstream' repo that has a couple files"""
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "Tester")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "tester@example.com")
+    upstream = Repo.init(tmp_path / "upstream", initial_branch="main")
+    for filename in ["README.md", "old.txt"]:
+        (tmp_path / "upstream" / filename).write_text(f"Hello {filename}\n")
+    upstream.index.add(["README.md", "old.txt"])
+    upstream.index.commit("Initial commit")
+    return Repo.clone_from(tmp_path / "upstream", tmp_path / "clone")
+
+
+def migrate(clone: Repo, driver: PatchDriver) -> tuple[PatchResult, PatchDriver]:
+    """Patch and commit the clone with given driver, giving outcome and driver run"""
+    migration = MigrationLoaded(
+        commit_message="Patch",
+        commit_author_name="Tester",
+        commit_author_email="tester@example.com",
+        branch_name="patch",
+        driver_name="test",
+        driver_config={},
+        driver=driver,
+    )
+    cloned = ClonedRepo(
+        repo_id="clone",
+        clone_url=str(clone.working_dir),
+        cloned_path=Path(clone.working_dir),
+        current_branch="main",
+    )
+    result, excep = migrate_repo(cloned, clone, migration, LOGGER)
+    assert excep is None, f"Should migrate without error, got {excep}"
+    return result, migration.driver  # Driver got copied into migration
+
+
+def committed_files(clone: Repo) -> set[str]:
+    """List the files changed by the clone's last commit"""
+    return {diff.b_path or diff.a_path for diff in clone.head.commit.diff("main")}
+
+
+def test_reported_paths_committed(clone, caplog):
+    """Scenario: Driver reporting its changes gets those committed, no warning"""
+    # Given a clone
+    # When I patch it with a driver recording the file it creates
+    driver = Stamper(filepath_to_create="docs/new.md", file_contents="Hi")
+    with caplog.at_level(logging.WARNING):
+        result, driver = migrate(clone, driver)
+    # Then the driver's file is committed
+    assert result.outcome == PatchOutcome.PATCHED_OK, "Should patch OK"
+    assert driver.changed_paths() == ["docs/new.md"], "Should record created file"
+    assert committed_files(clone) == {"docs/new.md"}, "Should commit driver's file"
+    assert not clone.is_dirty(untracked_files=True), "Should leave nothing behind"
+    # And no file is reported as unrecorded
+    assert "didn't record" not in caplog.text, "Should not warn"
+
+
+def test_unrecorded_changes_committed_too(clone, caplog):
+    """Scenario: Files changed but not recorded by a driver are committed, warned"""
+    # Given a clone with a text file
+    (Path(clone.working_dir) / "notes.txt").write_text("Some notes\n")
+    # When I patch it with a driver subclass writing a file it doesn't record
+    driver = ChangelogUpdater(target_glob="*.txt")
+    with caplog.at_level(logging.WARNING):
+        result, driver = migrate(clone, driver)
+    # Then the edited files were recorded, but not the subclass' extra file
+    assert result.outcome == PatchOutcome.PATCHED_OK, "Should patch OK"
+    assert "CHANGELOG.md" not in (driver.changed_paths() or []), "Not recorded"
+    # And all changed files are committed anyway, the extra file included
+    expected = {"notes.txt", "old.txt", "CHANGELOG.md"}
+    assert committed_files(clone) == expected, "Should commit unrecorded file"
+    # And the unrecorded file is warned about
+    assert "didn't record: CHANGELOG.md" in caplog.text, "Should warn of it"
+
+
+def test_reported_deletions_committed(clone):
+    """Scenario: Driver reporting deleted files gets the deletions committed"""
+    # Given a clone
+    # When I patch it with a driver deleting a file, and a missing one
+    driver = FileDeleter(deletion_target=["old.txt", "missing.txt"])
+    result, driver = migrate(clone, driver)
+    # Then only the actually deleted file is recorded, and committed
+    assert result.outcome == PatchOutcome.PATCHED_OK, "Should patch OK"
+    assert driver.changed_paths() == ["old.txt"], "Should record deleted file only"
+    assert committed_files(clone) == {"old.txt"}, "Should commit deletion"
+
+
+def test_unreported_changes_all_committed(clone):
+    """Scenario: Driver not reporting its changes gets the whole repo scanned"""
+    # Given a clone with changes not made by the driver
+    (Path(clone.working_dir) / "stray.txt").write_text("Unrelated file\n")
+    # When I patch it with a driver not recording its changes
+    driver = UnreportedWriter()
+    result, driver = migrate(clone, driver)
+    # Then all changes are committed, as before
+    assert result.outcome == PatchOutcome.PATCHED_OK, "Should patch OK"
+    assert driver.changed_paths() is None, "Should not know changed files"
+    assert committed_files(clone) == {"stray.txt", "written.txt"}, "Commit all"
@@ -0,0 +1,106 @@
+"""Check the adaptive concurrency controller, growing and shrinking workers
+
+Feature: Adaptive concurrency
+  As a mass-driver user
+  I need the number of workers to adapt to the run's health
+  In order to process repos fast without tripping git host throttling
+"""
+
+import pytest
+
+from mass_driver import concurrency
+from mass_driver.concurrency import AdaptiveConcurrency, parse_workers
+from mass_driver.models.activity import PhaseTiming
+
+
+@pytest.fixture(autouse=True)
+def idle_host(monkeypatch):
+    """Pretend the host is idle, so host load doesn't interfere"""
+    monkeypatch.setattr(concurrency, "host_load_per_cpu", lambda: 0.1)
+
+
+def timings(**seconds_by_phase: float) -> list[PhaseTiming]:
+    """Make the phase timings of a repo, given seconds per phase"""
+    return [
+        PhaseTiming(phase=phase, started_at=0, wall_seconds=seconds, pid=1, thread_id=1)
+        for phase, seconds in seconds_by_phase.items()
+    ]
+
+
+def test_healthy_windows_grow_workers():
+    """Scenario: Healthy repos add one worker per window"""
+    # Given a controller starting at 4 workers
+    controller = AdaptiveConcurrency(initial=4, window=2)
+    # When two windows of repos complete without errors
+    for _ in range(4):
+        controller.record(error=False, timings=timings(clone=1.0))
+    # Then workers grew by one per window
+    assert controller.limit == 6, "Should add one worker per healthy window"
+    assert len(controller.history) == 3, "Should log initial + 2 changes"
+
+
+def test_errors_halve_workers():
+    """Scenario: Errors cut down workers"""
+    # Given a controller starting at 8 workers
+    controller = AdaptiveConcurrency(initial=8, window=2)
+    # When a window of repos errors out
+    controller.record(error=True)
+    controller.record(error=True)
+    # Then workers are halved
+    assert controller.limit == 4, "Should halve workers on errors"
+    assert "error" in controller.history[-1].reason, "Should log reason for change"
+
+
+def test_latency_inflation_shrinks_workers():
+    """Scenario: Slower clones cut down workers"""
+    # Given a controller that has seen a fast window of clones, growing to 9
+    controller = AdaptiveConcurrency(initial=8, window=1)
+    controller.record(error=False, timings=timings(clone=1.0))
+    assert controller.limit == 9, "Should grow on healthy window"
+    # When clones get much slower
+    controller.record(error=False, timings=timings(clone=5.0))
+    # Then workers are halved
+    assert controller.limit == 4, "Should halve workers on latency inflation"
+    assert "clone" in controller.history[-1].reason, "Should log slow phase"
+
+
+def test_slow_patching_is_no_congestion():
+    """Scenario: Slower non-network phases don't cut down workers"""
+    # Given a controller that has seen a window of fast clones and patching
+    controller = AdaptiveConcurrency(initial=8, window=1)
+    controller.record(error=False, timings=timings(clone=1.0, migrate=1.0))
+    # When a big repo takes much longer to patch, cloning as fast
+    controller.record(error=False, timings=timings(clone=1.0, migrate=50.0))
+    # Then workers still grow
+    assert controller.limit == 10, "Should ignore non-network phases"
+
+
+def test_baseline_decays_towards_recent_windows():
+    """Scenario: Lastingly slower clones become the new baseline"""
+    # Given a controller that has seen a window of fast clones
+    controller = AdaptiveConcurrency(initial=8, maximum=64, window=1)
+    controller.record(error=False, timings=timings(clone=1.0))
+    # When many windows of clones are slower, yet not twice as slow
+    for _ in range(10):
+        controller.record(error=False, timings=timings(clone=1.9))
+    limit_before = controller.limit
+    # Then clones three times slower than the first aren't congestion anymore
+    controller.record(error=False, timings=timings(clone=3.0))
+    assert controller.limit == limit_before + 1, "Should compare to decayed baseline"
+
+
+def test_workers_stay_within_bounds():
+    """Scenario: Workers never go past bounds"""
+    # Given a controller bounded between 1 and 2 workers
+    controller = AdaptiveConcurrency(initial=2, minimum=1, maximum=2, window=1)
+    # When many healthy repos complete
+    for _ in range(5):
+        controller.record(error=False, timings=timings(clone=1.0))
+    # Then workers didn't pass the maximum
+    assert controller.limit == 2, "Should cap at maximum workers"
+
+
+@pytest.mark.parametrize("flag,expected", [("3", 3), ("auto", "auto")])
+def test_parse_workers(flag, expected):
+    """Scenario: Parse --workers flag"""
+    assert parse_workers(flag) == expected, "Should parse the --workers flag"
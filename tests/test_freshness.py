@@ -0,0 +1,77 @@
+"""Check the refreshing of cached mirrors, fetching only those that moved
+
+Feature: Freshness policy for cached clones
+  As a mass-driver user
+  I need cached repos refreshed when their remote moved, and only then
+  In order to run on fresh code, without re-fetching the whole fleet
+"""
+
+import logging
+
+from git import Repo
+
+from mass_driver.cache_index import CacheIndex
+from mass_driver.freshness import refresh_cache, refresh_repo
+from mass_driver.git import clone_if_remote
+from mass_driver.models.repository import SourcedRepo
+
+LOGGER = logging.getLogger()
+
+
+def cached_upstream(tmp_path) -> tuple[Repo, SourcedRepo, Repo]:
+    """Create an 'upstream' repo, cloned into the 'ws' workspace of a cache"""
+    upstream_path = tmp_path / "org" / "upstream"
+    upstream = Repo.init(upstream_path, initial_branch="main")
+    (upstream_path / "README.md").write_text("Hello\n")
+    upstream.index.add("README.md")
+    upstream.index.commit("Initial commit")
+    repo = SourcedRepo(repo_id="upstream", clone_url=f"file://{upstream_path}")
+    clone = clone_if_remote(repo.clone_url, tmp_path / "cache", LOGGER, workspace="ws")
+    return upstream, repo, clone
+
+
+def test_refresh_remote_fetches_only_moved(tmp_path):
+    """Scenario: Remote policy fetches a cached repo only once its remote moved"""
+    # Given a cached repo, its remote unchanged since
+    upstream, repo, clone = cached_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    # When I refresh it by remote policy
+    outcome = refresh_repo(repo, cache_folder, "ws", "remote")
+    # Then it's fresh already, and its check recorded
+    assert outcome == "fresh", "Should not fetch unmoved remote"
+    assert CacheIndex(cache_folder).freshness("org/upstream"), "Should record check"
+    # When the remote moves, and I refresh it again
+    new_commit = upstream.index.commit("Second commit")
+    outcome = refresh_repo(repo, cache_folder, "ws", "remote")
+    # Then it's fetched, the workspace clone catching up with the remote
+    assert outcome == "fetched", "Should fetch moved remote"
+    assert clone.head.commit.hexsha == new_commit.hexsha, "Should catch up clone"
+
+
+def test_refresh_max_age_skips_recent_checks(tmp_path):
+    """Scenario: Repos checked within the max age aren't checked again"""
+    # Given a cached repo, just checked, whose remote moved since
+    upstream, repo, clone = cached_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    refresh_repo(repo, cache_folder, "ws", "always")
+    upstream.index.commit("Second commit")
+    # When I refresh the fleet, with an hour max age
+    outcomes = refresh_cache(
+        {repo.repo_id: repo}, cache_folder, "ws", "remote", LOGGER, max_age=3600
+    )
+    # Then it's considered fresh, untouched
+    assert outcomes == {"fresh": 1}, "Should trust recent check"
+
+
+def test_refresh_keeps_migration_branch(tmp_path):
+    """Scenario: Refreshing never resets a branch the activity committed to"""
+    # Given a cached repo, with a migration branch checked out in the workspace
+    upstream, repo, clone = cached_upstream(tmp_path)
+    migration_branch = clone.create_head("migration")
+    migration_branch.checkout()
+    migration_commit = clone.index.commit("Migration")
+    upstream.index.commit("Second commit")
+    # When I refresh it
+    refresh_repo(repo, tmp_path / "cache", "ws", "always")
+    # Then the migration branch is left as it was
+    assert clone.head.commit.hexsha == migration_commit.hexsha, "Should keep branch"
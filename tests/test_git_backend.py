@@ -0,0 +1,120 @@
+"""Check the git backends do the same per-repo git operations
+
+Feature: Pluggable git backend, in-process or via git subprocesses
+  As a mass-driver user over thousands of repos
+  I need git status and commits done without spawning git processes
+  In order to avoid paying a process spawn per operation per repo
+"""
+
+from importlib.util import find_spec
+from pathlib import Path
+
+import pytest
+from git import Repo
+
+from mass_driver.git_backend import (
+    GIT_BACKENDS,
+    GitPythonBackend,
+    git_backend,
+    using_git_backend,
+)
+
+BACKENDS = [
+    "gitpython",
+    pytest.param(
+        "dulwich",
+        marks=pytest.mark.skipif(
+            find_spec("dulwich") is None, reason="dulwich not installed"
+        ),
+    ),
+]
+"""The backends to check, skipping the optional ones not installed"""
+
+
+@pytest.fixture
+def cloned(tmp_path, monkeypatch) -> Repo:
+    """Clone an 'upstream' repo that has a couple files"""
+    monkeypatch.setenv("GIT_AUTHOR_NAME", "Tester")
+    monkeypatch.setenv("GIT_AUTHOR_EMAIL", "tester@example.com")
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "Tester")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "tester@example.com")
+    upstream = Repo.init(tmp_path / "upstream", initial_branch="main")
+    for filename in ["README.md", "old.txt"]:
+        (tmp_path / "upstream" / filename).write_text(f"Hello {filename}\n")
+    upstream.index.add(["README.md", "old.txt"])
+    upstream.index.commit("Initial commit")
+    return Repo.clone_from(tmp_path / "upstream", tmp_path / "clone")
+
+
+@pytest.mark.parametrize("backend_name", BACKENDS)
+def test_backend_commits_all_changes(cloned, backend_name):
+    """Scenario: Committing all changes (edits, new files, deletions) onto a branch"""
+    backend = GIT_BACKENDS[backend_name]()
+    clone_path = Path(cloned.working_dir)
+    # Given a clean clone
+    assert not backend.is_dirty(clone_path), "Fresh clone should be clean"
+    # When I edit a file, create another, and delete a third
+    (clone_path / "README.md").write_text("Hello edited\n")
+    (clone_path / "new.txt").write_text("New file\n")
+    (clone_path / "old.txt").unlink()
+    # Then the clone is dirty
+    assert backend.is_dirty(clone_path), "Should see changes"
+    # When I commit it all onto a new branch
+    backend.commit_all(clone_path, "fix", "Fix things", "Fixer <fix@example.com>")
+    # Then the new branch is checked out, holding all the changes
+    assert not backend.is_dirty(clone_path), "Should have committed all changes"
+    assert backend.active_branch(clone_path) == "fix", "Should checkout new branch"
+    assert backend.head_sha(clone_path) == cloned.head.commit.hexsha, "Same HEAD"
+    changed = {diff.b_path or diff.a_path for diff in cloned.head.commit.diff("main")}
+    assert changed == {"README.md", "new.txt", "old.txt"}, "Should commit all"
+    assert cloned.head.commit.author.name == "Fixer", "Should set commit author"
+
+
+@pytest.mark.parametrize("backend_name", BACKENDS)
+def test_backend_commits_given_paths(cloned, backend_name):
+    """Scenario: Committing just the changes of given paths onto a branch"""
+    backend = GIT_BACKENDS[backend_name]()
+    clone_path = Path(cloned.working_dir)
+    # Given a clone with an ignored file, an unrelated edit, and a deleted file
+    (clone_path / ".git" / "info" / "exclude").write_text("*.log\n")
+    (clone_path / "debug.log").write_text("Ignored\n")
+    (clone_path / "README.md").write_text("Unrelated edit\n")
+    (clone_path / "old.txt").unlink()
+    # When I create a file
+    (clone_path / "new.txt").write_text("New file\n")
+    # Then only the given paths are checked for changes
+    assert not backend.is_dirty(clone_path, ["missing.txt"]), "Missing is clean"
+    assert not backend.is_dirty(clone_path, ["debug.log"]), "Ignored is clean"
+    assert backend.is_dirty(clone_path, ["new.txt"]), "Should see new file"
+    # When I commit the new and deleted files, and ignored and missing ones
+    paths = ["new.txt", "old.txt", "debug.log", "missing.txt"]
+    backend.commit_all(clone_path, "fix", "Fix things", paths=paths)
+    # Then only the new file and deletion are committed
+    changed = {diff.b_path or diff.a_path for diff in cloned.head.commit.diff("main")}
+    assert changed == {"new.txt", "old.txt"}, "Should commit given changes only"
+    assert backend.is_dirty(clone_path, ["README.md"]), "Should leave unrelated edit"
+
+
+@pytest.mark.parametrize("backend_name", BACKENDS)
+def test_backend_reads_remote(cloned, backend_name):
+    """Scenario: Reading a clone's origin remote URL and default branch"""
+    backend = GIT_BACKENDS[backend_name]()
+    clone_path = Path(cloned.working_dir)
+    # Given a clone of a repo whose default branch is main
+    # When I read its remote
+    urls = backend.remote_urls(clone_path)
+    default_branch = backend.default_branch(clone_path)
+    # Then I get origin's URL and default branch
+    assert urls == list(cloned.remote().urls), "Should read origin URL"
+    assert default_branch == "main", "Should read remote's default branch"
+
+
+def test_using_git_backend_restores_default():
+    """Scenario: Selecting a git backend lasts only within context"""
+    # Given the default backend
+    # When I select a backend within a context
+    with using_git_backend("gitpython") as backend:
+        # Then it's the backend in use
+        assert git_backend() is backend, "Should use selected backend"
+    # And after context, the default is back
+    assert isinstance(git_backend(), GitPythonBackend), "Should restore default"
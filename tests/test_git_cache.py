@@ -0,0 +1,112 @@
+"""Check the cache of remote repos: bare mirrors, cloned from per workspace
+
+Feature: Bare-mirror repo cache with per-activity clones
+  As a mass-driver user
+  I need activities over the same repos not to clobber each other's clones
+  In order to run them concurrently, re-running them nearly for free
+"""
+
+import asyncio
+import logging
+import threading
+
+from git import Repo
+
+from mass_driver import git
+from mass_driver.git import (
+    clone_cache_hit,
+    clone_if_remote,
+    clone_if_remote_async,
+    mirror_path,
+)
+
+LOGGER = logging.getLogger()
+
+
+def make_upstream(tmp_path) -> str:
+    """Create an 'upstream' repo with a commit, giving its (file://) URL"""
+    upstream = Repo.init(tmp_path / "org" / "upstream", initial_branch="main")
+    (tmp_path / "org" / "upstream" / "README.md").write_text("Hello\n")
+    upstream.index.add("README.md")
+    upstream.index.commit("Initial commit")
+    return f"file://{tmp_path / 'org' / 'upstream'}"
+
+
+def test_workspaces_share_mirror(tmp_path):
+    """Scenario: Workspaces get their own clones, sharing one mirror's objects"""
+    # Given a remote repo, not cached yet
+    repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    assert clone_cache_hit(repo_url, cache_folder) is False, "Should miss cache"
+    # When I clone it into two workspaces
+    clone_a = clone_if_remote(repo_url, cache_folder, LOGGER, workspace="a")
+    clone_b = clone_if_remote(repo_url, cache_folder, LOGGER, workspace="b")
+    # Then the repo got mirrored once, bare
+    mirror = mirror_path(repo_url, cache_folder)
+    assert Repo(mirror).bare, "Should mirror the repo, bare"
+    assert clone_cache_hit(repo_url, cache_folder), "Should hit the cache"
+    # And each workspace has its own clone, borrowing the mirror's objects
+    assert clone_a.working_dir != clone_b.working_dir, "Should clone per workspace"
+    for clone in [clone_a, clone_b]:
+        alternates = clone.git_dir + "/objects/info/alternates"
+        assert str(mirror.resolve()) in open(alternates).read(), "Should share objects"
+        # And pushes to the original remote, not the mirror
+        assert clone.remote().url == repo_url, "Should keep the original remote"
+    # And branches of one workspace don't show up in the other
+    clone_a.create_head("feature-a")
+    assert "feature-a" not in [head.name for head in clone_b.heads], "Own branches"
+
+
+def test_new_workspace_fetches_mirror(tmp_path):
+    """Scenario: New workspaces start from a freshly fetched mirror"""
+    # Given a remote repo, already mirrored
+    repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    clone_if_remote(repo_url, cache_folder, LOGGER, workspace="a")
+    # And a new commit upstream since
+    upstream = Repo(tmp_path / "org" / "upstream")
+    new_commit = upstream.index.commit("Second commit")
+    # When I clone it into a new workspace
+    clone_b = clone_if_remote(repo_url, cache_folder, LOGGER, workspace="b")
+    # Then the mirror got fetched first, giving the new commit
+    assert clone_b.head.commit.hexsha == new_commit.hexsha, "Should fetch mirror"
+
+
+def test_async_clone_shares_mirror(tmp_path):
+    """Scenario: Cloning via asyncio uses the same mirror as threaded cloning"""
+    # Given a remote repo, mirrored by a threaded clone
+    repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    clone_if_remote(repo_url, cache_folder, LOGGER, workspace="a")
+    # When I clone it via asyncio into another workspace
+    clone_b = asyncio.run(
+        clone_if_remote_async(repo_url, cache_folder, LOGGER, workspace="b")
+    )
+    # Then it borrows the same mirror's objects, pushing to the original remote
+    alternates = clone_b.git_dir + "/objects/info/alternates"
+    mirror = mirror_path(repo_url, cache_folder)
+    assert str(mirror.resolve()) in open(alternates).read(), "Should share objects"
+    assert clone_b.remote().url == repo_url, "Should keep the original remote"
+
+
+def test_async_clone_indexes_off_event_loop(tmp_path, monkeypatch):
+    """Scenario: Cloning via asyncio keeps blocking cache indexing off the loop"""
+    # Given a remote repo, not cached yet
+    repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    # And cache indexing that records which thread it runs in
+    indexing_threads = []
+    for name in ["index_fetch", "index_workspace_clone"]:
+        indexing = getattr(git, name)
+
+        def recording(*args, indexing=indexing):
+            indexing_threads.append(threading.current_thread())
+            return indexing(*args)
+
+        monkeypatch.setattr(git, name, recording)
+    # When I clone it via asyncio
+    asyncio.run(clone_if_remote_async(repo_url, cache_folder, LOGGER))
+    # Then the cache got indexed, outside the event loop's thread
+    assert len(indexing_threads) == 2, "Should index mirror and workspace clone"
+    loop_thread = threading.main_thread()
+    assert loop_thread not in indexing_threads, "Should index in worker threads"
@@ -0,0 +1,104 @@
+"""Check scanners can read repos straight from git objects, without checkout
+
+Feature: Scan repos' files from git objects, without working trees
+  As a mass-driver user scanning a fleet of repos
+  I need scanners to read files without checking them out
+  In order to scan without the disk I/O and time of working trees
+"""
+
+import logging
+from pathlib import Path
+
+import pytest
+from git import Repo
+
+from mass_driver.git import clone_target_path, mirror_path
+from mass_driver.git_tree import open_tree
+from mass_driver.models.activity import ActivityLoaded
+from mass_driver.models.repository import SourcedRepo
+from mass_driver.process_repo import clone_repo, scan_repo
+
+LOGGER = logging.getLogger()
+
+SCAN_ACTIVITY = """
+[mass-driver.scan]
+scanner_names = ["dockerfile-from", "root-files"]
+"""
+
+
+def make_upstream(tmp_path) -> str:
+    """Create an 'upstream' repo with a few files, giving its (file://) URL"""
+    upstream_path = tmp_path / "org" / "upstream"
+    upstream = Repo.init(upstream_path, initial_branch="main")
+    (upstream_path / "src").mkdir()
+    (upstream_path / "Dockerfile").write_text("FROM python:3.11\nRUN true\n")
+    (upstream_path / "README.md").write_text("Hello\n")
+    (upstream_path / "src" / "main.py").write_text("print('hi')\n")
+    upstream.index.add(["Dockerfile", "README.md", "src/main.py"])
+    upstream.index.commit("Initial commit")
+    return f"file://{upstream_path}"
+
+
+def test_tree_view_reads_bare_repo(tmp_path):
+    """Scenario: Reading files and folders of a bare repo, via git tree view"""
+    # Given a bare clone of a repo: no files checked out
+    bare = tmp_path / "bare.git"
+    Repo.clone_from(make_upstream(tmp_path), bare, bare=True)
+    # When I view its files from git objects
+    with open_tree(bare) as tree:
+        # Then files and folders are found, and read
+        assert (tree / "Dockerfile").is_file(), "Should find file"
+        assert (tree / "src").is_dir(), "Should find folder"
+        assert (tree / Path("src/main.py")).read_text() == "print('hi')\n", "Read"
+        listed = sorted(path.name for path in tree.iterdir())
+        assert listed == ["Dockerfile", "README.md", "src"], "Should list folder"
+        # And missing files are missing
+        assert not (tree / "LICENSE").exists(), "Should not find missing file"
+        with pytest.raises(FileNotFoundError):
+            (tree / "src" / "missing.py").read_text()
+
+
+def test_tree_scan_needs_no_checkout(tmp_path):
+    """Scenario: Scanning with tree scanners only mirrors repos, no checkout"""
+    # Given a scan-only activity, of scanners reading git trees
+    activity = ActivityLoaded.from_config(SCAN_ACTIVITY)
+    assert activity.scan is not None
+    assert not activity.needs_checkout, "Tree scanners need no checkout"
+    # And a remote repo, not cached yet
+    repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    repo = SourcedRepo(repo_id="upstream", clone_url=repo_url)
+    # When I clone then scan it
+    cloned, _repo_gitobj = clone_repo(
+        repo, cache_folder, LOGGER, checkout=activity.needs_checkout
+    )
+    scan_result = scan_repo(activity.scan, cloned)
+    # Then it's only mirrored, never checked out
+    assert cloned.cloned_path == mirror_path(repo_url, cache_folder), "Mirror only"
+    assert not clone_target_path(repo_url, cache_folder, "default").exists(), "Tree"
+    assert cloned.current_branch == "main", "Should scan default branch"
+    # And scan results are read from the mirror
+    assert scan_result["root-files"]["readme_md"], "Should find README in mirror"
+    dockerfile = scan_result["dockerfile-from"]
+    assert dockerfile["dockerfile_from_lines"] == ["FROM python:3.11"], "Should read"
+
+
+def test_tree_scan_reads_local_working_tree(tmp_path):
+    """Scenario: Tree scanners see uncommitted files of local repos scanned in place"""
+    # Given a scan activity, of scanners reading git trees
+    activity = ActivityLoaded.from_config(SCAN_ACTIVITY)
+    assert activity.scan is not None
+    # And a local repo, with an uncommitted edit and an untracked file
+    local_path = Path(make_upstream(tmp_path).removeprefix("file://"))
+    (local_path / "Dockerfile").write_text("FROM python:3.12\n")
+    (local_path / "CHANGELOG.md").write_text("# Changes\n")
+    repo = SourcedRepo(repo_id="local", clone_url=str(local_path))
+    # When I scan it in place
+    cloned, _repo_gitobj = clone_repo(
+        repo, tmp_path / "cache", LOGGER, checkout=activity.needs_checkout
+    )
+    scan_result = scan_repo(activity.scan, cloned)
+    # Then the scan reads its working tree, not its last commit
+    dockerfile = scan_result["dockerfile-from"]
+    assert dockerfile["dockerfile_from_lines"] == ["FROM python:3.12"], "Uncommitted"
+    assert scan_result["root-files"]["changelog_md"], "Should find untracked file"
@@ -0,0 +1,188 @@
+"""Check local repos can be cloned into cache, hardlinked, rather than used in place
+
+Feature: Clone local repos into cache, sharing their objects via hardlinks
+  As a mass-driver user running activities over local checkouts
+  I need drivers to patch clones of them, not my checkouts themselves
+  In order to keep my checkouts untouched, and run activities concurrently
+"""
+
+import logging
+from pathlib import Path
+from typing import ClassVar
+
+from git import Repo
+
+from mass_driver.git import clone_if_remote, commit
+from mass_driver.models.activity import ActivityLoaded
+from mass_driver.models.forge import BranchName, Forge
+from mass_driver.models.migration import ForgeLoaded
+from mass_driver.models.repository import ClonedRepo
+from mass_driver.process_repo import forge_per_repo
+from mass_driver.repo_cache import cached_repos, collect_garbage
+
+LOGGER = logging.getLogger()
+
+STAMPER_ACTIVITY = """
+[mass-driver]
+clone_local = true
+
+[mass-driver.migration]
+commit_message = "Stamp"
+branch_name = "stamp"
+commit_author_name = "Tester"
+commit_author_email = "tester@example.com"
+driver_name = "stamper"
+driver_config = {filepath_to_create = "new.md", file_contents = "Hi"}
+"""
+
+
+class RecordingForge(Forge):
+    """A Forge recording the repos it was asked to create PRs on"""
+
+    forged_urls: ClassVar[list[str]] = []
+
+    def create_pr(
+        self,
+        forge_repo_url: str,
+        base_branch: BranchName,
+        head_branch: BranchName,
+        pr_title: str,
+        pr_body: str,
+        draft: bool,
+    ) -> str:
+        """Record the repo to create a PR on"""
+        self.forged_urls.append(forge_repo_url)
+        return f"{forge_repo_url}/pull/1"
+
+
+def make_local_repo(path) -> Repo:
+    """Create a local repo with a commit"""
+    local = Repo.init(path, initial_branch="main")
+    (path / "README.md").write_text("Hello\n")
+    local.index.add("README.md")
+    local.index.commit("Initial commit")
+    return local
+
+
+def test_local_repo_cloned_hardlinked(tmp_path, monkeypatch):
+    """Scenario: Patching a local repo's clone leaves the local repo untouched"""
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "Tester")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "tester@example.com")
+    # Given a local repo, and an activity cloning local repos
+    local = make_local_repo(tmp_path / "local")
+    activity = ActivityLoaded.from_config(STAMPER_ACTIVITY)
+    assert activity.migration is not None and activity.clone_local, "Clone local"
+    # When I clone it
+    clone = clone_if_remote(
+        str(tmp_path / "local"), tmp_path / "cache", LOGGER, clone_local=True
+    )
+    # Then the clone is in cache, sharing the local repo's objects via hardlinks
+    clone_path = tmp_path / "cache" / "workspaces" / "default" / "local"
+    assert clone.working_dir.startswith(str(clone_path)), "Should clone into cache"
+    readme_blob = local.head.commit.tree["README.md"].hexsha
+    object_path = f"objects/{readme_blob[:2]}/{readme_blob[2:]}"
+    local_object = tmp_path / "local" / ".git" / object_path
+    cloned_object = Path(clone.git_dir) / object_path
+    assert local_object.stat().st_ino == cloned_object.stat().st_ino, "Hardlinks"
+    # When I patch and commit in the clone
+    (Path(clone.working_dir) / "new.md").write_text("Hi")
+    commit(clone, activity.migration)
+    # Then the local repo is untouched
+    assert not (tmp_path / "local" / "new.md").exists(), "Should not patch local"
+    assert "stamp" not in [head.name for head in local.heads], "Should not branch"
+
+
+def test_local_clone_catches_up(tmp_path):
+    """Scenario: Cloning a local repo again catches up with its new commits"""
+    # Given a local repo, cloned into cache
+    local = make_local_repo(tmp_path / "local")
+    clone_if_remote(
+        str(tmp_path / "local"), tmp_path / "cache", LOGGER, clone_local=True
+    )
+    # When the local repo gets a new commit, and I clone it again
+    new_commit = local.index.commit("Second commit")
+    clone = clone_if_remote(
+        str(tmp_path / "local"), tmp_path / "cache", LOGGER, clone_local=True
+    )
+    # Then the clone has caught up
+    assert clone.head.commit.hexsha == new_commit.hexsha, "Should catch up"
+
+
+def test_local_repos_same_name_cloned_apart(tmp_path):
+    """Scenario: Local repos of the same name get their own clones"""
+    # Given two local repos of the same folder name
+    make_local_repo(tmp_path / "a" / "repo")
+    make_local_repo(tmp_path / "b" / "repo")
+    # When I clone both
+    clone_a = clone_if_remote(
+        str(tmp_path / "a" / "repo"), tmp_path / "cache", LOGGER, clone_local=True
+    )
+    clone_b = clone_if_remote(
+        str(tmp_path / "b" / "repo"), tmp_path / "cache", LOGGER, clone_local=True
+    )
+    # Then each gets its own clone
+    assert clone_a.working_dir != clone_b.working_dir, "Should clone apart"
+
+
+def test_local_clone_forged_against_local_origin(tmp_path, monkeypatch):
+    """Scenario: Forging a local repo's clone pushes to, and PRs on, its origin"""
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "Tester")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "tester@example.com")
+    # Given a local checkout of an upstream repo
+    upstream = Repo.init(tmp_path / "upstream.git", bare=True)
+    local = make_local_repo(tmp_path / "local")
+    local.create_remote("origin", str(tmp_path / "upstream.git"))
+    local.remote().push("main")
+    activity = ActivityLoaded.from_config(STAMPER_ACTIVITY)
+    assert activity.migration is not None
+    # And its clone into cache, patched and committed
+    clone = clone_if_remote(
+        str(tmp_path / "local"), tmp_path / "cache", LOGGER, clone_local=True
+    )
+    (Path(clone.working_dir) / "new.md").write_text("Hi")
+    commit(clone, activity.migration)
+    # When I forge it, pushing first
+    forge = ForgeLoaded(
+        head_branch="stamp",
+        draft_pr=False,
+        pr_title="Stamp",
+        pr_body="Stamping",
+        forge_name="recording",
+        forge=RecordingForge(),
+    )
+    cloned_repo = ClonedRepo(
+        repo_id="local",
+        clone_url=str(tmp_path / "local"),
+        cloned_path=Path(clone.working_dir),
+        current_branch="stamp",
+    )
+    forge_per_repo(forge, cloned_repo)
+    # Then the branch is pushed to the upstream, not the local checkout
+    assert "stamp" in [head.name for head in upstream.heads], "Should push upstream"
+    assert "stamp" not in [head.name for head in local.heads], "Should not push local"
+    # And the PR is created on the upstream
+    assert RecordingForge.forged_urls == [
+        str(tmp_path / "upstream.git")
+    ], "Should create PR on the local repo's origin"
+
+
+def test_local_clone_evicted_from_cache(tmp_path):
+    """Scenario: Local repos' clones are indexed, and evicted without the local repo"""
+    # Given a local repo, cloned into cache
+    make_local_repo(tmp_path / "local")
+    clone = clone_if_remote(
+        str(tmp_path / "local"), tmp_path / "cache", LOGGER, clone_local=True
+    )
+    # When I list the cache
+    (cached,) = cached_repos(tmp_path / "cache")
+    # Then the clone is listed, the local repo itself not counted
+    assert cached.local, "Should index the local repo's clone"
+    assert cached.size_bytes == 0, "Should not count the local repo as cache"
+    assert cached.total_bytes > 0, "Should count the clone"
+    # When I evict everything from cache
+    evicted = collect_garbage(tmp_path / "cache", 0, LOGGER)
+    # Then the clone is gone, but the local repo is untouched
+    assert [repo.cache_name for repo in evicted] == [cached.cache_name], "Evicted"
+    assert not Path(clone.working_dir).exists(), "Should remove the clone"
+    assert (tmp_path / "local" / "README.md").is_file(), "Should keep local repo"
+    assert not cached_repos(tmp_path / "cache"), "Should forget the evicted clone"
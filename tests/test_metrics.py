@@ -0,0 +1,76 @@
+"""Check the live metrics of a run, for Prometheus to scrape
+
+Feature: Metrics export of long runs
+  As a mass-driver user running unattended fleet-wide runs
+  I need live throughput metrics of the run
+  In order to graph progress and alert on stalls
+"""
+
+from mass_driver.metrics import RunMetrics, writing_metrics
+from mass_driver.models.activity import PhaseTiming, RepoOutcome
+from mass_driver.models.forge import PROutcome, PRResult
+from mass_driver.models.patchdriver import PatchOutcome, PatchResult
+
+
+def clone_timing(wall_seconds: float, cache_hit: bool) -> PhaseTiming:
+    """Create the timing of a clone"""
+    return PhaseTiming(
+        phase="clone",
+        started_at=0,
+        wall_seconds=wall_seconds,
+        cache_hit=cache_hit,
+        pid=1,
+        thread_id=1,
+    )
+
+
+def test_metrics_from_repo_outcomes():
+    """Scenario: Repos' outcomes are counted, their phases' durations bucketed"""
+    # Given run metrics
+    metrics = RunMetrics()
+    # When two repos are patched (one cached), one forged, and one fails cloning
+    for cache_hit, seconds in [(True, 0.2), (False, 7.0)]:
+        metrics.record(
+            RepoOutcome(
+                repo_id=f"repo-{cache_hit}",
+                migration_result=PatchResult(outcome=PatchOutcome.PATCHED_OK),
+                timings=[clone_timing(seconds, cache_hit)],
+            )
+        )
+    metrics.record(
+        RepoOutcome(
+            repo_id="repo-True", forge_result=PRResult(outcome=PROutcome.PR_CREATED)
+        )
+    )
+    metrics.record(RepoOutcome(repo_id="broken", error="Clone failed"))
+    # Then the rendered metrics count repos by stage and outcome
+    lines = metrics.render().splitlines()
+    for expected in [
+        'mass_driver_repos_total{stage="migration",outcome="PATCHED_OK"} 2',
+        'mass_driver_repos_total{stage="forge",outcome="PR_CREATED"} 1',
+        'mass_driver_repos_total{stage="clone",outcome="error"} 1',
+        # And clone cache hits and misses
+        'mass_driver_clone_cache_total{result="hit"} 1',
+        'mass_driver_clone_cache_total{result="miss"} 1',
+        # And bucket phase durations, cumulatively
+        'mass_driver_phase_duration_seconds_bucket{phase="clone",le="0.5"} 1',
+        'mass_driver_phase_duration_seconds_bucket{phase="clone",le="10.0"} 2',
+        'mass_driver_phase_duration_seconds_count{phase="clone"} 2',
+    ]:
+        assert expected in lines, f"Should have metric: {expected}"
+
+
+def test_writing_metrics_textfile(tmp_path):
+    """Scenario: Metrics are written to textfile, up to date at exit"""
+    # Given run metrics, written to a textfile
+    textfile_path = tmp_path / "mass_driver.prom"
+    metrics = RunMetrics()
+    with writing_metrics(metrics, textfile_path, interval=60):
+        # When a repo is done during the run
+        metrics.record(RepoOutcome(repo_id="broken", error="Clone failed"))
+    # Then the textfile has the final metrics, without leftover temp file
+    assert (
+        'mass_driver_repos_total{stage="clone",outcome="error"} 1'
+        in textfile_path.read_text()
+    ), "Should write the final metrics"
+    assert list(tmp_path.iterdir()) == [textfile_path], "Should replace atomically"
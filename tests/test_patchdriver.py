@@ -0,0 +1,68 @@
+"""Check PatchDrivers can be cheaply refreshed between repos
+
+Feature: Fresh PatchDriver per repo
+  As a mass-driver user
+  I need each repo patched by a driver without state from previous repos
+  Without paying for a deep copy of big driver configs of stateless drivers
+"""
+
+import logging
+
+from mass_driver.drivers.stamper import Stamper
+from mass_driver.models.migration import MigrationLoaded
+from mass_driver.models.patchdriver import PatchDriver, PatchOutcome, PatchResult
+from mass_driver.models.repository import ClonedRepo
+
+
+class AppendingDriver(PatchDriver):
+    """A driver mutating its own config in-place, not declared stateless"""
+
+    seen: list[str] = []
+
+    def run(self, repo: ClonedRepo) -> PatchResult:
+        """Remember the repo"""
+        self.seen.append(repo.repo_id)
+        return PatchResult(outcome=PatchOutcome.PATCHED_OK)
+
+
+def test_fresh_driver_copies_config_by_default():
+    """Scenario: Fresh driver gets its own copy of mutable config values"""
+    # Given a driver with mutable config, not declared stateless
+    driver = AppendingDriver(seen=["repo0"])
+    # When I get a fresh driver out of it, and mutate its config in-place
+    fresh = driver.fresh()
+    fresh.seen.append("repo1")
+    # Then the original driver's config is untouched
+    assert driver.seen == ["repo0"], "Should not share mutable config"
+
+
+def test_fresh_driver_shares_config():
+    """Scenario: Fresh stateless driver reuses the validated config"""
+    # Given a stateless driver with a big config
+    assert Stamper.stateless, "Stamper should be declared stateless"
+    driver = Stamper(filepath_to_create="a.txt", file_contents="x" * 10_000)
+    # When I get a fresh driver out of it
+    fresh = driver.fresh()
+    # Then it's a new instance
+    assert fresh is not driver, "Should be a new driver instance"
+    # But its config isn't copied
+    assert fresh.file_contents is driver.file_contents, "Should share config"
+
+
+def test_fresh_migration_isolates_driver_state():
+    """Scenario: Per-repo state of a fresh driver doesn't leak back"""
+    # Given a migration's driver
+    migration = MigrationLoaded(
+        commit_message="Stamp",
+        driver_name="stamper",
+        driver_config={},
+        driver=Stamper(filepath_to_create="a.txt", file_contents="hi"),
+    )
+    # When a fresh copy of the migration gets per-repo state
+    fresh = migration.fresh()
+    fresh.driver._logger = logging.getLogger("repo1")
+    fresh.driver.file_ownership = "0600"
+    # Then the original migration's driver is untouched
+    assert fresh.driver is not migration.driver, "Should have a fresh driver"
+    assert migration.driver.file_ownership == "0664", "Should not leak state back"
+    assert not hasattr(migration.driver, "_logger"), "Should not leak logger back"
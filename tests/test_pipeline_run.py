@@ -0,0 +1,162 @@
+"""Check the pipelined run survives errors escaping a phase
+
+Feature: Pipeline run resilient to plugin errors
+  As a mass-driver user running the pipeline executor
+  I need plugin errors to fail just the repo at hand
+  In order to get every repo's outcome, rather than a hung run
+"""
+
+import logging
+import queue
+import threading
+
+import pytest
+from git import Repo
+
+from mass_driver.commands import streamed_outcome
+from mass_driver.journal import RunJournal
+from mass_driver.models.activity import ActivityLoaded
+from mass_driver.models.migration import MigrationLoaded
+from mass_driver.models.patchdriver import PatchDriver, PatchOutcome
+from mass_driver.models.repository import SourcedRepo
+from mass_driver.pipeline_run import (
+    _DONE,
+    PipelineItem,
+    parse_stage_workers,
+    pipeline_run,
+    stage_worker,
+)
+
+
+class UnfreshableDriver(PatchDriver):
+    """A driver that can't be refreshed for a new repo"""
+
+    def fresh(self) -> "PatchDriver":
+        """Fail to refresh"""
+        raise RuntimeError("Can't refresh")
+
+
+def test_driver_fresh_error_fails_repos_not_run(tmp_path):
+    """Scenario: Driver failing to refresh errors each repo, run still completes"""
+    # Given local repos, more than the pipeline's queues hold
+    repos = {}
+    for index in range(5):
+        Repo.init(tmp_path / f"repo{index}", initial_branch="main")
+        repos[f"repo{index}"] = SourcedRepo(
+            repo_id=f"repo{index}", clone_url=str(tmp_path / f"repo{index}")
+        )
+    # And a migration whose driver fails to refresh
+    migration = MigrationLoaded(
+        commit_message="Patch",
+        driver_name="unfreshable",
+        driver_config={},
+        driver=UnfreshableDriver(),
+    )
+    activity = ActivityLoaded(migration=migration)
+    # When I run the pipeline over them, one worker per phase
+    outcomes = []
+    run = threading.Thread(
+        target=lambda: outcomes.append(
+            pipeline_run(
+                activity,
+                repos,
+                cache=False,
+                stage_workers={"clone": 1, "migrate": 1, "commit": 1},
+                queue_size=1,
+            )
+        ),
+        daemon=True,
+    )
+    run.start()
+    run.join(timeout=30)
+    # Then the run completes
+    assert not run.is_alive(), "Pipeline run should not hang"
+    # And each repo failed patching
+    assert outcomes[0].migration_result is not None, "Should record migration"
+    results = outcomes[0].migration_result
+    assert sorted(results) == sorted(repos), "Should record all repos"
+    assert all(
+        result.outcome == PatchOutcome.PATCH_ERROR for result in results.values()
+    ), "Should fail patching each repo"
+
+
+def test_streamed_run_keeps_no_repo_results(tmp_path):
+    """Scenario: Streamed run holds no per-repo records, read back once done"""
+    # Given local repos
+    repos = {}
+    for index in range(3):
+        Repo.init(tmp_path / f"repo{index}", initial_branch="main")
+        repos[f"repo{index}"] = SourcedRepo(
+            repo_id=f"repo{index}", clone_url=str(tmp_path / f"repo{index}")
+        )
+    # And a migration whose driver fails to refresh
+    migration = MigrationLoaded(
+        commit_message="Patch",
+        driver_name="unfreshable",
+        driver_config={},
+        driver=UnfreshableDriver(),
+    )
+    activity = ActivityLoaded(migration=migration)
+    # When I run the pipeline, streaming repo results to JSONL only
+    stream_path = tmp_path / "outcome.jsonl"
+    stream = RunJournal(stream_path, fsync=False, append=False, repos_sourced=repos)
+    outcome = pipeline_run(
+        activity,
+        repos,
+        cache=False,
+        repo_callbacks=[stream.record],
+        keep_repo_results=False,
+    )
+    # Then the run's outcome holds no per-repo records
+    assert outcome.migration_result is None, "Should not hold patch results"
+    assert not outcome.phase_timings, "Should not hold phase timings"
+    # But reading the stream back once done gets each repo's patch result
+    streamed = streamed_outcome(stream_path, outcome, logging.getLogger())
+    stream.close()
+    assert streamed.migration_result is not None, "Should read back patch results"
+    assert sorted(streamed.migration_result) == sorted(
+        repos
+    ), "Should read back each repo's patch result"
+    assert streamed.phase_timings, "Should read back phase timings"
+
+
+def test_stage_error_recorded_on_item():
+    """Scenario: Error escaping a phase is recorded on the repo, worker lives on"""
+    # Given a phase that always fails, fed two repos
+    inbox: queue.Queue = queue.Queue()
+    outbox: queue.Queue = queue.Queue()
+    logger = logging.getLogger()
+    for repo_id in ["repo1", "repo2"]:
+        repo = SourcedRepo(repo_id=repo_id, clone_url=repo_id)
+        inbox.put(PipelineItem(repo_id=repo_id, repo=repo, logger=logger))
+    inbox.put(_DONE)
+
+    def failing(item: PipelineItem):
+        raise RuntimeError("Boom")
+
+    # When a worker processes them
+    stage_worker("scan", failing, inbox, outbox)
+    # Then both repos are passed on, with the error recorded
+    items = [outbox.get(), outbox.get()]
+    assert [item.repo_id for item in items] == ["repo1", "repo2"], "Pass all on"
+    assert all("Boom" in (item.error or "") for item in items), "Record error"
+
+
+def test_parse_stage_workers():
+    """Scenario: Parse --stage-workers flag, of given phases only"""
+    # When I parse sizes for two phases
+    workers_by_stage = parse_stage_workers("clone=16, migrate=8")
+    # Then I get just those phases' sizes
+    assert workers_by_stage == {
+        "clone": 16,
+        "migrate": 8,
+    }, "Should parse the --stage-workers flag"
+
+
+@pytest.mark.parametrize("flag", ["forge=2", "scan=0", "scan"])
+def test_parse_stage_workers_invalid(flag):
+    """Scenario: Unknown phase, or size below 1, is refused"""
+    # When I parse an invalid --stage-workers flag
+    # Then I get an error
+    with pytest.raises(ValueError):
+        parse_stage_workers(flag)
@@ -0,0 +1,90 @@
+"""Check the profiling of plugins, aggregated across calls and threads
+
+Feature: Built-in profiling of PatchDrivers and Scanners
+  As a mass-driver plugin author
+  I need my plugin profiled over a whole fleet of repos
+  In order to optimize it against real data
+"""
+
+import pstats
+import threading
+
+import pytest
+
+from mass_driver import profiling as profiling_module
+from mass_driver.profiling import (
+    PER_THREAD_PROFILING,
+    PluginProfiler,
+    profile_call,
+    profiling,
+    unprofilable_reason,
+)
+
+
+def hot_loop(count: int) -> int:
+    """A plugin function, busy for a while"""
+    return sum(i * i for i in range(count))
+
+
+def test_profile_call_unprofiled_by_default():
+    """Scenario: Plugin calls aren't profiled unless asked"""
+    # Given a profiler, not enabled
+    profiler = PluginProfiler()
+    # When I call a plugin
+    result = profile_call("scanner.hot", hot_loop, 10)
+    # Then it runs as usual, unprofiled
+    assert result == 285, "Should return the plugin's result"
+    assert not profiler.stats, "Should not profile anything"
+
+
+@pytest.mark.skipif(
+    not PER_THREAD_PROFILING, reason="cProfile profiles all threads from 3.12"
+)
+def test_profiles_aggregate_across_threads(tmp_path):
+    """Scenario: Plugin calls from many threads add up into one profile"""
+    # Given an enabled profiler
+    profiler = PluginProfiler()
+    with profiling(profiler):
+        # When I call a plugin from 4 threads
+        threads = [
+            threading.Thread(target=profile_call, args=("scanner.hot", hot_loop, 1000))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    # Then the plugin's profile counts all 4 calls
+    hot_function = next(
+        hot
+        for hot in profiler.top_functions("scanner.hot", count=100)
+        if hot.function.endswith("(hot_loop)")
+    )
+    assert hot_function.calls == 4, "Should aggregate calls across threads"
+    # And the combined profile can be saved, then loaded by pstats
+    profile_path = tmp_path / "plugins.prof"
+    profiler.save(profile_path)
+    assert pstats.Stats(str(profile_path)).total_calls > 0, "Should load saved profile"
+
+
+def test_threaded_profiling_rejected_without_per_thread_profiles(monkeypatch):
+    """Scenario: Concurrent executors can't be profiled with process-wide cProfile"""
+    # Given a Python whose cProfile profiles all threads at once (3.12+)
+    monkeypatch.setattr(profiling_module, "PER_THREAD_PROFILING", False)
+    # When checking whether each executor can be profiled
+    # Then only the sequential executor is, without a work queue
+    assert unprofilable_reason("sequential", queued=False) is None, "Sequential ok"
+    assert unprofilable_reason("sequential", queued=True), "Queue has threads"
+    for executor in ["thread", "async", "pipeline", "process"]:
+        assert unprofilable_reason(executor, queued=False), f"{executor}: threads"
+
+
+def test_threaded_profiling_allowed_with_per_thread_profiles(monkeypatch):
+    """Scenario: Concurrent executors can be profiled with per-thread cProfile"""
+    # Given a Python whose cProfile profiles just the enabling thread (<3.12)
+    monkeypatch.setattr(profiling_module, "PER_THREAD_PROFILING", True)
+    # When checking whether the thread executor can be profiled
+    # Then it can
+    assert unprofilable_reason("thread", queued=True) is None, "Should profile"
+    # But not the process executor
+    assert unprofilable_reason("process", queued=False), "Can't reach processes"
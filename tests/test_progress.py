@@ -0,0 +1,55 @@
+"""Check the live progress display of runs
+
+Feature: Live progress with throughput and ETA
+  As a mass-driver user
+  I need to see how fast a run goes, and when it will be done
+  In order to plan around long fleet-wide runs
+"""
+
+import io
+
+from mass_driver.models.activity import RepoOutcome
+from mass_driver.models.patchdriver import PatchOutcome, PatchResult
+from mass_driver.progress import ProgressReporter, format_duration, showing_progress
+
+
+def test_progress_tallies_outcomes():
+    """Scenario: Progress counts repos done so far, by outcome"""
+    # Given a progress report of 4 repos, not on a terminal
+    progress = ProgressReporter("run", 4, stream=io.StringIO())
+    # When 2 repos are patched, and 1 fails to clone
+    for repo_id in ["repo1", "repo2"]:
+        progress.record(
+            RepoOutcome(
+                repo_id=repo_id,
+                migration_result=PatchResult(outcome=PatchOutcome.PATCHED_OK),
+            )
+        )
+    progress.record(RepoOutcome(repo_id="repo3", error="Clone failed"))
+    # Then the progress line tells how many are done, and their outcomes
+    line = progress.render()
+    assert line.startswith("run: 3/4 (75.0%)"), "Should count repos done"
+    assert line.endswith("PATCHED_OK 2, ERROR 1"), "Should tally outcomes"
+    # And estimates time left from throughput
+    assert progress.throughput() > 0, "Should compute throughput"
+    assert progress.eta_seconds() is not None, "Should estimate time left"
+
+
+def test_progress_not_on_terminal_prints_lines():
+    """Scenario: Off terminal, progress is printed as whole lines"""
+    # Given a progress report, not on a terminal
+    stream = io.StringIO()
+    progress = ProgressReporter("forge", 1, stream=stream)
+    # When the single repo is done while showing progress
+    with showing_progress(progress):
+        progress.tick("PR_CREATED")
+    # Then a final progress line is printed, without terminal control codes
+    assert stream.getvalue().startswith("forge: 1/1 (100.0%)"), "Should show final"
+    assert "\r" not in stream.getvalue(), "Should not rewrite lines"
+
+
+def test_format_duration():
+    """Scenario: Durations are formatted for humans"""
+    assert format_duration(12.3) == "12s", "Should format seconds"
+    assert format_duration(185) == "3m05s", "Should format minutes"
+    assert format_duration(3720) == "1h02m", "Should format hours"
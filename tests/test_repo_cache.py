@@ -0,0 +1,150 @@
+"""Check the repo cache stays within its size budget
+
+Feature: Size-budgeted repo cache, evicting least-recently-used repos
+  As a mass-driver user on CI runners
+  I need the repo cache not to grow without bound
+  In order not to fill the disks
+"""
+
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from git import Repo
+
+from mass_driver.cli import cli
+from mass_driver.git import clone_if_remote, mirror_path
+from mass_driver.repo_cache import (
+    STALE_STAGING_SECONDS,
+    cached_repos,
+    collect_garbage,
+    parse_size,
+)
+
+LOGGER = logging.getLogger()
+
+
+def make_upstream(tmp_path, name: str) -> str:
+    """Create an 'upstream' repo with a commit, giving its (file://) URL"""
+    upstream = Repo.init(tmp_path / "org" / name, initial_branch="main")
+    (tmp_path / "org" / name / "README.md").write_text(f"Hello {name}\n")
+    upstream.index.add("README.md")
+    upstream.index.commit("Initial commit")
+    return f"file://{tmp_path / 'org' / name}"
+
+
+def test_parse_size():
+    """Scenario: Sizes are given in bytes, or with binary suffix"""
+    # Given sizes with and without suffix
+    # When I parse them
+    # Then I get their size in bytes
+    assert parse_size("1024") == 1024, "Should read plain bytes"
+    assert parse_size("500M") == 500 * 1024**2, "Should read megabytes"
+    assert parse_size("1.5g") == int(1.5 * 1024**3), "Should read lowercase suffix"
+
+
+def test_gc_evicts_least_recently_used(tmp_path, monkeypatch):
+    """Scenario: Over budget, least-recently-used repos are evicted first"""
+    # Given two remote repos cloned, one used an hour ago, one now
+    cache_folder = tmp_path / "cache"
+    old_url = make_upstream(tmp_path, "old")
+    new_url = make_upstream(tmp_path, "new")
+    an_hour_ago = SimpleNamespace(time=lambda: time.time() - 3600)
+    with monkeypatch.context() as patched:
+        patched.setattr("mass_driver.cache_index.time", an_hour_ago)
+        old_clone = clone_if_remote(old_url, cache_folder, LOGGER, workspace="a")
+    clone_if_remote(new_url, cache_folder, LOGGER, workspace="a")
+    repos = {repo.cache_name: repo for repo in cached_repos(cache_folder)}
+    # When I collect garbage, with budget fitting only one repo
+    evicted = collect_garbage(cache_folder, repos["org/new"].total_bytes, LOGGER)
+    # Then only the least-recently-used repo is evicted
+    assert [repo.cache_name for repo in evicted] == ["org/old"], "Should evict LRU"
+    assert not mirror_path(old_url, cache_folder).exists(), "Should drop mirror"
+    assert not Path(old_clone.working_dir).exists(), "Should drop workspace clones"
+    assert mirror_path(new_url, cache_folder).is_dir(), "Should keep recent repo"
+
+
+def test_gc_keeps_unpushed_workspace(tmp_path):
+    """Scenario: Repos with unpushed commits in a workspace aren't evicted"""
+    # Given a remote repo cloned
+    cache_folder = tmp_path / "cache"
+    repo_url = make_upstream(tmp_path, "repo")
+    clone = clone_if_remote(repo_url, cache_folder, LOGGER, workspace="a")
+    # And a commit on a local branch only, as by a migration not forged yet
+    clone.git.checkout("-b", "migration")
+    (Path(clone.working_dir) / "new.txt").write_text("Migrated\n")
+    clone.index.add("new.txt")
+    clone.index.commit("Migrate")
+    # When I collect garbage, with no budget at all
+    evicted = collect_garbage(cache_folder, 0, LOGGER)
+    # Then the repo is kept, along with its workspace clone
+    assert not evicted, "Should not evict repo with unpushed commits"
+    assert Path(clone.working_dir).is_dir(), "Should keep unpushed workspace clone"
+    assert mirror_path(repo_url, cache_folder).is_dir(), "Should keep its mirror"
+    # But forcing garbage collection evicts it
+    evicted = collect_garbage(cache_folder, 0, LOGGER, force=True)
+    assert [repo.cache_name for repo in evicted] == ["org/repo"], "Should force"
+    assert not Path(clone.working_dir).exists(), "Should drop forced workspace"
+
+
+def test_gc_within_budget_keeps_all(tmp_path):
+    """Scenario: Within budget, no repo is evicted"""
+    # Given a remote repo cloned
+    cache_folder = tmp_path / "cache"
+    repo_url = make_upstream(tmp_path, "repo")
+    clone_if_remote(repo_url, cache_folder, LOGGER)
+    # When I collect garbage with a large budget
+    evicted = collect_garbage(cache_folder, parse_size("1G"), LOGGER)
+    # Then nothing is evicted
+    assert not evicted, "Should evict nothing"
+    assert mirror_path(repo_url, cache_folder).is_dir(), "Should keep repo"
+
+
+def test_gc_removes_abandoned_staging(tmp_path):
+    """Scenario: Half-cloned mirrors of long-dead clones are removed"""
+    # Given a half-cloned mirror, abandoned long ago
+    staging = tmp_path / "cache" / "mirrors" / "org" / ".repo.git.1234.5678.tmp"
+    staging.mkdir(parents=True)
+    long_ago = time.time() - STALE_STAGING_SECONDS - 60
+    os.utime(staging, (long_ago, long_ago))
+    # When I collect garbage
+    collect_garbage(tmp_path / "cache", parse_size("1G"), LOGGER)
+    # Then the half-cloned mirror is removed
+    assert not staging.exists(), "Should remove abandoned half-cloned mirror"
+
+
+def test_temp_cache_wiped_on_exit(tmp_path):
+    """Scenario: Running without cache leaves no temp folder behind"""
+    # Given a process using a temp cache folder
+    script = (
+        "import logging\n"
+        "from mass_driver.git import get_cache_folder\n"
+        "print(get_cache_folder(False, logging.getLogger()))\n"
+    )
+    # When the process exits
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+    # Then the temp cache folder is gone
+    temp_cache = Path(result.stdout.strip())
+    assert temp_cache.name.endswith(".cache"), "Should print temp cache folder"
+    assert not temp_cache.exists(), "Should wipe temp cache on exit"
+
+
+def test_cache_stats_command(tmp_path, monkeypatch, caplog):
+    """Scenario: The cache stats command sums up the cache"""
+    # Given a remote repo cloned into the default cache
+    monkeypatch.chdir(tmp_path)
+    clone_if_remote(
+        make_upstream(tmp_path, "repo"), Path(".mass_driver/repos/"), LOGGER
+    )
+    # When I ask for cache stats
+    with caplog.at_level(logging.INFO):
+        result = cli(["cache", "stats"])
+    # Then the cache's repos are counted
+    assert result, "Should succeed"
+    assert "Repo cache: 1 repos" in caplog.text, "Should count cached repos"
@@ -0,0 +1,95 @@
+"""Check the longest-first ordering of repos, from their expected cost
+
+Feature: Longest-job-first scheduling
+  As a mass-driver user
+  I need the biggest repos processed first
+  In order to avoid a long single-threaded tail of huge repos in parallel runs
+"""
+
+import logging
+import os
+
+from git import Repo
+
+from mass_driver.models.activity import RepoOutcome
+from mass_driver.models.repository import SourcedRepo
+from mass_driver.scheduling import DurationHistory, longest_first
+
+LOGGER = logging.getLogger()
+
+REPOS = {
+    f"repo{i}": SourcedRepo(repo_id=f"repo{i}", clone_url=f"git@example.com:org/{i}")
+    for i in range(4)
+}
+
+
+def test_longest_first_from_history(tmp_path):
+    """Scenario: Repos slowest in previous runs go first"""
+    # Given a history of repo durations, saved from a previous run
+    history_path = tmp_path / "durations.json"
+    history = DurationHistory(history_path)
+    for repo_id, seconds in [("repo1", 10.0), ("repo2", 300.0), ("repo3", 1.0)]:
+        history.record(RepoOutcome(repo_id=repo_id, elapsed_seconds=seconds))
+    history.record(RepoOutcome(repo_id="repo0", elapsed_seconds=0.1, error="oops"))
+    history.save()
+    # When I order repos longest-first, from that history
+    ordered = longest_first(REPOS, DurationHistory(history_path), tmp_path, LOGGER)
+    # Then unknown repos go first, then the rest by decreasing duration
+    assert list(ordered) == [
+        "repo0",
+        "repo2",
+        "repo1",
+        "repo3",
+    ], "Should order unknown first, then longest first"
+
+
+def test_history_saves_merge(tmp_path):
+    """Scenario: Concurrent runs' saved durations are merged, not clobbered"""
+    # Given two runs loading the same history
+    history_path = tmp_path / "durations.json"
+    first, second = DurationHistory(history_path), DurationHistory(history_path)
+    # When each records a different repo, then saves
+    first.record(RepoOutcome(repo_id="repo1", elapsed_seconds=10.0))
+    second.record(RepoOutcome(repo_id="repo2", elapsed_seconds=20.0))
+    first.save()
+    second.save()
+    # Then the history keeps both repos' durations
+    assert DurationHistory(history_path).durations == {
+        "repo1": 10.0,
+        "repo2": 20.0,
+    }, "Should merge both runs' durations"
+
+
+def test_unreadable_history_empty(tmp_path):
+    """Scenario: Half-written history file is read as empty, not a crash"""
+    # Given a history file cut short mid-write
+    history_path = tmp_path / "durations.json"
+    history_path.write_text('{"repo1": 10.0, "rep')
+    # When I load the history
+    history = DurationHistory(history_path)
+    # Then it's empty
+    assert history.durations == {}, "Should read unreadable history as empty"
+    # And saving over it gives a readable history
+    history.record(RepoOutcome(repo_id="repo2", elapsed_seconds=20.0))
+    history.save()
+    assert DurationHistory(history_path).durations == {
+        "repo2": 20.0
+    }, "Should save over unreadable history"
+
+
+def test_longest_first_from_cached_clone(tmp_path):
+    """Scenario: Repos with no history are ordered by cached clone size"""
+    # Given two local repos, one with much bigger git history
+    repos = {}
+    for name, file_size in [("small", 10), ("big", 1_000_000)]:
+        repo_path = tmp_path / name
+        repo = Repo.init(repo_path)
+        (repo_path / "file.bin").write_bytes(os.urandom(file_size))
+        repo.index.add("file.bin")
+        repo.index.commit("Add file")
+        repo.git.gc()  # Pack objects, as in clones
+        repos[name] = SourcedRepo(repo_id=name, clone_url=str(repo_path))
+    # When I order them longest-first, without history
+    ordered = longest_first(repos, DurationHistory(), tmp_path, LOGGER)
+    # Then the biggest goes first
+    assert list(ordered) == ["big", "small"], "Should order by clone size"
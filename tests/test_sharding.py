@@ -0,0 +1,66 @@
+"""Check the sharding of repos across machines, and merging of shards' outcomes
+
+Feature: Sharded runs
+  As a mass-driver user
+  I need to split a run's repos across machines, then combine their outcomes
+  In order to not be limited by one machine's network and CPU
+"""
+
+import pytest
+
+from mass_driver.models.activity import ActivityOutcome
+from mass_driver.models.patchdriver import PatchOutcome, PatchResult
+from mass_driver.models.repository import SourcedRepo
+from mass_driver.sharding import merge_outcomes, parse_shard, select_shard
+
+REPOS = {
+    f"repo{i}": SourcedRepo(repo_id=f"repo{i}", clone_url=f"git@example.com:org/{i}")
+    for i in range(100)
+}
+
+
+def test_shards_partition_repos():
+    """Scenario: Each repo lands in exactly one shard"""
+    # When I split repos into 3 shards
+    shards = [select_shard(REPOS, shard_index, 3) for shard_index in range(1, 4)]
+    # Then every repo is in exactly one shard
+    all_sharded = [repo_id for shard in shards for repo_id in shard]
+    assert sorted(all_sharded) == sorted(REPOS), "Should partition all repos"
+    # And shards are balanced-ish
+    assert all(shard for shard in shards), "Should not have empty shards"
+
+
+def test_shards_are_stable():
+    """Scenario: Shards don't depend on the order of repos"""
+    # Given the same repos, listed in reverse order
+    reversed_repos = dict(reversed(REPOS.items()))
+    # When I select the same shard of both
+    # Then I get the same repos
+    assert set(select_shard(REPOS, 2, 4)) == set(
+        select_shard(reversed_repos, 2, 4)
+    ), "Should shard by repo ID, not order"
+
+
+def test_parse_shard_out_of_range():
+    """Scenario: Shard index must be within shard count"""
+    # When I parse a shard index past the count
+    # Then I get an error
+    with pytest.raises(ValueError):
+        parse_shard("4/3")
+
+
+def test_merge_outcomes():
+    """Scenario: Shards' outcomes merge into one"""
+    # Given two shards' outcomes, only one with migration results
+    patched = PatchResult(outcome=PatchOutcome.PATCHED_OK)
+    shard1 = ActivityOutcome(
+        repos_sourced={"repo1": REPOS["repo1"]},
+        migration_result={"repo1": patched},
+    )
+    shard2 = ActivityOutcome(repos_sourced={"repo2": REPOS["repo2"]})
+    # When I merge them
+    merged = merge_outcomes([shard1, shard2])
+    # Then I get all repos, and all results
+    assert set(merged.repos_sourced) == {"repo1", "repo2"}, "Should merge repos"
+    assert merged.migration_result == {"repo1": patched}, "Should merge results"
+    assert merged.forge_result is None, "Should not invent missing results"
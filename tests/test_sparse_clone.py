@@ -0,0 +1,186 @@
+"""Check partial and sparse clones, driven by the files plugins declare they need
+
+Feature: Clone only the files an activity needs
+  As a mass-driver user
+  I need scanning a single file across a fleet of large repos not to download them
+  In order to run such activities fast, without filling the disk
+"""
+
+import logging
+from pathlib import Path
+
+from git import Repo
+
+from mass_driver.drivers.bricks import GlobFileEditor
+from mass_driver.drivers.counter import Counter
+from mass_driver.git import clone_if_remote, commit, is_partial_mirror, mirror_path
+from mass_driver.models.activity import ActivityLoaded
+
+LOGGER = logging.getLogger()
+
+STAMPER_ACTIVITY = """
+[mass-driver.scan]
+scanner_names = ["dockerfile-from", "root-files"]
+
+[mass-driver.migration]
+commit_message = "Stamp"
+branch_name = "stamp"
+commit_author_name = "Tester"
+commit_author_email = "tester@example.com"
+driver_name = "stamper"
+driver_config = {filepath_to_create = "docs/new.md", file_contents = "Hi"}
+"""
+
+
+class ChangelogEditor(GlobFileEditor):
+    """A GlobFileEditor also writing a changelog, outside its target glob"""
+
+    def before_run(self, targets):
+        """Note the edits to come in a changelog, next to the edited files"""
+        for target in targets:
+            (target.parent / "CHANGELOG").write_text(f"Edited {target.name}\n")
+
+
+class SparseChangelogEditor(ChangelogEditor):
+    """A ChangelogEditor opting into sparse checkout (wrongly!)"""
+
+    sparse_checkout = True
+
+
+def make_upstream(tmp_path) -> str:
+    """Create an 'upstream' repo with a few files, giving its (file://) URL"""
+    upstream_path = tmp_path / "org" / "upstream"
+    upstream = Repo.init(upstream_path, initial_branch="main")
+    upstream.git.config("uploadpack.allowFilter", "true")
+    (upstream_path / "docs").mkdir()
+    (upstream_path / "Dockerfile").write_text("FROM python:3.11\n")
+    (upstream_path / "README.md").write_text("Hello\n")
+    (upstream_path / "docs" / "big.txt").write_text("Lots of docs\n" * 1000)
+    upstream.index.add(["Dockerfile", "README.md", "docs/big.txt"])
+    upstream.index.commit("Initial commit")
+    return f"file://{upstream_path}"
+
+
+def missing_objects(repo: Repo) -> list[str]:
+    """List the objects a (partial) repo is missing, without fetching them"""
+    objects = repo.git.rev_list("--objects", "--missing=print", "--all")
+    return [line for line in objects.splitlines() if line.startswith("?")]
+
+
+def test_sparse_clone_checks_out_needed_files(tmp_path):
+    """Scenario: Cloning with declared files gets just those, from partial mirror"""
+    # Given a remote repo, not cached yet
+    repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    # When I clone it, needing only the Dockerfile
+    clone = clone_if_remote(
+        repo_url, cache_folder, LOGGER, sparse_paths=["/Dockerfile"]
+    )
+    # Then the mirror is partial, missing file contents
+    mirror = mirror_path(repo_url, cache_folder)
+    assert is_partial_mirror(mirror), "Should mirror partially"
+    assert missing_objects(Repo(mirror)), "Should leave file contents out of mirror"
+    # And only the Dockerfile is checked out
+    workdir = Path(str(clone.working_tree_dir))
+    assert (workdir / "Dockerfile").is_file(), "Should check out needed"
+    assert not (workdir / "README.md").exists(), "Should skip unneeded"
+    assert not (workdir / "docs").exists(), "Should skip unneeded folder"
+    # And the clone sees no change, despite missing files
+    assert not clone.is_dirty(untracked_files=True), "Should look clean"
+
+
+def test_sparse_clone_widens_to_all_files(tmp_path):
+    """Scenario: Re-cloning a sparse workspace needing all files checks all out"""
+    # Given a remote repo, cloned needing only the Dockerfile
+    repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    clone_if_remote(repo_url, cache_folder, LOGGER, sparse_paths=["/Dockerfile"])
+    # When I clone it again, needing all files
+    clone = clone_if_remote(repo_url, cache_folder, LOGGER, sparse_paths=None)
+    # Then all files are checked out, fetching their contents on demand
+    workdir = Path(str(clone.working_tree_dir))
+    assert (workdir / "docs" / "big.txt").is_file(), "Should check out all"
+    assert not clone.is_dirty(untracked_files=True), "Should look clean"
+
+
+def test_sparse_clone_commits_only_changes(tmp_path, monkeypatch):
+    """Scenario: Committing in a sparse clone keeps the files not checked out"""
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "Tester")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "tester@example.com")
+    # Given a remote repo, cloned needing only a new file to create
+    repo_url = make_upstream(tmp_path)
+    activity = ActivityLoaded.from_config(STAMPER_ACTIVITY)
+    assert activity.migration is not None, "Should load the migration"
+    clone = clone_if_remote(
+        repo_url, tmp_path / "cache", LOGGER, sparse_paths=activity.sparse_paths
+    )
+    # When I create the file, committing it
+    (Path(str(clone.working_tree_dir)) / "docs").mkdir()
+    (Path(str(clone.working_tree_dir)) / "docs" / "new.md").write_text("Hi\n")
+    commit(clone, activity.migration)
+    # Then the commit adds the file, keeping all others
+    files = clone.git.ls_tree("-r", "--name-only", "HEAD").splitlines()
+    assert "docs/new.md" in files, "Should commit the new file"
+    assert "docs/big.txt" in files, "Should keep files not checked out"
+    assert "README.md" in files, "Should keep files not checked out"
+
+
+def test_full_clone_by_default(tmp_path):
+    """Scenario: Cloning without declared files mirrors all file contents"""
+    # Given a remote repo, not cached yet
+    repo_url = make_upstream(tmp_path)
+    cache_folder = tmp_path / "cache"
+    # When I clone it without declaring files needed
+    clone = clone_if_remote(repo_url, cache_folder, LOGGER)
+    # Then the mirror is complete
+    mirror = mirror_path(repo_url, cache_folder)
+    assert not is_partial_mirror(mirror), "Should mirror fully"
+    assert not missing_objects(Repo(mirror)), "Should mirror all file contents"
+    # And all files are checked out
+    workdir = Path(str(clone.working_tree_dir))
+    assert (workdir / "docs" / "big.txt").is_file(), "Should check out all"
+
+
+def test_activity_sparse_paths_union(tmp_path):
+    """Scenario: An activity needs the files of all its plugins, if all declare"""
+    # Given an activity whose scanners and driver all declare the files they need
+    # When I load the activity
+    activity = ActivityLoaded.from_config(STAMPER_ACTIVITY)
+    # Then it needs the union of the files declared
+    assert activity.sparse_paths is not None, "Should need only declared files"
+    assert "/Dockerfile" in activity.sparse_paths, "Should need scanners' files"
+    assert "/docs/new.md" in activity.sparse_paths, "Should need driver's files"
+    assert len(activity.sparse_paths) == len(set(activity.sparse_paths)), "Union"
+
+
+def test_activity_undeclared_plugin_needs_all(tmp_path):
+    """Scenario: An activity with a plugin not declaring files needs all files"""
+    # Given an activity whose driver doesn't declare the files it needs
+    activity_toml = """
+    [mass-driver.scan]
+    scanner_names = ["dockerfile-from"]
+
+    [mass-driver.migration]
+    commit_message = "Run"
+    driver_name = "shell"
+    driver_config = {command = ["true"]}
+    """
+    # When I load the activity
+    activity = ActivityLoaded.from_config(activity_toml)
+    # Then it needs all files
+    assert activity.sparse_paths is None, "Should need all files"
+
+
+def test_reusable_drivers_sparse_only_if_opted_in():
+    """Scenario: Reusable file editor drivers need all files, unless opted in"""
+    # Given a GlobFileEditor subclass, and the same opting into sparse checkout
+    default_editor = ChangelogEditor(target_glob="docs/*.md")
+    sparse_editor = SparseChangelogEditor(target_glob="docs/*.md")
+    # When I check the files they need
+    # Then the default one needs all files (it may touch others, in hooks)
+    assert default_editor.needed_paths() is None, "Should need all files by default"
+    # And the opted-in one needs only its target files
+    assert sparse_editor.needed_paths() == ["/docs/*.md"], "Should need its glob"
+    # And the built-in counter (single file editor) opted in
+    counter = Counter(target_file="counter.txt", target_count=1)
+    assert counter.needed_paths() == ["/counter.txt"], "Should need its file"
@@ -0,0 +1,115 @@
+"""Check per-phase timeouts free up workers from hung repos
+
+Feature: Per-repo timeouts
+  As a mass-driver user
+  I need hung repos to be timed out, their subprocesses killed
+  So that a single repo can't stall a whole fleet run
+"""
+
+import logging
+import pickle
+import time
+
+import pytest
+
+from mass_driver import activity_run
+from mass_driver.activity_run import sequential_run
+from mass_driver.drivers.shell import ShellDriver
+from mass_driver.models.activity import ActivityLoaded, load_activity_toml
+from mass_driver.models.patchdriver import PatchOutcome
+from mass_driver.models.repository import ClonedRepo, SourcedRepo
+from mass_driver.summarize import summarize_clone
+from mass_driver.timeouts import PhaseTimeoutError, call_with_timeout
+
+
+def test_call_within_timeout_returns():
+    """Scenario: Phase completing in time returns its result"""
+    # When I call a quick function with a timeout
+    result = call_with_timeout("scan", 5, lambda x: x + 1, 1)
+    # Then I get its result
+    assert result == 2, "Should return the function's result"
+
+
+def test_call_past_timeout_raises():
+    """Scenario: Phase running past its timeout is abandoned"""
+    # When I call a hung function with a short timeout
+    start = time.monotonic()
+    with pytest.raises(PhaseTimeoutError) as excinfo:
+        call_with_timeout("clone", 0.1, time.sleep, 5)
+    # Then I get a timeout error about the phase, quickly
+    assert excinfo.value.phase == "clone", "Should name the phase that timed out"
+    assert time.monotonic() - start < 2, "Should not wait for the hung function"
+
+
+def test_clone_timeout_told_apart_from_failure(monkeypatch, caplog):
+    """Scenario: Repos timing out on clone are recorded apart from clone failures"""
+    # Given a repo whose clone times out, and another failing to clone
+    repos = {
+        repo_id: SourcedRepo(repo_id=repo_id, clone_url=repo_id)
+        for repo_id in ["slow", "broken"]
+    }
+
+    def clone(repo, *args, **kwargs):
+        if repo.repo_id == "slow":
+            raise PhaseTimeoutError("clone", 1)
+        raise ValueError("No such repo")
+
+    monkeypatch.setattr(activity_run, "clone_repo", clone)
+    # When I run over them
+    repo_outcomes = []
+    outcome = sequential_run(
+        ActivityLoaded(), repos, cache=False, repo_callbacks=[repo_outcomes.append]
+    )
+    # Then only the slow repo is marked as timed out
+    timed_out = {repo.repo_id: repo.clone_timed_out for repo in repo_outcomes}
+    assert timed_out == {"slow": True, "broken": False}, "Should mark timeouts only"
+    assert outcome.repos_clone_timed_out == ["slow"], "Should list timed out repos"
+    # And the summary tells them apart
+    with caplog.at_level(logging.INFO):
+        summarize_clone(outcome, logging.getLogger("summarize"))
+    assert "0 of 2 repos, 1 timed out, 1 failed" in caplog.text, "Should tell apart"
+
+
+def test_timeout_error_pickles():
+    """Scenario: Timeout errors survive the trip back from worker processes"""
+    # Given a clone timeout error
+    error = PhaseTimeoutError("clone", 30)
+    # When it's pickled and back, as from a worker process
+    unpickled = pickle.loads(pickle.dumps(error))
+    # Then it's still a timeout of the same phase
+    assert isinstance(unpickled, PhaseTimeoutError), "Should stay a timeout error"
+    assert (unpickled.phase, unpickled.timeout) == ("clone", 30), "Should keep phase"
+
+
+def test_shell_driver_killed_past_timeout(tmp_path):
+    """Scenario: ShellDriver command is killed past the driver's timeout"""
+    # Given a ShellDriver running a hung command, with a timeout
+    driver = ShellDriver(command=["sleep 5"])
+    driver._logger = logging.getLogger("test")
+    driver._timeout = 0.1
+    repo = ClonedRepo(
+        repo_id="test", clone_url="test", cloned_path=tmp_path, current_branch="main"
+    )
+    # When I run the driver
+    start = time.monotonic()
+    result = driver.run(repo)
+    # Then the command is killed quickly, marked as timed out
+    assert result.outcome == PatchOutcome.TIMED_OUT, "Should time out the command"
+    assert time.monotonic() - start < 2, "Should kill the hung command"
+
+
+def test_activity_timeouts_config():
+    """Scenario: Timeouts are set per phase, in Activity file"""
+    # Given an activity file with timeouts for some phases
+    activity_toml = """
+    [mass-driver.timeouts]
+    clone = 60
+    migrate = 30.5
+    """
+    # When I load the activity
+    activity = load_activity_toml(activity_toml)
+    # Then the given phases have timeouts
+    assert activity.timeouts.clone == 60, "Should read clone timeout"
+    assert activity.timeouts.migrate == 30.5, "Should read migrate timeout"
+    # And the other phases are unlimited
+    assert activity.timeouts.push is None, "Should default to no timeout"
@@ -0,0 +1,73 @@
+"""Check the per-phase timing of processing repos, and its summary
+
+Feature: Per-phase timing instrumentation
+  As a mass-driver user
+  I need to know how long each phase (clone, scan, migrate...) takes
+  In order to find where a slow run spends its time
+"""
+
+import logging
+import time
+
+from mass_driver.models.activity import PhaseTiming
+from mass_driver.summarize import percentile, summarize_timings
+from mass_driver.timeouts import call_with_timeout
+from mass_driver.timing import recording_timings, timed_phase
+
+
+def test_timed_phase_records_only_when_recording():
+    """Scenario: Phases are timed into the list being recorded into, if any"""
+    # Given a list to record timings into
+    timings: list[PhaseTiming] = []
+    # When I run a phase outside, then inside, the recording context
+    with timed_phase("clone"):
+        pass
+    with recording_timings(timings):
+        with timed_phase("clone") as measure:
+            measure.bytes_fetched = 42
+            time.sleep(0.01)
+    # Then only the phase run inside is recorded, with its measures
+    assert len(timings) == 1, "Should record only phases run while recording"
+    assert timings[0].phase == "clone", "Should record the phase name"
+    assert timings[0].wall_seconds >= 0.01, "Should record wall-clock time"
+    assert timings[0].bytes_fetched == 42, "Should record bytes fetched"
+
+
+def test_timed_phase_follows_timeout_thread():
+    """Scenario: Phases run in a timeout thread are still recorded"""
+    # Given a list to record timings into
+    timings: list[PhaseTiming] = []
+
+    def busy():
+        with timed_phase("inner"):
+            sum(range(100_000))
+
+    # When I run a timed phase, offloading work to a timeout thread
+    with recording_timings(timings):
+        with timed_phase("migrate"):
+            call_with_timeout("migrate", 10, busy)
+    # Then both phases are recorded, the outer counting the thread's CPU time
+    inner, outer = timings
+    assert (inner.phase, outer.phase) == ("inner", "migrate"), "Should record both"
+    assert outer.thread_id != inner.thread_id, "Should record separate threads"
+    assert outer.cpu_seconds is not None and inner.cpu_seconds is not None, "No CPU"
+    assert outer.cpu_seconds >= inner.cpu_seconds, "Should count offloaded CPU"
+
+
+def test_summarize_timings_percentiles(caplog):
+    """Scenario: Summary gives nearest-rank p50/p95/max per phase"""
+    # Given timings of 20 repos' clone, taking 1..20 seconds
+    phase_timings = {
+        f"repo{i}": [
+            PhaseTiming(phase="clone", started_at=0, wall_seconds=i, pid=1, thread_id=1)
+        ]
+        for i in range(1, 21)
+    }
+    # When I summarize them
+    with caplog.at_level(logging.INFO):
+        summarize_timings(phase_timings, logging.getLogger("summarize"))
+    # Then percentiles are picked by nearest rank
+    assert percentile([1.0, 2.0, 3.0], 50) == 2.0, "Should pick the middle value"
+    assert (
+        "clone: 20 times, p50 10.00s, p95 19.00s, max 20.00s" in caplog.text
+    ), "Should summarize clone phase"
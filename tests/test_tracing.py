@@ -0,0 +1,53 @@
+"""Check the export of a run's phase timings as a trace
+
+Feature: Trace-span export of runs
+  As a mass-driver user
+  I need a timeline of which worker processed which repo phase, when
+  In order to spot idle workers, queueing and stragglers
+"""
+
+from mass_driver.models.activity import PhaseTiming
+from mass_driver.tracing import trace_events
+
+
+def timing(phase: str, started_at: float, wall_seconds: float, thread_id: int):
+    """Create a phase timing, in process 1"""
+    return PhaseTiming(
+        phase=phase,
+        started_at=started_at,
+        wall_seconds=wall_seconds,
+        pid=1,
+        thread_id=thread_id,
+    )
+
+
+def test_trace_spans_per_phase_and_repo():
+    """Scenario: Trace has a span per phase on its thread, and one per repo"""
+    # Given a repo cloned then scanned on two threads, then forged
+    phase_timings = {
+        "repo1": [
+            timing("clone", 100.0, 2.0, thread_id=11),
+            timing("scan", 102.5, 1.0, thread_id=12),
+            timing("forge", 200.0, 0.5, thread_id=10),
+        ]
+    }
+    # When I convert its timings to trace events
+    events = trace_events(phase_timings)
+    # Then each phase is a span on its thread, from the run's start
+    phases = [event for event in events if event["cat"] == "phase"]
+    assert [(p["name"], p["tid"], p["ts"], p["dur"]) for p in phases] == [
+        ("clone", 11, 0.0, 2_000_000.0),
+        ("scan", 12, 2_500_000.0, 1_000_000.0),
+        ("forge", 10, 100_000_000.0, 500_000.0),
+    ], "Should have a span per phase, on its thread"
+    # And the repo spans from its first phase to its last before forging
+    repo_span = [(e["ph"], e["ts"]) for e in events if e["cat"] == "repo"]
+    assert repo_span == [
+        ("b", 0.0),
+        ("e", 3_500_000.0),
+    ], "Should span the repo's processing"
+
+
+def test_trace_empty_run():
+    """Scenario: A run with no timings has an empty trace"""
+    assert trace_events({}) == [], "Should have no trace events"
@@ -0,0 +1,171 @@
+"""Check the work queue, handing out repos to many workers via leases
+
+Feature: Work queue of repos
+  As a mass-driver user
+  I need many workers to drain a single run's repos
+  In order to not leave fast workers idle while others are stuck
+"""
+
+import threading
+import time
+
+import pytest
+
+from mass_driver import activity_run
+from mass_driver.models.activity import ActivityLoaded, RepoOutcome
+from mass_driver.models.repository import SourcedRepo
+from mass_driver.queue_run import WorkQueue, queue_run, renewing_lease
+
+REPO = SourcedRepo(repo_id="repo1", clone_url="git@example.com:org/repo1")
+
+
+def sourced(*repo_ids: str) -> dict[str, SourcedRepo]:
+    """Make sourced repos of given IDs, in order"""
+    return {
+        repo_id: SourcedRepo(repo_id=repo_id, clone_url=f"git@example.com:{repo_id}")
+        for repo_id in repo_ids
+    }
+
+
+def test_claimed_repo_not_claimed_twice(tmp_path):
+    """Scenario: A leased repo isn't handed out to another worker"""
+    # Given a queue with a single repo
+    work_queue = WorkQueue(tmp_path / "queue.db")
+    work_queue.enqueue("[mass-driver]", {REPO.repo_id: REPO})
+    # When two workers claim repos
+    first = work_queue.claim("worker1")
+    second = work_queue.claim("worker2")
+    # Then only the first gets the repo
+    assert first == REPO, "Should hand out the repo"
+    assert second is None, "Should not hand out a leased repo"
+
+
+def test_expired_lease_reclaimed(tmp_path):
+    """Scenario: A repo whose lease expired goes to another worker"""
+    # Given a repo claimed by a worker, whose lease expired (died?)
+    work_queue = WorkQueue(tmp_path / "queue.db")
+    work_queue.enqueue("[mass-driver]", {REPO.repo_id: REPO})
+    work_queue.claim("worker1", lease_seconds=-1)
+    # When another worker claims a repo
+    reclaimed = work_queue.claim("worker2")
+    # Then it gets the repo
+    assert reclaimed == REPO, "Should hand out the expired repo again"
+    # And only its outcome is recorded
+    outcome = RepoOutcome(repo_id=REPO.repo_id, error="whatever")
+    assert not work_queue.complete("worker1", outcome), "Should reject lost lease"
+    assert work_queue.complete("worker2", outcome), "Should record lease holder"
+    assert work_queue.counts() == {"done": 1}, "Should be done"
+    assert work_queue.outcomes([REPO.repo_id]) == [outcome], "Should keep outcome"
+
+
+def test_claims_follow_enqueued_order(tmp_path):
+    """Scenario: Repos are handed out in enqueued (longest-first) order"""
+    # Given a queue of repos, enqueued out of alphabetical order
+    work_queue = WorkQueue(tmp_path / "queue.db")
+    work_queue.enqueue("[mass-driver]", sourced("huge", "big", "small", "a-tiny"))
+    # When a worker claims all repos
+    claimed = [work_queue.claim("worker1") for _ in range(4)]
+    # Then they come in enqueued order
+    assert [repo.repo_id for repo in claimed if repo is not None] == [
+        "huge",
+        "big",
+        "small",
+        "a-tiny",
+    ], "Should hand out repos in enqueued order"
+
+
+def test_reused_queue_refused(tmp_path):
+    """Scenario: Enqueuing into a queue file of a previous run is refused"""
+    # Given a queue file, with a repo done by a previous run
+    work_queue = WorkQueue(tmp_path / "queue.db")
+    work_queue.enqueue("[mass-driver]", {REPO.repo_id: REPO})
+    work_queue.claim("worker1")
+    work_queue.complete("worker1", RepoOutcome(repo_id=REPO.repo_id))
+    # When enqueuing a new run into it
+    # Then it's refused, rather than keeping the stale done repo
+    with pytest.raises(ValueError, match="already holds 1 repos"):
+        WorkQueue(tmp_path / "queue.db").enqueue("[mass-driver]", {REPO.repo_id: REPO})
+
+
+def test_repo_given_up_after_max_attempts(tmp_path):
+    """Scenario: A repo losing its lease each time is eventually given up on"""
+    # Given a repo whose lease expired (worker died?) on each of 2 claims
+    work_queue = WorkQueue(tmp_path / "queue.db")
+    work_queue.enqueue("[mass-driver]", {REPO.repo_id: REPO})
+    work_queue.claim("worker1", lease_seconds=-1, max_attempts=2)
+    work_queue.claim("worker2", lease_seconds=-1, max_attempts=2)
+    # When another worker claims a repo
+    claimed = work_queue.claim("worker3", max_attempts=2)
+    # Then it gets none
+    assert claimed is None, "Should not hand out the repo a third time"
+    # And the repo is done, failed
+    assert work_queue.counts() == {"done": 1}, "Should mark repo done"
+    (outcome,) = work_queue.outcomes_since(0)
+    assert outcome.error is not None, "Should record repo as failed"
+    assert "after 2 attempts" in outcome.error, "Should say why it failed"
+
+
+def test_lease_renewed_while_processing(tmp_path):
+    """Scenario: A repo processed for longer than its lease isn't claimed back"""
+    # Given a repo claimed with a short lease
+    work_queue = WorkQueue(tmp_path / "queue.db")
+    work_queue.enqueue("[mass-driver]", {REPO.repo_id: REPO})
+    work_queue.claim("worker1", lease_seconds=0.3)
+    # When processing the repo for longer than the lease, renewing it meanwhile
+    with renewing_lease(tmp_path / "queue.db", "worker1", REPO.repo_id, 0.3):
+        time.sleep(0.6)
+        # Then other workers can't claim it
+        assert work_queue.claim("worker2") is None, "Should keep the lease alive"
+    # And the original worker can still complete it
+    outcome = RepoOutcome(repo_id=REPO.repo_id)
+    assert work_queue.complete("worker1", outcome), "Should still hold the lease"
+
+
+def test_outcomes_gathered_as_completed(tmp_path):
+    """Scenario: Outcomes are gathered in completion order, as repos get done"""
+    # Given a queue of two repos, the second of which is done first
+    work_queue = WorkQueue(tmp_path / "queue.db")
+    work_queue.enqueue("[mass-driver]", sourced("repo1", "repo2"))
+    work_queue.claim("worker1")
+    work_queue.claim("worker2")
+    work_queue.complete("worker2", RepoOutcome(repo_id="repo2"))
+    first_gathered = work_queue.outcomes_since(0)
+    # When the first repo is done too, and outcomes gathered again
+    work_queue.complete("worker1", RepoOutcome(repo_id="repo1"))
+    then_gathered = work_queue.outcomes_since(len(first_gathered))
+    # Then each gathering brings just the newly done repo
+    assert [o.repo_id for o in first_gathered] == ["repo2"], "Should get first done"
+    assert [o.repo_id for o in then_gathered] == ["repo1"], "Should get only new"
+
+
+def test_callbacks_called_as_repos_done(tmp_path, monkeypatch):
+    """Scenario: Repo callbacks get each outcome as the repo is done, not at the end"""
+    # Given two repos, the second of which clones only once the first is reported
+    first_reported = threading.Event()
+    seen_before_second = []
+
+    def clone(repo, *args, **kwargs):
+        if repo.repo_id == "second":
+            seen_before_second.append(first_reported.wait(timeout=10))
+        raise ValueError("No such repo")
+
+    monkeypatch.setattr(activity_run, "clone_repo", clone)
+
+    def report(repo_outcome: RepoOutcome):
+        if repo_outcome.repo_id == "first":
+            first_reported.set()
+
+    # When I run over them via a work queue
+    outcome = queue_run(
+        ActivityLoaded(),
+        sourced("first", "second"),
+        cache=False,
+        queue_path=tmp_path / "queue.db",
+        activity_config="[mass-driver]",
+        repo_callbacks=[report],
+        poll_seconds=0.05,
+    )
+    # Then the first repo was reported while the second was being processed
+    assert seen_before_second == [True], "Should report repos as they're done"
+    # And both repos are in the outcome
+    assert sorted(outcome.repos_sourced) == ["first", "second"], "Should gather all"